@@ -0,0 +1,73 @@
+"""compute_totals of the driver's objective and constraints for large
+flight_conds x flight_missions, with and without total-derivative coloring,
+for each current solver strategy.
+
+Run from the PROPtimize directory:
+
+    python Benchmarks/ColoringBenchmark.py --sizes 100x4 1000x4 --repeats 5
+
+With props = fm the D_prop and pitch columns of different missions touch
+disjoint rows of RPM_con and prop_thrust, so coloring groups them into a
+few forward solves. The first colored run of a size and strategy computes
+and saves its coloring in --coloring-dir (Driver.COLORING_DIR unless
+given), later runs load it. Colorings are keyed by Driver.coloring_key, so
+the strategies share the directory but not each other's colorings.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Driver import DEFAULTS, build_problem, set_values, total_coloring
+
+CURRENT_SOLVERS = ("newton", "block")
+
+
+def time_totals(fc, fm, props, current_solver, colored, args):
+    prob = build_problem(fc, fm, props, current_solver, optimizer = "SLSQP", recorder = None,
+                         surrogate_backend = args.backend)
+    prob.setup(check = False)
+    set_values(prob, DEFAULTS)
+    prob.set_val("rho", 1.225)
+    prob.set_solver_print(level = -1)
+    solves = None
+    if colored:
+        solves = total_coloring(prob, args.coloring_dir).total_solves()
+    prob.run_model()
+
+    times = []
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        J = prob.driver._compute_totals()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)), solves, J
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs = "+", default = ["100x4", "1000x4"], help = "fc x fm grid sizes")
+    parser.add_argument("--repeats", type = int, default = 5)
+    parser.add_argument("--backend", default = "numpy", help = "surrogate backend")
+    parser.add_argument("--coloring-dir", default = None, help = "defaults to Driver.COLORING_DIR")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    for size in args.sizes:
+        fc, fm = (int(n) for n in size.split("x"))
+        for props in sorted({1, fm}):
+            for current_solver in CURRENT_SOLVERS:
+                plain, _, J = time_totals(fc, fm, props, current_solver, False, args)
+                colored, solves, J_colored = time_totals(fc, fm, props, current_solver, True, args)
+                error = max(np.max(np.abs(J[key] - J_colored[key])) for key in J)
+                print(f"fc {fc} fm {fm} props {props} {current_solver}: plain {plain:.4f} s, "
+                      f"colored {colored:.4f} s ({solves} solves), speedup {plain / colored:.1f}x, "
+                      f"max difference {error:.1e}", flush = True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Scaling benchmark of PropModel over flight_conds x flight_missions, props,
+surrogate backends and current solvers.
+
+Every case sets up the model once and times run_model, compute_totals of
+the objective and constraint with respect to the design variables, and a
+short SLSQP run_driver. The first run_model and compute_totals after setup
+are reported on their own as run_model_first and compute_totals_first.
+The other timings are the median of --repeats runs. Before each run the
+design variables take a small step to a point not seen before, as a
+driver's next iterate would. A repeat therefore pays for its surrogate
+evaluations and Newton solve instead of hitting the surrogate caches, and
+every run_driver starts from the post-setup solver state. Peak traced
+memory of setting up a second copy and running run_model plus
+compute_totals on it is measured in a separate pass, so tracemalloc does
+not distort the timings.
+
+The surrogates are a small KPLSK fixture trained here on a synthetic
+propeller map (and exported to the numpy and table backends), so results
+do not depend on the pickles in PickledSurrogateModels. Run from the
+PROPtimize directory:
+
+    python Benchmarks/ModelBenchmark.py --save baseline.json
+    python Benchmarks/ModelBenchmark.py --compare Benchmarks/ModelBaseline.json
+
+--compare exits with status 1 if any time or peak memory grew by more than
+--tolerance relative to the baseline case of the same name.
+Benchmarks/ModelBaseline.json was recorded on a single core, compare
+against a baseline saved on the same machine when timings matter.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openmdao
+import openmdao.api as om
+from Checkpoint import restore, snapshot
+from Driver import DEFAULTS, DESIGN_VARS, set_values
+from Model import PropModel
+from Propulsion.KrigingPredictor import export_kplsk
+from Propulsion.SurrogateRegistry import SURROGATE_BACKENDS, save_arrays
+from Propulsion.SurrogateTable import build_table, training_bounds
+
+SIZES = ((1, 1), (10, 1), (100, 2), (1000, 4))
+
+#Training box of the fixture: D_prop [m], pitch [deg], rpm [rev/s], velocity [m/s]
+FIXTURE_BOUNDS = ((0.25, 0.6), (3, 15), (20, 250), (0, 35))
+
+
+def make_fixture(directory, samples=120, seed=0, table_points=12):
+    """Trains thrust and power KPLSK models on a synthetic propeller map and
+    writes them to directory for every surrogate backend"""
+    from smt.surrogate_models import KPLSK
+
+    rng = np.random.default_rng(seed)
+    x = np.column_stack([rng.uniform(lo, hi, samples) for lo, hi in FIXTURE_BOUNDS])
+    J = x[:, 3] / (x[:, 2] * x[:, 0])
+    coefficients = {
+        "thrust": 0.12 + 0.004 * x[:, 1] - 0.1 * J,
+        "power": 0.04 + 0.003 * x[:, 1] - 0.02 * J,
+    }
+    for name, y in coefficients.items():
+        sm = KPLSK(n_comp = 2, eval_noise = True, print_global = False)
+        sm.set_training_values(x, y)
+        sm.train()
+        with open(os.path.join(directory, name + "_sm.pkl"), "wb") as fp:
+            pickle.dump(sm, fp)
+        export_kplsk(sm, os.path.join(directory, name + "_sm"))
+        lower, upper = training_bounds(sm)
+        save_arrays(os.path.join(directory, name + "_table"), build_table(sm, lower, upper, table_points))
+    return directory
+
+
+def build(fc, fm, props, backend, current_solver, surrogate_dir):
+    """PropModel with Driver.py's design variables and constraint, and its
+    thrust objective, summed over the cells so SLSQP can drive any fc x fm"""
+    prob = om.Problem(reports = False)
+    prob.model = PropModel(current_solver = current_solver, objective = "thrust")
+    for name, (lower, upper, units) in DESIGN_VARS.items():
+        prob.model.add_design_var(name, lower = lower, upper = upper, units = units)
+    prob.model.add_constraint("RPM_con", upper = 0)
+    prob.driver = om.ScipyOptimizeDriver(optimizer = "SLSQP", disp = False)
+    prob.model_options['*'] = {'flight_conds': fc, "flight_missions": fm, 'props': props,
+                               'surrogate_backend': backend, 'surrogate_dir': surrogate_dir}
+    prob.setup(check = False)
+    set_values(prob, DEFAULTS)
+    prob.set_val("throttle", np.linspace(0.5, 0.9, fc * fm).reshape(fc, fm))
+    prob.set_val("rho", 1.225)
+    prob.final_setup()
+    prob.set_solver_print(level = -1)
+    return prob
+
+
+def _time(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _median_time(fn, repeats, prepare):
+    """Median time of repeats calls of fn, each after an untimed prepare()"""
+    times = []
+    for _ in range(repeats):
+        prepare()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+def run_case(fc, fm, props, backend, current_solver, surrogate_dir, repeats, driver_iter):
+    t0 = time.perf_counter()
+    prob = build(fc, fm, props, backend, current_solver, surrogate_dir)
+    setup = time.perf_counter() - t0
+
+    of = list(prob.model.get_objectives()) + ["RPM_con"]
+    wrt = list(DESIGN_VARS)
+    initial = snapshot(prob, 0)
+    steps = iter(range(1, 3 * repeats + 1))
+    def step():
+        #Design variables 0.1 % further off the initial design every call, so
+        #no repeat finds its surrogate evaluations cached
+        scale = 1 + 1e-3 * next(steps)
+        for name, value in initial["desvars"].items():
+            prob.set_val(name, value * scale)
+    def totals():
+        return prob.compute_totals(of = of, wrt = wrt)
+    def step_and_run():
+        step()
+        prob.run_model()
+
+    result = {
+        "setup": setup,
+        "run_model_first": _time(prob.run_model),
+        "compute_totals_first": _time(totals),
+        "run_model": _median_time(prob.run_model, repeats, step),
+        "compute_totals": _median_time(totals, repeats, step_and_run),
+    }
+
+    tracemalloc.start()
+    traced = build(fc, fm, props, backend, current_solver, surrogate_dir)
+    traced.run_model()
+    traced.compute_totals(of = of, wrt = wrt)
+    result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    del traced
+
+    prob.driver.options["maxiter"] = driver_iter
+    def reset():
+        restore(prob, initial)
+        step()
+    def drive():
+        #SLSQP reports hitting the iteration limit, which is the point here
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            prob.run_driver()
+    result["run_driver"] = _median_time(drive, repeats, reset)
+    return result
+
+
+def cases(sizes, backends, current_solvers):
+    for fc, fm in sizes:
+        for props in sorted({1, fm}):
+            for backend in backends:
+                for current_solver in current_solvers:
+                    yield f"fc{fc}_fm{fm}_p{props}_{backend}_{current_solver}", (fc, fm, props, backend, current_solver)
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that grew by more than tolerance over the baseline"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            ref = baseline.get(name, {}).get(metric)
+            if ref and value > ref * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {value:.4g} vs baseline {ref:.4g} (+{value / ref - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs = "+", default = [f"{fc}x{fm}" for fc, fm in SIZES], help = "fc x fm grid sizes, e.g. 100x2")
+    parser.add_argument("--backends", nargs = "+", default = list(SURROGATE_BACKENDS), choices = SURROGATE_BACKENDS)
+    parser.add_argument("--current-solvers", nargs = "+", default = ["newton", "block"], choices = ("newton", "block"))
+    parser.add_argument("--repeats", type = int, default = 3)
+    parser.add_argument("--driver-iter", type = int, default = 3, help = "SLSQP iterations of the run_driver timing")
+    parser.add_argument("--fixture-dir", default = None, help = "reuse a fixture directory instead of training a new one")
+    parser.add_argument("--save", default = None, help = "write the results as JSON")
+    parser.add_argument("--compare", default = None, help = "baseline JSON to flag regressions against")
+    parser.add_argument("--tolerance", type = float, default = 0.25, help = "relative growth accepted by --compare")
+    args = parser.parse_args()
+
+    fixture_dir = args.fixture_dir or tempfile.mkdtemp(prefix = "proptimize_fixture_")
+    os.makedirs(fixture_dir, exist_ok = True)
+    if not os.path.exists(os.path.join(fixture_dir, "power_table")):
+        make_fixture(fixture_dir)
+        print(f"surrogate fixture written to {fixture_dir}, reuse it with --fixture-dir")
+
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    results = {}
+    for name, case in cases(sizes, args.backends, args.current_solvers):
+        results[name] = run_case(*case, fixture_dir, args.repeats, args.driver_iter)
+        r = results[name]
+        print(f"{name:>32}: setup {r['setup']:.3f} s, run_model {r['run_model']:.4f} s (first {r['run_model_first']:.4f}), "
+              f"compute_totals {r['compute_totals']:.4f} s (first {r['compute_totals_first']:.4f}), run_driver {r['run_driver']:.3f} s, "
+              f"peak {r['peak_memory_mb']:.1f} MB", flush = True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "numpy": np.__version__, "openmdao": openmdao.__version__,
+                       "cases": results}, f, indent = 1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["cases"], args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
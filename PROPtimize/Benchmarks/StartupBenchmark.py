@@ -0,0 +1,62 @@
+"""Times module import and Problem setup for PropModel.
+
+Run from the PROPtimize directory:
+
+    python Benchmarks/StartupBenchmark.py --problems 10
+
+"cold" clears the surrogate registry before every setup, which reproduces
+loading the pickles once per PropCoefficients instance. "warm" keeps the
+registry, so only the first Problem reads the surrogates from disk.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import openmdao.api as om
+from Model import PropModel
+from Propulsion import SurrogateRegistry
+
+
+def import_time():
+    code = "import time; t = time.perf_counter(); import Model; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def setup_times(problems, surrogate_dir, cold):
+    times = []
+    for _ in range(problems):
+        if cold:
+            SurrogateRegistry.clear()
+        start = time.perf_counter()
+        prob = om.Problem(reports=False)
+        prob.model = PropModel()
+        prob.model_options['*'] = {'flight_conds': 1, "flight_missions": 1, 'props': 1}
+        if surrogate_dir is not None:
+            prob.model_options['*']['surrogate_dir'] = surrogate_dir
+        prob.setup(check=False)
+        prob.final_setup()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--problems", type=int, default=10, help="number of Problems to set up per mode")
+    parser.add_argument("--surrogate-dir", default=None, help="directory holding thrust_sm.pkl and power_sm.pkl")
+    args = parser.parse_args()
+
+    print(f"import Model: {import_time():.3f} s")
+    for mode in ("cold", "warm"):
+        times = setup_times(args.problems, args.surrogate_dir, cold=(mode == "cold"))
+        print(f"{mode:>5} setup: first {times[0]:.3f} s, mean of rest "
+              f"{sum(times[1:]) / max(len(times) - 1, 1):.3f} s, total {sum(times):.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Average current-solve iterations per model evaluation over a sequence of
+design steps like a driver takes, with and without warm starting.
+
+Run from the PROPtimize directory:
+
+    python Benchmarks/WarmStartBenchmark.py --flight-conds 50 --steps 40
+
+"reset" puts res_current back to 30 A before every evaluation. "warm"
+leaves the starting point to the model: the cold-start estimate, then the
+previous currents extrapolated along their sensitivities to the inputs.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openmdao.api as om
+from Model import PropModel
+
+BOUNDS = {
+    "D_prop": (12, 23, "inch"),
+    "pitch": (3, 15, "deg"),
+    "motor_mass": (0.288, 1.701, "kg"),
+    "motor_idle_current": (1, 3.6, "A"),
+}
+
+
+def build(fc, fm, current_solver, warm, backend):
+    prob = om.Problem(reports=False)
+    prob.model = PropModel(current_solver=current_solver)
+    prob.model_options['*'] = {'flight_conds': fc, "flight_missions": fm, 'props': 1,
+                               'surrogate_backend': backend, 'warm_start': warm}
+    prob.setup(check=False)
+    prob.set_val("num_motors", 1)
+    prob.set_val("battery_voltage_supply", 22.2, units="V")
+    prob.set_val("battery_resistance", 0.012, units="ohm")
+    prob.set_val("throttle", np.linspace(0.4, 0.9, fc * fm).reshape(fc, fm))
+    prob.set_val("velocity", np.linspace(5, 20, fc * fm).reshape(fc, fm), units="m/s")
+    prob.set_val('battery_mass', .71, units='lb')
+    prob.set_val('rho', 1.225)
+    prob.set_solver_print(level=-1)
+    return prob
+
+
+def iterations(prob, current_solver):
+    if current_solver == "newton":
+        return prob.model.nonlinear_solver._iter_count
+    return prob.model.PropulsionGroup.current.mean_iterations
+
+
+def run(args, current_solver, warm):
+    prob = build(args.flight_conds, args.flight_missions, current_solver, warm, args.backend)
+    rng = np.random.default_rng(args.seed)
+    design = {name: np.array([(lo + hi) / 2]) for name, (lo, hi, _) in BOUNDS.items()}
+    counts = []
+    for _ in range(args.steps):
+        for name, (lo, hi, units) in BOUNDS.items():
+            design[name] = np.clip(design[name] + args.step * (hi - lo) * rng.standard_normal(1), lo, hi)
+            prob.set_val(name, design[name], units=units)
+        if not warm:
+            prob.set_val("res_current", 30, units="A")
+        prob.run_model()
+        counts.append(iterations(prob, current_solver))
+    return np.mean(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flight-conds", type=int, default=50)
+    parser.add_argument("--flight-missions", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=40, help="design steps to evaluate")
+    parser.add_argument("--step", type=float, default=0.02, help="step size as a fraction of each design variable range")
+    parser.add_argument("--backend", default="smt", help="surrogate backend")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for current_solver in ("newton", "block"):
+        reset = run(args, current_solver, warm=False)
+        warm = run(args, current_solver, warm=True)
+        unit = "Newton iterations" if current_solver == "newton" else "mean per-cell iterations"
+        print(f"{current_solver:>6}: {unit} per evaluation, reset {reset:.2f}, warm {warm:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Catalogs of real motors, props and batteries with KD-tree lookups.
+
+The optimizer works on continuous motor mass, idle current, prop diameter
+and pitch, and Motor and Battery turn those into kv, resistance and capacity
+through regressions. A Catalog holds the parts that can actually be bought.
+Each kind comes from its own CSV file in a directory, with a name column
+followed by the columns of COLUMNS in the units given there:
+
+    motors.csv     name,mass,kv,resistance,idle_current
+    props.csv      name,D_prop,pitch
+    batteries.csv  name,mass,capacity,voltage,resistance
+
+The catalog does two things:
+
+- model_options() fits the Motor kv and resistance regressions and the
+  Battery capacity regression to the catalog. Pass them to
+  Driver.build_problem so the optimum is sized on the same parts.
+- candidates() takes an optimum, finds the k nearest motors, props and
+  batteries through a cKDTree over each table's standardized columns, and
+  re-evaluates every combination in one batch through
+  Propulsion.PropulsionChain. Each motor is evaluated with its own kv and
+  resistance, not the fitted ones, and each battery with its own voltage,
+  resistance, mass and capacity.
+
+    catalog = Catalog.load("catalog")
+    prob = build_problem(optimizer="SLSQP", **catalog.model_options())
+    ...
+    ranked = catalog.candidates(design, conditions={"throttle": [0.5, 0.8]}, k=5)
+
+Run from the PROPtimize directory to time the lookups of a catalog:
+
+    python Catalog.py catalog --queries 1000
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from Defaults import DEFAULTS, convert, nominal_inputs
+from Propulsion.Physics import battery_endurance
+from Propulsion.PropulsionChain import PropulsionChain, cold_start_current
+from Propulsion.SurrogateRegistry import get_surrogates
+
+#Columns of each catalog file, name: units
+COLUMNS = {
+    "motors": {"mass": "kg", "kv": "rpm/V", "resistance": "ohm", "idle_current": "A"},
+    "props": {"D_prop": "inch", "pitch": "deg"},
+    "batteries": {"mass": "kg", "capacity": "A*h", "voltage": "V", "resistance": "ohm"},
+}
+
+
+class PartTable(object):
+    """One kind of part, columns held as arrays with one row per part.
+    KD-trees over standardized columns are built on first use for each
+    combination of columns queried, and the parts inside a set of bounds
+    on first use of those bounds."""
+
+    def __init__(self, names, columns):
+        self.names = np.asarray(names)
+        self.columns = {name: np.asarray(value, dtype = float) for name, value in columns.items()}
+        self._trees = {}
+        self._masks = {}
+
+    @classmethod
+    def from_csv(cls, path, columns):
+        with open(path, newline = "") as f:
+            reader = csv.reader(f)
+            header = [name.strip() for name in next(reader)]
+            missing = [name for name in ("name",) + tuple(columns) if name not in header]
+            if missing:
+                raise ValueError(f"{path} is missing the columns {missing}")
+            rows = list(reader)
+        index = {name: header.index(name) for name in ("name",) + tuple(columns)}
+        return cls([row[index["name"]] for row in rows],
+                   {name: [float(row[index[name]]) for row in rows] for name in columns})
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, i):
+        return dict({"name": str(self.names[i])}, **{name: float(value[i]) for name, value in self.columns.items()})
+
+    def _tree(self, keys):
+        if keys not in self._trees:
+            data = np.column_stack([self.columns[key] for key in keys])
+            scale = np.std(data, axis = 0)
+            scale[scale == 0] = 1.0
+            self._trees[keys] = (cKDTree(data / scale), scale)
+        return self._trees[keys]
+
+    def _inside(self, bounds):
+        key = tuple(sorted((name, float(lower), float(upper)) for name, (lower, upper) in bounds.items()))
+        if key not in self._masks:
+            inside = np.ones(len(self), dtype = bool)
+            for name, lower, upper in key:
+                inside &= (self.columns[name] >= lower) & (self.columns[name] <= upper)
+            self._masks[key] = inside
+        return self._masks[key]
+
+    def nearest(self, point, k=5, bounds=None):
+        """Indices of the k parts nearest to point (column: value), in
+        standardized distance over the columns of point. With bounds
+        (column: (lower, upper)) only parts inside them are returned, the
+        query widening until k of them are found or the table runs out."""
+        keys = tuple(point)
+        tree, scale = self._tree(keys)
+        query = np.array([point[key] for key in keys]) / scale
+        inside = self._inside(bounds or {})
+
+        n = k
+        while True:
+            n = min(n, len(self))
+            _, idx = tree.query(query, n)
+            idx = np.atleast_1d(idx)
+            found = idx[inside[idx]]
+            if len(found) >= k or n == len(self):
+                return found[:k]
+            n *= 4
+
+
+def fit_kv(mass, kv):
+    """(gain, offset) of kv = gain / (mass + offset), fitted on 1 / kv, which is linear in mass"""
+    slope, intercept = np.polyfit(mass, 1 / np.asarray(kv), 1)
+    return (1 / slope, intercept / slope)
+
+
+def fit_resistance(idle_current, resistance):
+    """(gain, exponent) of resistance = gain * idle_current ** exponent, fitted in log space"""
+    exponent, log_gain = np.polyfit(np.log(idle_current), np.log(resistance), 1)
+    return (float(np.exp(log_gain)), float(exponent))
+
+
+def fit_capacity(mass, capacity):
+    """(gain, offset) of capacity = gain * mass + offset"""
+    gain, offset = np.polyfit(mass, capacity, 1)
+    return (float(gain), float(offset))
+
+
+class Catalog(object):
+    """Motor, prop and battery tables, any of which may be missing"""
+
+    def __init__(self, motors=None, props=None, batteries=None):
+        self.tables = {kind: table for kind, table in
+                       (("motors", motors), ("props", props), ("batteries", batteries)) if table is not None}
+        self._model_options = self._fit()
+
+    @classmethod
+    def load(cls, directory):
+        """Reads motors.csv, props.csv and batteries.csv from directory, whichever exist"""
+        tables = {}
+        for kind, columns in COLUMNS.items():
+            path = os.path.join(directory, kind + ".csv")
+            if os.path.exists(path):
+                tables[kind] = PartTable.from_csv(path, columns)
+        return cls(**tables)
+
+    def model_options(self):
+        """kv_coeffs, resistance_coeffs and capacity_coeffs fitted to the
+        catalog, for Driver.build_problem or the components directly"""
+        return dict(self._model_options)
+
+    def _fit(self):
+        #Fitted once when the catalog is built, nearest_parts and candidates use them on every call
+        options = {}
+        if "motors" in self.tables:
+            motors = self.tables["motors"].columns
+            options["kv_coeffs"] = tuple(float(v) for v in fit_kv(motors["mass"], motors["kv"]))
+            options["resistance_coeffs"] = fit_resistance(motors["idle_current"], motors["resistance"])
+        if "batteries" in self.tables:
+            batteries = self.tables["batteries"].columns
+            options["capacity_coeffs"] = fit_capacity(batteries["mass"], batteries["capacity"])
+        return options
+
+    def nearest_parts(self, design, k=5, bounds=None):
+        """Indices of the k nearest parts of each kind to a continuous design
+        in chain units (see Defaults.nominal_inputs) plus battery_mass in kg,
+        with the motor's kv and resistance and the battery's capacity from
+        their regressions. bounds are per kind, e.g.
+        {"props": {"D_prop": (12, 23)}}."""
+        bounds = bounds or {}
+        capacity_gain, capacity_offset = self.model_options().get("capacity_coeffs", (7.3, -0.246))
+        points = {
+            "motors": {"mass": design["motor_mass"], "idle_current": design["motor_idle_current"],
+                       "kv": design["kv_gain"] / (design["motor_mass"] + design["kv_offset"]),
+                       "resistance": design["resistance_gain"] * design["motor_idle_current"] ** design["resistance_exponent"]},
+            "props": {"D_prop": design["D_prop"] / 0.0254, "pitch": design["pitch"]},
+            "batteries": {"voltage": design["battery_voltage_supply"], "resistance": design["battery_resistance"],
+                          "mass": design["battery_mass"], "capacity": capacity_gain * design["battery_mass"] + capacity_offset},
+        }
+        return {kind: table.nearest(points[kind], k, bounds.get(kind)) for kind, table in self.tables.items()}
+
+    def candidates(self, design=None, conditions=None, k=5, bounds=None, surrogate_dir=None,
+                   surrogate_backend="numpy", num_motors=1.0, atol=1e-8, maxiter=50):
+        """Evaluates every combination of the k nearest parts of each kind.
+
+        design holds name: value or name: (value, units) pairs as in
+        Defaults.DEFAULTS, at sea-level density unless it sets rho, as in
+        Defaults.nominal_inputs. conditions hold one value per flight condition for
+        throttle and velocity (SI units). Returns one row per combination,
+        best first: feasible combinations before infeasible ones, then by
+        thrust summed over the conditions. Each row has the part names, the
+        battery mass and capacity, and the per-condition thrust, rpm,
+        current, endurance and RPM constraint. Kinds missing from the catalog
+        keep the design's continuous values.
+        """
+        options = self.model_options()
+        capacity_gain, capacity_offset = options.get("capacity_coeffs", (7.3, -0.246))
+        x0 = nominal_inputs(design, kv_coeffs = options.get("kv_coeffs", (1.3132 * 120, 0.01)),
+                            resistance_coeffs = options.get("resistance_coeffs", (0.0467, -1.892)))
+        mass = dict(DEFAULTS, **(design or {}))["battery_mass"]
+        mass, units = mass if isinstance(mass, tuple) else (mass, None)
+        battery_mass = convert(float(np.squeeze(mass)), units, "kg")
+        picks = self.nearest_parts(dict(x0, battery_mass = battery_mass), k, bounds)
+
+        conditions = {name: np.atleast_1d(np.asarray(value, dtype = float)) for name, value in (conditions or {}).items()}
+        fc = max([len(value) for value in conditions.values()] + [1])
+        grids = np.meshgrid(*[picks.get(kind, np.array([-1])) for kind in COLUMNS], np.arange(fc), indexing = "ij")
+        motor, prop, battery, cond = (grid.ravel() for grid in grids)
+
+        x = {name: np.full(motor.size, value) for name, value in x0.items()}
+        for name, value in conditions.items():
+            x[name] = np.broadcast_to(value, fc)[cond]
+        if "motors" in self.tables:
+            motors = self.tables["motors"].columns
+            #kv = gain / (mass + 0) and resistance = gain * idle_current ** 0 reproduce the part exactly
+            x["motor_mass"] = motors["mass"][motor]
+            x["motor_idle_current"] = motors["idle_current"][motor]
+            x["kv_gain"] = motors["kv"][motor] * motors["mass"][motor]
+            x["kv_offset"] = np.zeros(motor.size)
+            x["resistance_gain"] = motors["resistance"][motor]
+            x["resistance_exponent"] = np.zeros(motor.size)
+        if "props" in self.tables:
+            props = self.tables["props"].columns
+            x["D_prop"] = props["D_prop"][prop] * 0.0254
+            x["pitch"] = props["pitch"][prop]
+        if "batteries" in self.tables:
+            batteries = self.tables["batteries"].columns
+            x["battery_voltage_supply"] = batteries["voltage"][battery]
+            x["battery_resistance"] = batteries["resistance"][battery]
+            #Not a chain input, only the endurance of each candidate depends on it
+            x["battery_mass"] = batteries["mass"][battery]
+            x["nominal_capacity"] = batteries["capacity"][battery]
+        else:
+            x["battery_mass"] = np.full(motor.size, battery_mass)
+            x["nominal_capacity"] = capacity_gain * x["battery_mass"] + capacity_offset
+
+        chain = PropulsionChain(*get_surrogates(surrogate_dir, surrogate_backend))
+        guess = cold_start_current(x["battery_voltage_supply"], x["throttle"], x["motor_idle_current"],
+                                   x["a"], x["b"], x["c"], (x["resistance_gain"], x["resistance_exponent"]))
+        current, _, converged = chain.solve_current(x, guess, atol = atol, maxiter = maxiter)
+        out = chain.evaluate(current, x)
+        thrust = chain.thrust(out, x, num_motors)
+        rpm_con = out["rpm"] - 150000 / (x["D_prop"] / 0.0254)
+        endurance, _ = battery_endurance(x["nominal_capacity"], current)
+
+        shape = (-1, fc)
+        thrust, rpm, current, endurance, rpm_con, converged = (np.reshape(value, shape) for value in
+                                                               (thrust, out["rpm"], current, endurance, rpm_con, converged))
+        rows = []
+        for i, (m, p, b) in enumerate(zip(motor[::fc], prop[::fc], battery[::fc])):
+            row = {kind: str(self.tables[kind].names[j]) for kind, j in zip(COLUMNS, (m, p, b)) if kind in self.tables}
+            row.update(battery_mass = float(x["battery_mass"][i * fc]), nominal_capacity = float(x["nominal_capacity"][i * fc]),
+                       prop_thrust = thrust[i], rpm = rpm[i], res_current = current[i], endurance = endurance[i], RPM_con = rpm_con[i],
+                       feasible = bool(np.all(converged[i]) and np.max(rpm_con[i]) <= 0))
+            rows.append(row)
+        rows.sort(key = lambda row: (not row["feasible"], -np.sum(row["prop_thrust"])))
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help = "directory holding motors.csv, props.csv and batteries.csv")
+    parser.add_argument("--queries", type = int, default = 1000, help = "random nearest-motor lookups to time")
+    parser.add_argument("-k", type = int, default = 5)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    catalog = Catalog.load(args.directory)
+    print(f"loaded {', '.join(f'{len(table)} {kind}' for kind, table in catalog.tables.items())} "
+          f"in {time.perf_counter() - t0:.2f} s")
+    print("fitted model options:", catalog.model_options())
+
+    rng = np.random.default_rng(0)
+    for kind, table in catalog.tables.items():
+        points = [{name: rng.choice(values) for name, values in table.columns.items()} for _ in range(args.queries)]
+        t0 = time.perf_counter()
+        table.nearest(points[0], args.k)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for point in points:
+            table.nearest(point, args.k)
+        print(f"{kind}: index built in {build * 1e3:.1f} ms, "
+              f"{(time.perf_counter() - t0) / args.queries * 1e3:.3f} ms per {args.k}-nearest lookup")
+
+
+if __name__ == "__main__":
+    main()
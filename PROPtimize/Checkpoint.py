@@ -0,0 +1,209 @@
+"""Periodic driver checkpoints and resuming from them.
+
+A SqliteRecorder case holds the design variables of an iteration, but not
+what it takes to pick the run up where it stopped. A checkpoint holds:
+
+- the design variables and the iteration counter,
+- the converged states (res_current),
+- the solver state of the systems that keep some: the surrogate caches of
+  PropCoefficients, the warm start of CurrentBalance and the guess flag of
+  PropulsionGroup, through their checkpoint_state and restore_state methods.
+  The caches go with the surrogates_hash of the surrogates that filled them,
+  and are dropped with a warning on resume when the problem's surrogates
+  hash differently.
+
+CheckpointRecorder snapshots all of this every `every` driver iterations.
+Taking a snapshot only copies a few arrays; a background thread pickles it
+and atomically replaces the checkpoint file. If snapshots come faster than
+the disk takes them, only the newest one waiting is written:
+
+    prob = build_problem(fc, fm, props, checkpoint="RUN.ckpt")
+    prob.setup()
+    set_values(prob, DEFAULTS)
+    resume(prob, "RUN.ckpt")    # after a crash, before run_driver
+    prob.run_driver()
+    prob.cleanup()              # writes the last snapshot and stops the writer
+
+Driver.py checkpoints to PROPTIMIZE_CHECKPOINT, resuming from it when
+PROPTIMIZE_RESUME is set.
+
+A checkpoint restores the model, not the run. Resuming still builds, sets
+up and final_setups the problem from scratch, so it saves the optimizer
+iterations already done but none of the setup time. The optimizer itself
+starts over from the checkpointed design: IPOPT's multipliers and barrier
+parameter, SLSQP's quasi-Newton Hessian and the iteration counts of either
+are not part of a checkpoint, so a resumed run takes a different and
+usually longer path to the optimum than an uninterrupted one.
+"""
+import os
+import pickle
+import threading
+import time
+
+from ColumnarRecorder import DriverRecorder
+
+#Converged implicit outputs carried in a checkpoint
+STATES = ("res_current",)
+
+
+def _stateful_systems(model):
+    return [system for system in model.system_iter(include_self = True, recurse = True)
+            if hasattr(system, "checkpoint_state")]
+
+
+def snapshot(prob, counter):
+    """Checkpoint contents of a set up problem at iteration counter"""
+    model = prob.model
+    return {
+        "counter": counter,
+        "timestamp": time.time(),
+        "desvars": {name: prob.get_val(name).copy() for name in model.get_design_vars()},
+        "states": {name: prob.get_val(name).copy() for name in STATES},
+        "systems": {system.pathname: system.checkpoint_state() for system in _stateful_systems(model)},
+    }
+
+
+def write_checkpoint(path, checkpoint):
+    """Pickles checkpoint to path through a temporary file, so path always holds a complete one"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(checkpoint, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class _Writer(object):
+    """Background thread writing the newest submitted checkpoint"""
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self.dropped = 0
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target = self._run, name = "checkpoint-writer", daemon = True)
+        self._thread.start()
+
+    def submit(self, checkpoint):
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = checkpoint
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                checkpoint, self._pending = self._pending, None
+                self._busy = True
+            try:
+                write_checkpoint(self.path, checkpoint)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.written += 1
+                    self._cond.notify_all()
+
+    def flush(self):
+        """Blocks until everything submitted has been written"""
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class CheckpointRecorder(DriverRecorder):
+    """Checkpoints the problem of the recorded driver to filepath every
+    `every` iterations and on shutdown (Problem.cleanup). Iterations are
+    counted from start, the counter of the checkpoint a run resumed from."""
+
+    def __init__(self, filepath, every=10, start=0):
+        super().__init__()
+        self._filepath = filepath
+        self.every = every
+        self.start = start
+        self._writer = None
+        self._driver = None
+        self._last = None
+
+    def startup(self, recording_requester, comm=None):
+        super().startup(recording_requester, comm)
+        if self._writer is None:
+            self._writer = _Writer(self._filepath)
+
+    @property
+    def counter(self):
+        return self.start + self._counter
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        self._driver = recording_requester
+        if self.counter % self.every == 0:
+            self._writer.submit(snapshot(recording_requester._problem(), self.counter))
+            self._last = self.counter
+
+    def flush(self):
+        """Waits for the checkpoint being written, if any"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def shutdown(self):
+        if self._writer is None:
+            return
+        if self._driver is not None and self._last != self.counter:
+            self._writer.submit(snapshot(self._driver._problem(), self.counter))
+            self._last = self.counter
+        self._writer.flush()
+        self._writer.close()
+        self._writer = None
+
+
+def restore(prob, checkpoint):
+    """Sets the design variables and states of a snapshot on the final_setup
+    problem it was taken from, and gives its systems their solver state back"""
+    for name, value in checkpoint["desvars"].items():
+        prob.set_val(name, value)
+    for name, value in checkpoint["states"].items():
+        prob.set_val(name, value)
+
+    systems = {system.pathname: system for system in _stateful_systems(prob.model)}
+    for pathname, state in checkpoint["systems"].items():
+        if pathname in systems:
+            systems[pathname].restore_state(state)
+
+
+def resume(prob, path):
+    """Restores a checkpoint into a set up problem of the same size, before
+    run_driver. The design variables and states are set, the systems get
+    their solver state back, and a CheckpointRecorder on the driver continues
+    counting from the checkpoint. Returns the checkpoint.
+
+    prob must already be set up, and is final_setup here so the restored
+    values land on the set up vectors; the optimizer is not restored (see
+    the module docstring) and restarts from the checkpointed design."""
+    checkpoint = load_checkpoint(path)
+    prob.final_setup()
+
+    missing = set(prob.model.get_design_vars()) ^ set(checkpoint["desvars"])
+    if missing:
+        raise ValueError(f"{path} does not match the problem's design variables: {sorted(missing)}")
+    restore(prob, checkpoint)
+
+    for recorder in prob.driver._rec_mgr._recorders:
+        if isinstance(recorder, CheckpointRecorder):
+            recorder.start = checkpoint["counter"]
+    return checkpoint
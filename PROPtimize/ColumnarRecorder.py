@@ -0,0 +1,119 @@
+"""Columnar driver recorder with batched npz flushes.
+
+SqliteRecorder with includes = ["*"] serializes every variable to JSON and
+commits a row on every driver iteration. ColumnarRecorder only keeps what
+the driver's recording_options select (desvars, objectives, constraints and
+the includes list), copies each value into an in-memory column and writes
+the columns out every batch_size iterations as one npz part in the
+recorder's directory, so an iteration costs a few array copies:
+
+    prob.driver.add_recorder(ColumnarRecorder("RECORDER.columns"))
+    prob.driver.recording_options["includes"] = ["rpm", "prop_power"]
+    prob.run_driver()
+    prob.cleanup()
+    history = load_columns("RECORDER.columns")
+    history["prop_thrust"]  # (iterations, fc, fm)
+
+Variables are stored under their promoted names, design variables fed by
+the automatic IVC under the design variable name.
+"""
+import glob
+import os
+
+import numpy as np
+from openmdao.recorders.case_recorder import CaseRecorder
+
+#Per-iteration fields stored next to the variables
+META = ("counter", "timestamp", "success")
+
+
+class DriverRecorder(CaseRecorder):
+    """CaseRecorder base for recorders that only see driver iterations:
+    metadata, viewer data and derivatives are dropped. Subclasses implement
+    record_iteration_driver."""
+
+    def __init__(self):
+        super().__init__(record_viewer_data = False)
+
+    def record_metadata_system(self, system, run_number=None):
+        pass
+
+    def record_metadata_solver(self, solver, run_number=None):
+        pass
+
+    def record_viewer_data(self, model_viewer_data):
+        pass
+
+    def record_derivatives_driver(self, recording_requester, data, metadata):
+        pass
+
+
+class ColumnarRecorder(DriverRecorder):
+    """Records driver iterations as columns, flushed to filepath/part-NNNNN.npz
+    every batch_size iterations and on shutdown (Problem.cleanup). Any
+    previous parts in filepath are removed when a run starts."""
+
+    def __init__(self, filepath, batch_size=100):
+        super().__init__()
+        self._filepath = filepath
+        self.batch_size = batch_size
+        self._columns = {}
+        self._names = None
+        self._part = 0
+        self._rows = 0
+
+    def startup(self, recording_requester, comm=None):
+        super().startup(recording_requester, comm)
+        os.makedirs(self._filepath, exist_ok = True)
+        for path in glob.glob(os.path.join(self._filepath, "part-*.npz")):
+            os.remove(path)
+        self._columns = {}
+        self._names = None
+        self._part = 0
+        self._rows = 0
+
+    def _promoted(self, driver):
+        model = driver._problem().model
+        names = {source: meta['prom_name'] for source, meta in
+                 model.get_io_metadata(iotypes = 'output', metadata_keys = ['units'], return_rel_names = False).items()}
+        for name, meta in model.get_design_vars().items():
+            names[meta['source']] = name
+        return names
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        if self._names is None:
+            self._names = self._promoted(recording_requester)
+
+        row = {name: value for name, value in zip(META, (self._counter, metadata['timestamp'], metadata['success']))}
+        for source, value in data['output'].items():
+            row[self._names.get(source, source)] = np.array(value)
+        for name, value in row.items():
+            self._columns.setdefault(name, []).append(value)
+
+        self._rows += 1
+        if self._rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered iterations as the next part"""
+        if not self._rows:
+            return
+        np.savez(os.path.join(self._filepath, f"part-{self._part:05d}.npz"),
+                 **{name: np.stack(values) for name, values in self._columns.items()})
+        self._columns = {}
+        self._part += 1
+        self._rows = 0
+
+    def shutdown(self):
+        self.flush()
+
+
+def load_columns(filepath, names=None):
+    """Concatenates the parts of a ColumnarRecorder run, name: array with one
+    row per recorded iteration, for names or every recorded variable"""
+    columns = {}
+    for path in sorted(glob.glob(os.path.join(filepath, "part-*.npz"))):
+        with np.load(path) as part:
+            for name in part.files if names is None else names:
+                columns.setdefault(name, []).append(part[name])
+    return {name: np.concatenate(parts) for name, parts in columns.items()}
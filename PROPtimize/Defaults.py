@@ -0,0 +1,76 @@
+"""Default design of the PROPtimize scripts and its NumPy chain inputs.
+
+DEFAULTS is the fixed inputs and starting design Driver.py and the scripts
+built on it start from. nominal_inputs turns it into the floats the NumPy
+propulsion chain computes with. Nothing here imports OpenMDAO, so the
+chain-only tools (MonteCarlo, PerformanceMap, Catalog) load without the
+model, the drivers or the recorders.
+"""
+import numpy as np
+
+from Propulsion.PropulsionChain import INPUTS
+
+#Fixed inputs and starting design, name: (value, units)
+DEFAULTS = {
+    "num_motors": (1, None),
+    "battery_voltage_supply": (22.2, "V"),
+    "battery_resistance": (0.012, "ohm"),
+    "D_prop": (14, "inch"),
+    "pitch": (5, "deg"),
+    "throttle": (0.8, None),
+    "velocity": (45, "ft/s"),
+    "motor_idle_current": (2.15, "A"),
+    "motor_mass": (0.5234, "kg"),
+    "battery_mass": (.71, "lb"),
+}
+
+#Units the chain computes in, name: units
+UNITS = {
+    "battery_voltage_supply": "V",
+    "battery_resistance": "ohm",
+    "throttle": None,
+    "motor_idle_current": "A",
+    "motor_mass": "kg",
+    "D_prop": "m",
+    "pitch": "deg",
+    "velocity": "m/s",
+    "rho": "kg/m**3",
+}
+
+#Units the chain inputs may be given in, units: (chain units, factor), the factors of OpenMDAO's unit library
+FACTORS = {
+    "V": ("V", 1.0), "mV": ("V", 0.001),
+    "ohm": ("ohm", 1.0), "mohm": ("ohm", 0.001),
+    "A": ("A", 1.0), "mA": ("A", 0.001),
+    "kg": ("kg", 1.0), "g": ("kg", 0.001), "lb": ("kg", 0.45359237),
+    "m": ("m", 1.0), "cm": ("m", 0.01), "mm": ("m", 0.001), "inch": ("m", 0.0254), "ft": ("m", 0.3048),
+    "deg": ("deg", 1.0), "rad": ("deg", 57.29577951308232),
+    "m/s": ("m/s", 1.0), "ft/s": ("m/s", 0.3048), "km/h": ("m/s", 0.2777777777777778),
+    "knot": ("m/s", 0.5144444444444445), "mi/h": ("m/s", 0.44704),
+    "kg/m**3": ("kg/m**3", 1.0), "slug/ft**3": ("kg/m**3", 515.3788170792658),
+}
+
+
+def convert(value, units, target):
+    """value in units converted to target, one of the chain's units"""
+    if units is None or units == target:
+        return value
+    if units not in FACTORS or FACTORS[units][0] != target:
+        raise ValueError(f"Can't convert {units} to {target}, known units are {sorted(FACTORS)}")
+    return value * FACTORS[units][1]
+
+
+def nominal_inputs(overrides=None, a=1.6054, b=1.6519, c=0.6455,
+                   kv_coeffs=(1.3132 * 120, 0.01), resistance_coeffs=(0.0467, -1.892)):
+    """Chain inputs and coefficients of one design as floats in chain units.
+    overrides are name: value or name: (value, units) pairs replacing those
+    of DEFAULTS at sea-level density."""
+    values = dict(DEFAULTS, rho = (1.225, "kg/m**3"))
+    values.update(overrides or {})
+    nominal = {}
+    for name in INPUTS:
+        value, units = values[name] if isinstance(values[name], tuple) else (values[name], None)
+        nominal[name] = convert(float(np.squeeze(value)), units, UNITS[name])
+    nominal.update(a = a, b = b, c = c, kv_gain = kv_coeffs[0], kv_offset = kv_coeffs[1],
+                   resistance_gain = resistance_coeffs[0], resistance_exponent = resistance_coeffs[1])
+    return nominal
@@ -1,69 +1,194 @@
+import glob
+import hashlib
+import json
+import os
 import openmdao.api as om
+from openmdao.utils.coloring import Coloring, compute_total_coloring
 from Model import PropModel
+from ColumnarRecorder import ColumnarRecorder
+from Instrumentation import instrument
+from Checkpoint import CheckpointRecorder, resume
+from Defaults import DEFAULTS
+from Propulsion.SurrogateRegistry import surrogates_hash
 import numpy as np
 
-prob = om.Problem()
-
-prob.model = PropModel()
-# Driver setup
-prob.driver = om.pyOptSparseDriver()
-prob.driver.options["optimizer"] = "IPOPT"
-prob.driver.options["debug_print"] = ["desvars", "nl_cons", "objs"]
-
-recorder = om.SqliteRecorder("RECORDER.sql")
-prob.driver.add_recorder(recorder)
-prob.driver.recording_options["includes"] = ["*"]
-prob.driver.recording_options["record_objectives"] = True
-prob.driver.recording_options["record_constraints"] = True
-prob.driver.recording_options["record_desvars"] = True
-# Set up driver recorder
-
-'''For endurance based optimization, it is recommended to optimize for battery mass, 
-otherwise a standard battery mass of 0.71 kg is added.'''
-
-#prob.model.add_design_var("battery_mass", units = 'kg', lower = .1, upper = 1)
-prob.model.add_design_var('motor_idle_current', units = 'A', lower = 1, upper = 3.6)
-prob.model.add_design_var('motor_mass', lower = 0.288, upper = 1.701, units = 'kg')
-prob.model.add_design_var("D_prop", lower=12, upper=23, units="inch")
-prob.model.add_design_var("pitch", lower=3, upper=15, units="deg")
-#prob.model.add_design_var("throttle", lower = 0.1, upper = 1)
-#prob.model.add_design_var("velocity", units = "m/s", lower =1, upper = 35)
-
-prob.model.add_objective('prop_thrust', scaler = -1)
-prob.model.add_constraint("RPM_con", upper = 0)
-
-prob.model_options['*'] = {'flight_conds': 1, "flight_missions": 1, 'props': 1}
-prob.setup(check=True)
-
-prob.set_val("num_motors", 1)
-prob.set_val("battery_voltage_supply", 22.2, units = "V")
-prob.set_val("battery_resistance", 0.012, units = "ohm")
-
-prob.set_val("D_prop", 14, units = "inch")
-prob.set_val("pitch", 5, units= "deg")
-prob.set_val("throttle", 0.8)
-prob.set_val("velocity", 45, units = "ft/s")
-prob.set_val('motor_idle_current', 2.15, units = 'A')
-prob.set_val('motor_mass', 0.5234, units = 'kg')
-prob.set_val('battery_mass', .71, units = 'lb')
-
-prob.set_solver_print(level=-1)
-prob.set_solver_print(level=2, depth=1)
-
-prob.run_driver()
-
-print(f"Optimal Propeller Diameter: {prob.get_val('D_prop', units='inch')} in")
-print(f"Optimal Propeller Pitch: {prob.get_val('pitch', units='deg')} degrees")
-print(f"Throttle: {prob.get_val('throttle')}")
-print(f"thrust {prob.get_val('prop_thrust', units = 'N')} N")
-print(f"battery power {prob.get_val('battery_power', units = 'W')} W")
-print(f"esc power {prob.get_val('esc_power', units = 'W')} W")
-print(f"motor power {prob.get_val('motor_power', units = 'W')} W")
-print(f"power {prob.get_val('prop_power', units = 'W')} W")
-print(f"rpm: {prob.get_val('rpm', units = 'rpm') } rpm")
-print(f"motor resistance: {prob.get_val('motor_resistance', units ='ohm')}")
-print(f"Optimal Motor KV{prob.get_val('motor_kv', units = 'rpm/V')} rpm/V")
-print(f"Optimal Motor Idle Current{prob.get_val('motor_idle_current', units = 'A')} A")
-print(f"Optimal Motor Mass{prob.get_val('motor_mass', units = 'kg')} kg")
-print(f"nominal capacity: {prob.get_val('nominal_capacity', units = 'A*h')}")
-print(f"battery current {prob.get_val('battery_current', units = 'A')} A")
\ No newline at end of file
+#Design variables of the thrust optimization, name: (lower, upper, units)
+DESIGN_VARS = {
+    'motor_idle_current': (1, 3.6, 'A'),
+    'motor_mass': (0.288, 1.701, 'kg'),
+    'D_prop': (12, 23, 'inch'),
+    'pitch': (3, 15, 'deg'),
+}
+
+#Where total_coloring keeps the colorings, next to the sources whatever the working directory
+COLORING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "colorings")
+
+#Sources whose changes can change the sparsity of the total derivatives
+COLORING_SOURCES = ("Model.py", "Driver.py", os.path.join("Propulsion", "*.py"))
+
+#Outputs recorded every driver iteration next to the desvars, objective and constraints
+RECORDED_OUTPUTS = ["rpm", "prop_power", "battery_power", "res_current", "motor_kv", "motor_resistance"]
+
+
+def build_problem(flight_conds=1, flight_missions=1, props=1, current_solver="newton",
+                  driver=True, optimizer="IPOPT", recorder="RECORDER.columns", record_outputs=RECORDED_OUTPUTS,
+                  checkpoint=None, checkpoint_every=10, objective="thrust", mission=False,
+                  endurance_margin=False, **model_options):
+    """PropModel problem with one of Model.OBJECTIVES (thrust unless given),
+    which PropModel sums when it has more than one entry, RPM constraint and design
+    variables of this script. model_options go to every system declaring them,
+    e.g. surrogate_backend. IPOPT runs through pyOptSparse, any other optimizer
+    through ScipyOptimizeDriver. With driver=False no optimizer is attached,
+    for problems that are only evaluated.
+
+    The driver records desvars, objectives, constraints and record_outputs
+    with a ColumnarRecorder in the recorder directory, or every variable with
+    a SqliteRecorder if recorder is a .sql file. With a checkpoint path, a
+    CheckpointRecorder also writes a resumable checkpoint there every
+    checkpoint_every iterations.
+
+    With mission=True, which the mission_endurance objective implies, the
+    flight conditions of each mission are integrated as time-ordered
+    segments of segment_duration, the battery voltage sagging with the
+    charge used, which needs the newton current solver. endurance_margin adds PropModel's
+    endurance_margin output, for endurance constrained studies."""
+    prob = om.Problem()
+
+    prob.model = PropModel(current_solver=current_solver, mission=mission or objective == "mission_endurance",
+                           objective=objective, endurance_margin=endurance_margin)
+
+    if driver and optimizer == "IPOPT":
+        # Driver setup
+        prob.driver = om.pyOptSparseDriver()
+        prob.driver.options["optimizer"] = "IPOPT"
+        prob.driver.options["debug_print"] = ["desvars", "nl_cons", "objs"]
+    elif driver:
+        prob.driver = om.ScipyOptimizeDriver(optimizer = optimizer)
+
+    if driver and recorder:
+        # Set up driver recorder
+        if recorder.endswith(".sql"):
+            prob.driver.add_recorder(om.SqliteRecorder(recorder))
+            prob.driver.recording_options["includes"] = ["*"]
+        else:
+            prob.driver.add_recorder(ColumnarRecorder(recorder))
+            prob.driver.recording_options["includes"] = list(record_outputs)
+        prob.driver.recording_options["record_objectives"] = True
+        prob.driver.recording_options["record_constraints"] = True
+        prob.driver.recording_options["record_desvars"] = True
+
+    if driver and checkpoint:
+        prob.driver.add_recorder(CheckpointRecorder(checkpoint, checkpoint_every))
+
+    '''For endurance based optimization, it is recommended to optimize for battery mass,
+    otherwise a standard battery mass of 0.71 kg is added.'''
+
+    #prob.model.add_design_var("battery_mass", units = 'kg', lower = .1, upper = 1)
+    for name, (lower, upper, units) in DESIGN_VARS.items():
+        prob.model.add_design_var(name, lower = lower, upper = upper, units = units)
+    #prob.model.add_design_var("throttle", lower = 0.1, upper = 1)
+    #prob.model.add_design_var("velocity", units = "m/s", lower =1, upper = 35)
+
+    prob.model.add_constraint("RPM_con", upper = 0)
+
+    prob.model_options['*'] = {'flight_conds': flight_conds, "flight_missions": flight_missions, 'props': props}
+    prob.model_options['*'].update(model_options)
+    return prob
+
+
+def coloring_key(prob):
+    """Hash of what a total coloring depends on: the sizes of the design
+    variables and responses, the PropModel and model_options options, the
+    surrogate artifacts and the model sources"""
+    model = prob.model
+    sizes = [(name, int(meta['size'])) for name, meta in model.get_design_vars().items()]
+    sizes += [(name, int(meta['size'])) for name, meta in model.get_responses().items()]
+    options = dict(model.options.items())
+    digest = hashlib.sha1(json.dumps([sizes, options, prob.model_options], sort_keys = True, default = str).encode())
+
+    shared = prob.model_options.get('*', {})
+    digest.update(surrogates_hash(shared.get("surrogate_dir"), shared.get("surrogate_backend", "smt")).encode())
+    root = os.path.dirname(os.path.abspath(__file__))
+    for pattern in COLORING_SOURCES:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def total_coloring(prob, directory=None):
+    """Hands the driver a total-derivative coloring, loaded from directory
+    (COLORING_DIR unless given) or computed and saved there on the first run.
+    Files are keyed by coloring_key, so a new problem size, model option,
+    surrogate or source change gets its own coloring instead of a stale one.
+    Call after setup and set_values, returns the Coloring."""
+    directory = COLORING_DIR if directory is None else directory
+    prob.final_setup()
+    path = os.path.join(directory, f"total_coloring_{coloring_key(prob)}.pkl")
+
+    if os.path.exists(path):
+        coloring = Coloring.load(path)
+    else:
+        coloring = compute_total_coloring(prob, driver = prob.driver)
+        os.makedirs(directory, exist_ok = True)
+        coloring.save(path)
+    prob.driver.use_fixed_coloring(coloring)
+    prob.final_setup()
+    return coloring
+
+
+def set_values(prob, values):
+    """Sets name: value or name: (value, units) pairs on a set up problem"""
+    for name, value in values.items():
+        value, units = value if isinstance(value, tuple) else (value, None)
+        prob.set_val(name, value, units = units)
+
+
+def input_values(prob):
+    """Copies of every independent input of a final_setup problem, design
+    variables included, for set_values to restore a pooled problem to"""
+    return {name: prob.get_val(name).copy() for name, _ in prob.list_indep_vars(out_stream = None)}
+
+
+def report(prob):
+    print(f"Optimal Propeller Diameter: {prob.get_val('D_prop', units='inch')} in")
+    print(f"Optimal Propeller Pitch: {prob.get_val('pitch', units='deg')} degrees")
+    print(f"Throttle: {prob.get_val('throttle')}")
+    print(f"thrust {prob.get_val('prop_thrust', units = 'N')} N")
+    print(f"battery power {prob.get_val('battery_power', units = 'W')} W")
+    print(f"esc power {prob.get_val('esc_power', units = 'W')} W")
+    print(f"motor power {prob.get_val('motor_power', units = 'W')} W")
+    print(f"power {prob.get_val('prop_power', units = 'W')} W")
+    print(f"rpm: {prob.get_val('rpm', units = 'rpm') } rpm")
+    print(f"motor resistance: {prob.get_val('motor_resistance', units ='ohm')}")
+    print(f"Optimal Motor KV{prob.get_val('motor_kv', units = 'rpm/V')} rpm/V")
+    print(f"Optimal Motor Idle Current{prob.get_val('motor_idle_current', units = 'A')} A")
+    print(f"Optimal Motor Mass{prob.get_val('motor_mass', units = 'kg')} kg")
+    print(f"nominal capacity: {prob.get_val('nominal_capacity', units = 'A*h')}")
+    print(f"battery current {prob.get_val('battery_current', units = 'A')} A")
+
+
+if __name__ == "__main__":
+    # Opt-in checkpoints, e.g. PROPTIMIZE_CHECKPOINT=RUN.ckpt, and PROPTIMIZE_RESUME=1 to continue from one
+    checkpoint = os.environ.get("PROPTIMIZE_CHECKPOINT")
+    prob = build_problem(checkpoint=checkpoint)
+    prob.setup(check=True)
+
+    set_values(prob, DEFAULTS)
+    if checkpoint and os.environ.get("PROPTIMIZE_RESUME") and os.path.exists(checkpoint):
+        print(f"resuming from iteration {resume(prob, checkpoint)['counter']} of {checkpoint}")
+
+    # Only the first run of a model computes its coloring, later ones load it from COLORING_DIR
+    total_coloring(prob)
+
+    # Opt-in timings and call counts, e.g. PROPTIMIZE_INSTRUMENT=INSTRUMENTATION.json
+    if os.environ.get("PROPTIMIZE_INSTRUMENT"):
+        instrument(prob, os.environ["PROPTIMIZE_INSTRUMENT"])
+
+    prob.set_solver_print(level=-1)
+    prob.set_solver_print(level=2, depth=1)
+
+    prob.run_driver()
+
+    report(prob)
+    prob.cleanup()
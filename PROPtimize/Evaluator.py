@@ -0,0 +1,73 @@
+"""Reusable in-process evaluation of PropModel.
+
+An Evaluator sets up a pool of independent Problems once and then only sets
+values and runs the model, so scripted sweeps and tool backends do not pay
+OpenMDAO setup, the check pass or the surrogate load per evaluation:
+
+    evaluator = Evaluator(flight_conds=3, pool_size=4, surrogate_backend="numpy")
+    result = evaluator.evaluate({"D_prop": (16, "inch")}, {"throttle": [[0.5], [0.7], [0.9]]})
+    results = evaluator.evaluate_many([(design, conditions), ...])
+"""
+from concurrent.futures import ThreadPoolExecutor
+import queue
+
+from Driver import DEFAULTS, build_problem, input_values, set_values
+
+OUTPUTS = (
+    "prop_thrust",
+    "prop_power",
+    "battery_power",
+    "res_current",
+    "rpm",
+    "RPM_con",
+    "esc_efficiency",
+    "motor_kv",
+    "motor_resistance",
+    "nominal_capacity",
+    "battery_energy",
+)
+
+
+class Evaluator(object):
+    """Pool of set up PropModel problems evaluated through dicts.
+
+    Designs and conditions are dicts of name: value or name: (value, units)
+    applied on top of defaults (Driver.DEFAULTS unless given). Every
+    independent input is reset to its value after setup first, so a result
+    never depends on what the pooled problem evaluated before. Each call
+    borrows one problem, so evaluate is safe to call from several threads
+    and evaluate_many runs up to pool_size evaluations at once.
+    """
+
+    def __init__(self, flight_conds=1, flight_missions=1, props=1, pool_size=1,
+                 current_solver="newton", defaults=None, outputs=OUTPUTS, **model_options):
+        self.defaults = dict(DEFAULTS if defaults is None else defaults)
+        self.outputs = tuple(outputs)
+        self.pool_size = pool_size
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            prob = build_problem(flight_conds, flight_missions, props, current_solver,
+                                 driver=False, **model_options)
+            prob.setup(check=False)
+            set_values(prob, self.defaults)
+            prob.final_setup()
+            prob.set_solver_print(level=-1)
+            self._inputs = input_values(prob)
+            self._pool.put(prob)
+
+    def evaluate(self, design=None, conditions=None):
+        """Runs the model at design and conditions, returns copies of the outputs"""
+        prob = self._pool.get()
+        try:
+            set_values(prob, self._inputs)
+            set_values(prob, design or {})
+            set_values(prob, conditions or {})
+            prob.run_model()
+            return {name: prob.get_val(name).copy() for name in self.outputs}
+        finally:
+            self._pool.put(prob)
+
+    def evaluate_many(self, cases, max_workers=None):
+        """Evaluates (design, conditions) pairs concurrently, results in order"""
+        with ThreadPoolExecutor(max_workers or self.pool_size) as executor:
+            return list(executor.map(lambda case: self.evaluate(*case), cases))
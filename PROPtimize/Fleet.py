@@ -0,0 +1,142 @@
+"""Fleet mode: optimizes independent aircraft variants concurrently.
+
+With props = fm, flight missions that share nothing still end up in one
+Newton system and one Jacobian. In fleet mode every variant is its own
+problem with one mission and one prop, solved in a process pool, so adding
+variants adds independent work instead of growing a coupled system:
+
+    variants = [
+        {"name": "trainer", "values": {"battery_voltage_supply": (14.8, "V"), "velocity": (30, "ft/s")}},
+        {"name": "racer", "values": {"battery_voltage_supply": (22.2, "V"), "velocity": (60, "ft/s")},
+         "start": {"D_prop": (16, "inch")}},
+    ]
+    results = run_fleet(variants, flight_conds=1, optimizer="SLSQP")
+    print_report(results)
+
+A variant's values (flight conditions, battery, ...) and start design are
+name: value or name: (value, units) pairs applied on top of Driver.DEFAULTS.
+Each worker sets up one problem per flight_conds and reuses it for every
+variant it is handed. Run from the PROPtimize directory:
+
+    python Fleet.py variants.json --workers 8 --optimizer SLSQP
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from Checkpoint import restore, snapshot
+from Driver import DEFAULTS, DESIGN_VARS, build_problem, input_values, set_values
+from WorkerPool import WorkerPool, design, prepare, run_driver
+
+#Outputs merged into the fleet report, name: units
+OUTPUTS = {
+    "prop_thrust": "N",
+    "prop_power": "W",
+    "battery_power": "W",
+    "rpm": "rpm",
+    "res_current": "A",
+    "motor_kv": "rpm/V",
+    "nominal_capacity": "A*h",
+}
+
+def _setup(problem_args, defaults):
+    return {"problem_args": problem_args, "defaults": defaults, "problems": {}}
+
+
+def _problem(worker, flight_conds):
+    #Each problem with its inputs, design variable starts included, and its solver state right after setup
+    problems = worker["problems"]
+    if flight_conds not in problems:
+        prob = prepare(build_problem(flight_conds, 1, 1, recorder = None, **worker["problem_args"]), worker["defaults"])
+        problems[flight_conds] = (prob, input_values(prob), snapshot(prob, 0))
+    return problems[flight_conds]
+
+
+def _optimize(worker, variant):
+    #Variants are independent: no input the previous one set or optimized carries over, and the
+    #current solve starts cold instead of from the previous optimum, which can lead Newton to another root
+    prob, inputs, state = _problem(worker, variant["flight_conds"])
+    set_values(prob, inputs)
+    restore(prob, state)
+    set_values(prob, variant.get("values", {}))
+    set_values(prob, variant.get("start", {}))
+    run = run_driver(prob)
+
+    return {
+        "name": variant["name"],
+        "design": design(prob),
+        "outputs": {name: prob.get_val(name, units = units).copy() for name, units in OUTPUTS.items()},
+        "max_RPM_con": float(np.max(prob.get_val("RPM_con"))),
+        **run,
+    }
+
+
+def run_fleet(variants, workers=None, defaults=None, feas_tol=1e-6, flight_conds=1, **problem_args):
+    """Optimizes every variant as a one-mission, one-prop problem with
+    `workers` processes. problem_args go to Driver.build_problem (optimizer,
+    current_solver, surrogate_backend, ...). A variant may set its own
+    flight_conds. Returns the results in variant order, each with its
+    optimum design, outputs, worst RPM constraint, feasibility, success flag
+    and wall time."""
+    variants = [dict(variant, name = variant.get("name", f"variant {i}"),
+                     flight_conds = variant.get("flight_conds", flight_conds))
+                for i, variant in enumerate(variants)]
+    defaults = dict(DEFAULTS if defaults is None else defaults)
+
+    with WorkerPool(workers, _setup, problem_args, defaults) as pool:
+        results = list(pool.map_task(_optimize, variants))
+
+    for result in results:
+        result["feasible"] = result["max_RPM_con"] <= feas_tol
+    return results
+
+
+def merge(results):
+    """Columnar view of the fleet, name: array with the variants along the first axis"""
+    merged = {"name": np.array([r["name"] for r in results])}
+    for name in DESIGN_VARS:
+        merged[name] = np.array([np.ravel(r["design"][name][0]) for r in results])
+    for name in OUTPUTS:
+        merged[name] = np.array([np.ravel(r["outputs"][name]) for r in results])
+    for name in ("max_RPM_con", "feasible", "success", "time"):
+        merged[name] = np.array([r[name] for r in results])
+    return merged
+
+
+def print_report(results):
+    width = max(len(r["name"]) for r in results)
+    for r in results:
+        design = ", ".join(f"{name}={value.item():.4g} {units}" for name, (value, units) in r["design"].items())
+        thrust = np.sum(r["outputs"]["prop_thrust"])
+        print(f"{r['name']:>{width}}: thrust {thrust:.4f} N, feasible {r['feasible']}, success {r['success']}, "
+              f"{r['time']:.1f} s: {design}")
+    print(f"{len(results)} variants, {sum(r['feasible'] for r in results)} feasible, "
+          f"{len({r['pid'] for r in results})} worker processes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("variants", help = "JSON list of variants, each with name, values and optionally start and flight_conds")
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes, defaults to the CPU count")
+    parser.add_argument("--flight-conds", type = int, default = 1)
+    parser.add_argument("--optimizer", default = "IPOPT", help = "IPOPT through pyOptSparse, or a ScipyOptimizeDriver optimizer such as SLSQP")
+    parser.add_argument("--current-solver", default = "newton", choices = ("newton", "block"))
+    args = parser.parse_args()
+
+    with open(args.variants) as f:
+        #JSON has no tuples, [value, "units"] pairs become (value, units)
+        variants = [{key: {name: tuple(v) if isinstance(v, list) and len(v) == 2 and isinstance(v[1], str) else v
+                           for name, v in value.items()} if isinstance(value, dict) else value
+                     for key, value in variant.items()} for variant in json.load(f)]
+
+    t0 = time.perf_counter()
+    results = run_fleet(variants, args.workers, flight_conds = args.flight_conds,
+                        optimizer = args.optimizer, current_solver = args.current_solver)
+    print(f"{len(results)} variants in {time.perf_counter() - t0:.1f} s")
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
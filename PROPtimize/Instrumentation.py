@@ -0,0 +1,205 @@
+"""Opt-in call counts and timings for PropModel.
+
+Nothing here runs unless a problem is instrumented, the components keep
+their plain methods otherwise. instrument(prob) wraps, on the instances of
+the set up problem only, methods this repo defines:
+
+- compute, compute_partials, apply_nonlinear, solve_nonlinear, linearize
+  and solve_linear of every PROPtimize component that defines them,
+- predict_values and predict_derivatives of the surrogates held by
+  PropCoefficients and CurrentBalance,
+- solve of the nonlinear solver and solve and _linearize of the linear
+  solver of every group, keyed by group path and solver class, e.g.
+  model.NewtonSolver.solve and model.DirectSolver.linearize in newton mode,
+  or model.LinearRunOnce.solve, which calls the per-cell solve_linear of
+  CurrentBalance, in block mode. The Newton solver's linear solves and the
+  driver's derivative solves both go through the group's linear solver, so
+  both are counted,
+
+and counts what OpenMDAO itself does through its recorders: a solver
+recorder on the model's Newton solver counts its iterations, and a driver
+recorder with record_derivatives on counts the model evaluations and the
+derivative computations of the driver. Each of those driver records holds
+the counter increments since the one before, so together they make up the
+driver's iterations. At the end of run_driver the summary is exported to
+the given .json or .csv path:
+
+    prob.setup()
+    stats = instrument(prob, "INSTRUMENTATION.json")
+    prob.run_driver()
+    stats.summary()
+
+Driver.py instruments its run when PROPTIMIZE_INSTRUMENT names an output path.
+"""
+from collections import defaultdict
+import csv
+import functools
+import json
+import time
+
+import openmdao.api as om
+
+from ColumnarRecorder import DriverRecorder
+from Propulsion.CurrentBalance import CurrentBalance
+from Propulsion.PropCoefficients import PropCoefficients
+
+
+class _CountingSurrogate(object):
+    """Forwards to a surrogate, counting and timing its predict calls"""
+
+    def __init__(self, sm, stats, name):
+        self._sm = sm
+        self.predict_values = stats.wrap(sm.predict_values, f"{name}.predict_values")
+        self.predict_derivatives = stats.wrap(sm.predict_derivatives, f"{name}.predict_derivatives")
+
+    def __getattr__(self, name):
+        return getattr(self._sm, name)
+
+
+class _CountingRecorder(DriverRecorder):
+    """Turns the driver's evaluations and derivative computations into
+    Instrumentation records, and counts the iterations of any solver it is
+    added to"""
+
+    def __init__(self, stats):
+        super().__init__()
+        self._stats = stats
+
+    def startup(self, recording_requester, comm=None):
+        #Started by the final_setup of every run, so the first record starts with the run
+        super().startup(recording_requester, comm)
+        self._stats._t0 = time.perf_counter()
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        self._stats._record("evaluation")
+
+    def record_derivatives_driver(self, recording_requester, data, metadata):
+        self._stats._record("derivatives")
+
+    def record_iteration_solver(self, recording_requester, data, metadata):
+        self._stats.calls["newton.iterations"] += 1
+
+
+class Instrumentation(object):
+    """Counters and timers keyed by 'system path.method' or 'solver.event',
+    plus a record of the counter increments of every model evaluation and
+    every driver derivative computation, in call order"""
+
+    COMPONENT_METHODS = ("compute", "compute_partials", "apply_nonlinear", "solve_nonlinear", "linearize", "solve_linear")
+
+    #Components holding surrogates, by the attribute holding them
+    SURROGATE_HOLDERS = ((PropCoefficients, None), (CurrentBalance, "chain"))
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.time = defaultdict(float)
+        self.records = []
+        self._before = {}
+        self._t0 = None
+
+    def wrap(self, method, key):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.time[key] += time.perf_counter() - t0
+                self.calls[key] += 1
+        return timed
+
+    def attach(self, prob):
+        """Wraps the components, surrogates and group solvers of a set up
+        problem and adds the counting recorders to its driver and Newton solver"""
+        model = prob.model
+        components = [system for system in model.system_iter(recurse = True)
+                      if isinstance(system, (om.ExplicitComponent, om.ImplicitComponent))]
+        if not components:
+            raise RuntimeError("instrument() needs a problem that has been set up")
+        for comp in components:
+            self._attach_component(comp)
+        for group in model.system_iter(include_self = True, recurse = True, typ = om.Group):
+            self._attach_solvers(group)
+
+        recorder = _CountingRecorder(self)
+        if isinstance(model.nonlinear_solver, om.NewtonSolver):
+            #Only the record count is used, not the recorded values
+            model.nonlinear_solver.add_recorder(recorder)
+            model.nonlinear_solver.recording_options["record_inputs"] = False
+            model.nonlinear_solver.recording_options["record_outputs"] = False
+        prob.driver.add_recorder(recorder)
+        prob.driver.recording_options["record_derivatives"] = True
+
+    def _record(self, kind):
+        #The counter increments and the time since the previous record
+        now = time.perf_counter()
+        record = {"kind": kind, "time": now - self._t0}
+        record.update({key: count - self._before.get(key, 0) for key, count in self.calls.items()
+                       if count != self._before.get(key, 0)})
+        self.records.append(record)
+        self.calls[f"driver.{'evaluations' if kind == 'evaluation' else 'derivatives'}"] += 1
+        self._before = dict(self.calls)
+        self._t0 = now
+
+    def _attach_component(self, comp):
+        for method in self.COMPONENT_METHODS:
+            #Only what the repo's classes implement, not OpenMDAO's defaults
+            owner = next((cls for cls in type(comp).__mro__ if method in cls.__dict__), None)
+            if owner is not None and not owner.__module__.startswith("openmdao"):
+                setattr(comp, method, self.wrap(getattr(comp, method), f"{comp.pathname}.{method}"))
+
+        for cls, attr in self.SURROGATE_HOLDERS:
+            if not isinstance(comp, cls):
+                continue
+            holder = comp if attr is None else getattr(comp, attr)
+            for name in ("thrust_sm", "power_sm"):
+                #A renamed attribute would otherwise leave the surrogates silently uncounted
+                if not hasattr(holder, name):
+                    raise AttributeError(f"{comp.pathname} ({cls.__name__}) has no {name} to instrument")
+                setattr(holder, name, _CountingSurrogate(getattr(holder, name), self, f"{comp.pathname}.{name}"))
+
+    def _attach_solvers(self, group):
+        path = group.pathname or "model"
+        nonlinear, linear = group.nonlinear_solver, group.linear_solver
+        if nonlinear is not None:
+            nonlinear.solve = self.wrap(nonlinear.solve, f"{path}.{type(nonlinear).__name__}.solve")
+        if linear is not None:
+            linear.solve = self.wrap(linear.solve, f"{path}.{type(linear).__name__}.solve")
+            linear._linearize = self.wrap(linear._linearize, f"{path}.{type(linear).__name__}.linearize")
+
+    def summary(self):
+        """key: {calls, total, mean} with times in seconds, slowest first"""
+        keys = sorted(self.calls, key = lambda key: -self.time[key])
+        return {key: {"calls": self.calls[key], "total": self.time[key], "mean": self.time[key] / self.calls[key]}
+                for key in keys}
+
+    def export(self, path):
+        """Writes the summary (and the records for JSON) to a .json or .csv file"""
+        summary = self.summary()
+        if path.endswith(".csv"):
+            with open(path, "w", newline = "") as f:
+                writer = csv.writer(f)
+                writer.writerow(["name", "calls", "total_s", "mean_s"])
+                for key, row in summary.items():
+                    writer.writerow([key, row["calls"], row["total"], row["mean"]])
+        else:
+            with open(path, "w") as f:
+                json.dump({"summary": summary, "records": self.records}, f, indent = 1)
+
+
+def instrument(prob, path=None):
+    """Instruments a set up problem, exporting to path after every run_driver.
+    Returns the Instrumentation holding the counters."""
+    stats = Instrumentation()
+    stats.attach(prob)
+
+    if path is not None:
+        run_driver = prob.run_driver
+
+        def run_and_export(*args, **kwargs):
+            try:
+                return run_driver(*args, **kwargs)
+            finally:
+                stats.export(path)
+        prob.run_driver = run_and_export
+    return stats
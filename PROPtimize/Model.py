@@ -1,24 +1,50 @@
+import numpy as np
 import openmdao.api as om
 from Propulsion.PropulsionGroup import PropulsionGroup
 
+#Objectives PropModel can maximize, name: (summed objective, output, units, "cells" or "missions" shaped)
+OBJECTIVES = {
+    "thrust": ("total_thrust", "prop_thrust", "N", "cells"),
+    "endurance": ("total_endurance", "endurance", "h", "cells"),
+    "mission_endurance": ("total_mission_endurance", "mission_endurance", "h", "missions"),
+}
+
 class PropModel(om.Group):
     def initialize(self):
         self.options.declare("flight_conds", default = 1, desc= "Number of Flight Conditions to Analyze")
         self.options.declare("flight_missions", default = 1, desc = "Number of Flight Missions ot Analyze")
         self.options.declare("props", default = 1, desc="Number of Props to optimize, should be no more than fm")
+        self.options.declare("current_solver", default = "newton", values = ["newton", "block"],
+                             desc = "newton solves res_current with a global Newton and DirectSolver, "
+                                    "block with a per-cell vectorized solve and diagonal linear solves")
+        self.options.declare("mission", default = False, types = bool,
+                             desc = "Treats the flight conditions of each mission as time-ordered segments of segment_duration "
+                                    "and integrates the battery charge over them")
+        self.options.declare("objective", default = None, values = [None] + list(OBJECTIVES),
+                             desc = "One of OBJECTIVES to maximize, summed over its entries when it has more than one "
+                                    "since drivers need a scalar objective")
+        self.options.declare("endurance_margin", default = False, types = bool,
+                             desc = "Adds endurance_margin = endurance - endurance_min, endurance_min being an input, "
+                                    "for endurance constrained studies")
         
     def setup(self):
         fc = self.options["flight_conds"]
         fm = self.options["flight_missions"]
         p = self.options["props"]
 
-        self.nonlinear_solver = om.NewtonSolver(solve_subsystems=True)
-        self.nonlinear_solver.options["maxiter"] = 30
-        self.nonlinear_solver.options["err_on_non_converge"] = False
-        self.nonlinear_solver.linesearch = om.BoundsEnforceLS()
-        self.nonlinear_solver.linesearch.options["bound_enforcement"] = "scalar"
-        self.nonlinear_solver.linesearch.options["print_bound_enforce"] = True
-        self.linear_solver = om.DirectSolver(assemble_jac=True)#, rhs_checking =True)
+        if self.options["current_solver"] == "newton":
+            self.nonlinear_solver = om.NewtonSolver(solve_subsystems=True)
+            self.nonlinear_solver.options["maxiter"] = 30
+            self.nonlinear_solver.options["err_on_non_converge"] = False
+            #Round-off leaves the power residual norm around 1e-8 W, warm-started solves begin
+            #close to it, so a purely relative tolerance would stall there until maxiter
+            self.nonlinear_solver.options["atol"] = 1e-6
+            self.nonlinear_solver.linesearch = om.BoundsEnforceLS()
+            self.nonlinear_solver.linesearch.options["bound_enforcement"] = "scalar"
+            self.nonlinear_solver.linesearch.options["print_bound_enforce"] = True
+            self.linear_solver = om.DirectSolver(assemble_jac=True)#, rhs_checking =True)
+        #In block mode CurrentBalance solves its own cells and the rest of the model is feed-forward,
+        #so the default run-once solvers are exact
 
         indeps = self.add_subsystem(
             "indeps",
@@ -28,17 +54,34 @@ class PropModel(om.Group):
                 "pitch",
                 "throttle",
                 "velocity",
-            ],
+            ] + (["segment_duration"] if self.options["mission"] else []),
         )
         indeps.add_output("D_prop", units="inch", shape = p, desc="propeller diameter")
         indeps.add_output("pitch", units="deg", shape = p,  desc="propeller pitch")
         indeps.add_output("throttle", shape = (fc,fm), desc = "throttle setting")
         indeps.add_output("velocity", shape = (fc,fm), desc = "optimized velocities", units = "m/s")
+        if self.options["mission"]:
+            indeps.add_output("segment_duration", shape = (fc,fm), units = "s", desc = "time flown at each flight condition")
 
         self.add_subsystem(
             "PropulsionGroup",
-            PropulsionGroup(),
+            PropulsionGroup(current_solver=self.options["current_solver"], mission=self.options["mission"]),
             promotes_inputs=["*"],
             promotes_outputs=["*"],
         )
-        
\ No newline at end of file
+
+        shape = (fc, fm)
+        if self.options["endurance_margin"]:
+            self.add_subsystem("endurance_margin", om.ExecComp("endurance_margin = endurance - endurance_min",
+                               endurance_margin = {"shape": shape, "units": "h"}, endurance = {"shape": shape, "units": "h"},
+                               endurance_min = {"units": "h"}), promotes = ["*"])
+
+        if self.options["objective"] is not None:
+            total, name, units, entries = OBJECTIVES[self.options["objective"]]
+            entries = shape if entries == "cells" else fm
+            if np.prod(entries) > 1:
+                #Summed over every condition and mission, drivers need a scalar objective
+                self.add_subsystem("objective", om.ExecComp(f"{total} = sum({name})",
+                                   **{name: {"shape": entries, "units": units}, total: {"units": units}}), promotes = ["*"])
+                name = total
+            self.add_objective(name, scaler = -1)
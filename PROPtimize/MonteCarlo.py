@@ -0,0 +1,98 @@
+"""Monte Carlo propagation through the NumPy propulsion chain.
+
+Samples of the chain inputs (battery_resistance, throttle, ...) and of its
+model coefficients (ESC efficiency a, b, c and the motor kv and resistance
+fits, see PropulsionChain.PARAMETERS) are pushed through
+Propulsion.PropulsionChain without OpenMDAO. The current balance of
+PowerResiduals is solved for all samples of a chunk at once, and chunks of
+chunk_size samples keep the working memory bounded however many samples
+are drawn:
+
+    sampler = gaussian(battery_resistance=0.1, a=0.02, kv_gain=0.05)
+    results = run_monte_carlo(sampler, 10**6, surrogate_backend="numpy")
+    np.percentile(results["prop_thrust"], [5, 50, 95])
+
+Spreads are relative standard deviations around the nominal design, which
+is Defaults.DEFAULTS at sea-level density unless given. Run from the
+PROPtimize directory:
+
+    python MonteCarlo.py --samples 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from Defaults import UNITS, nominal_inputs
+from Propulsion.PropulsionChain import PropulsionChain, cold_start_current
+from Propulsion.SurrogateRegistry import get_surrogates
+
+OUTPUTS = ("res_current", "prop_thrust", "prop_power", "battery_power", "rpm", "esc_efficiency")
+
+
+def gaussian(**spreads):
+    """Sampler drawing the named inputs or coefficients from normal
+    distributions around their nominal values, spreads are relative
+    standard deviations"""
+    def sampler(rng, size, nominal):
+        return {name: nominal[name] * (1 + spread * rng.standard_normal(size)) for name, spread in spreads.items()}
+    return sampler
+
+
+def run_monte_carlo(sampler, samples, chunk_size=65536, nominal=None, seed=0, num_motors=1.0,
+                    outputs=OUTPUTS, surrogate_dir=None, surrogate_backend="numpy", atol=1e-8, maxiter=50):
+    """Evaluates the chain for `samples` draws of sampler(rng, size, nominal).
+
+    The sampler returns name: array for any of the chain INPUTS and
+    PARAMETERS, everything else stays at nominal (nominal_inputs() unless
+    given). Returns name: array with one value per sample for each of
+    outputs, the sampled values and a 'converged' mask of the current solve.
+    """
+    nominal = nominal_inputs() if nominal is None else nominal
+    chain = PropulsionChain(*get_surrogates(surrogate_dir, surrogate_backend))
+    rng = np.random.default_rng(seed)
+    results = {}
+
+    for start in range(0, samples, chunk_size):
+        size = min(chunk_size, samples - start)
+        drawn = sampler(rng, size, nominal)
+        x = {name: np.broadcast_to(drawn.get(name, value), size) for name, value in nominal.items()}
+
+        guess = cold_start_current(x["battery_voltage_supply"], x["throttle"], x["motor_idle_current"],
+                                   x["a"], x["b"], x["c"], (x["resistance_gain"], x["resistance_exponent"]))
+        current, _, converged = chain.solve_current(x, guess, atol = atol, maxiter = maxiter)
+        out = chain.evaluate(current, x)
+        out["res_current"] = current
+        out["prop_thrust"] = chain.thrust(out, x, num_motors)
+        out["converged"] = converged
+        out.update(drawn)
+
+        for name in tuple(outputs) + ("converged",) + tuple(drawn):
+            if name not in results:
+                results[name] = np.empty(samples, dtype = out[name].dtype)
+            results[name][start:start + size] = out[name]
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type = int, default = 10**6)
+    parser.add_argument("--chunk-size", type = int, default = 65536)
+    parser.add_argument("--backend", default = "numpy", help = "surrogate backend")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    sampler = gaussian(battery_resistance = 0.1, a = 0.02, b = 0.02, c = 0.02, kv_gain = 0.05, resistance_gain = 0.05)
+    t0 = time.perf_counter()
+    results = run_monte_carlo(sampler, args.samples, args.chunk_size, seed = args.seed, surrogate_backend = args.backend)
+    elapsed = time.perf_counter() - t0
+
+    print(f"{args.samples} samples in {elapsed:.2f} s, {np.mean(results['converged']):.4%} converged")
+    for name in OUTPUTS:
+        low, mid, high = np.percentile(results[name], [5, 50, 95])
+        print(f"{name:>15}: median {mid:.4g}, 90% interval [{low:.4g}, {high:.4g}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Parallel multi-start optimization over the Driver.py design space.
+
+IPOPT on PropModel is sensitive to its starting design, so this draws Latin
+hypercube starts inside Driver.DESIGN_VARS and optimizes them concurrently in
+a process pool. Each worker sets up its Problem (and loads the surrogates)
+once, then runs every start it is handed on it. Run from the PROPtimize
+directory:
+
+    python MultiStart.py --starts 32 --workers 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from Driver import DEFAULTS, DESIGN_VARS, build_problem, set_values
+from WorkerPool import WorkerPool, design, prepare, run_driver
+
+
+def latin_hypercube(n, bounds, rng):
+    """n points with one sample in each of n equal strata of every variable,
+    bounds is name: (lower, upper, units) and the result name: (values, units)"""
+    points = {}
+    for name, (lower, upper, units) in bounds.items():
+        strata = (rng.permutation(n) + rng.random(n)) / n
+        points[name] = (lower + (upper - lower) * strata, units)
+    return points
+
+
+def _setup(problem_args, defaults):
+    return {"prob": prepare(build_problem(recorder = None, **problem_args), defaults), "defaults": defaults}
+
+
+def _optimize(worker, start):
+    prob = worker["prob"]
+    set_values(prob, worker["defaults"])
+    set_values(prob, start)
+    run = run_driver(prob)
+
+    return {
+        "start": start,
+        "design": design(prob),
+        "prop_thrust": float(np.sum(prob.get_val("prop_thrust", units = "N"))),
+        "max_RPM_con": float(np.max(prob.get_val("RPM_con"))),
+        **run,
+    }
+
+
+def run_multistart(starts=16, workers=None, seed=0, defaults=None, feas_tol=1e-6, **problem_args):
+    """Optimizes from `starts` Latin hypercube starts with `workers` processes.
+
+    problem_args go to Driver.build_problem (flight_conds, optimizer, ...).
+    Returns the results ranked feasible first, then by descending thrust,
+    each with its start, optimum design, thrust, worst RPM constraint,
+    success flag and wall time.
+    """
+    rng = np.random.default_rng(seed)
+    samples = latin_hypercube(starts, DESIGN_VARS, rng)
+    start_list = [
+        {name: (np.array([values[i]]), units) for name, (values, units) in samples.items()}
+        for i in range(starts)
+    ]
+    defaults = dict(DEFAULTS if defaults is None else defaults)
+
+    with WorkerPool(workers, _setup, problem_args, defaults) as pool:
+        results = list(pool.map_task(_optimize, start_list))
+
+    for result in results:
+        result["feasible"] = result["max_RPM_con"] <= feas_tol
+    return sorted(results, key = lambda r: (not r["feasible"], -r["prop_thrust"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--starts", type = int, default = 16)
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes, defaults to the CPU count")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--optimizer", default = "IPOPT", help = "IPOPT through pyOptSparse, or a ScipyOptimizeDriver optimizer such as SLSQP")
+    parser.add_argument("--current-solver", default = "newton", choices = ("newton", "block"))
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = run_multistart(args.starts, args.workers, args.seed, optimizer = args.optimizer,
+                             current_solver = args.current_solver)
+    print(f"{len(results)} starts in {time.perf_counter() - t0:.1f} s")
+    for rank, r in enumerate(results, 1):
+        design = ", ".join(f"{name}={value.item():.4g} {units}" for name, (value, units) in r["design"].items())
+        print(f"{rank:3d}. thrust {r['prop_thrust']:.4f} N, feasible {r['feasible']}, "
+              f"success {r['success']}, {r['time']:.1f} s: {design}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Thrust versus endurance Pareto fronts by parallel epsilon-constraint runs.
+
+Each point of the front maximizes the thrust objective of Driver.py with
+battery_mass as an extra design variable, subject to the endurance of every
+flight condition (nominal capacity over battery current, the current floored
+at min_current, see Battery) being at least a level endurance_min. The
+levels span the endurance of the two anchors: the thrust optimum and the
+endurance optimum.
+
+The levels are solved by a process pool. Whenever a worker frees up it takes
+the open level nearest to an already solved one, starting from that
+solution, so most subproblems start next to their optimum instead of from
+Driver.DEFAULTS:
+
+    results = run_pareto(points=50, workers=8, optimizer="SLSQP")
+    front = pareto_front(results)
+
+Run from the PROPtimize directory:
+
+    python Pareto.py --points 50 --workers 8 --optimizer SLSQP
+"""
+import argparse
+from concurrent.futures import FIRST_COMPLETED, wait
+import os
+import time
+
+import numpy as np
+
+from Driver import DEFAULTS, DESIGN_VARS, build_problem, set_values
+from WorkerPool import WorkerPool, design, prepare, run_driver
+
+#Battery mass range of endurance studies, (lower, upper, units)
+BATTERY_MASS = (0.1, 1, "kg")
+
+
+def build_pareto_problem(flight_conds=1, flight_missions=1, props=1, objective="thrust", **problem_args):
+    """Driver.build_problem with battery_mass as a design variable and
+    PropModel's endurance_margin >= 0 constraint, endurance_min being an
+    input set per subproblem. objective="endurance" maximizes the smallest
+    endurance instead of thrust, for the endurance anchor: endurance_min
+    becomes a design variable and the objective, so the constraint holds
+    it at the smallest endurance of any flight condition, the metric the
+    levels and the front use."""
+    prob = build_problem(flight_conds, flight_missions, props, recorder = None,
+                         objective = None if objective == "endurance" else objective,
+                         endurance_margin = True, **problem_args)
+    model = prob.model
+    model.add_design_var("battery_mass", lower = BATTERY_MASS[0], upper = BATTERY_MASS[1], units = BATTERY_MASS[2])
+    model.add_constraint("endurance_margin", lower = 0)
+    if objective == "endurance":
+        model.add_design_var("endurance_min", lower = 0, units = "h")
+        model.add_objective("endurance_min", scaler = -1)
+    return prob
+
+
+def _prepare(prob, defaults):
+    return prepare(prob, dict(defaults, endurance_min = (0.0, "h")))
+
+
+def _solve(prob, defaults, endurance_min, start):
+    set_values(prob, defaults)
+    set_values(prob, start)
+    prob.set_val("endurance_min", endurance_min, units = "h")
+    run = run_driver(prob)
+
+    return {
+        "endurance_min": endurance_min,
+        "design": design(prob, dict(DESIGN_VARS, battery_mass = BATTERY_MASS)),
+        "prop_thrust": float(np.sum(prob.get_val("prop_thrust", units = "N"))),
+        "endurance": float(np.min(prob.get_val("endurance", units = "h"))),
+        "max_RPM_con": float(np.max(prob.get_val("RPM_con"))),
+        "min_margin": float(np.min(prob.get_val("endurance_margin", units = "h"))),
+        **run,
+    }
+
+
+def _setup(problem_args, defaults):
+    return {"prob": _prepare(build_pareto_problem(**problem_args), defaults), "defaults": defaults}
+
+
+def _level(worker, endurance_min, start):
+    return _solve(worker["prob"], worker["defaults"], endurance_min, start)
+
+
+def anchors(defaults=None, **problem_args):
+    """Thrust optimum and endurance optimum, the ends of the front"""
+    defaults = dict(DEFAULTS if defaults is None else defaults)
+    #battery_mass only enters the endurance, so the thrust optimum leaves it where it
+    #starts; starting at the heaviest battery gives the longest lasting thrust optimum
+    start = {"battery_mass": (BATTERY_MASS[1], BATTERY_MASS[2])}
+    thrust = _solve(_prepare(build_pareto_problem(**problem_args), defaults), defaults, 0.0, start)
+    endurance = _solve(_prepare(build_pareto_problem(objective = "endurance", **problem_args), defaults), defaults, 0.0, start)
+    return thrust, endurance
+
+
+def run_pareto(points=20, workers=None, defaults=None, levels=None, feas_tol=1e-6, **problem_args):
+    """Solves the epsilon-constraint subproblems of `points` endurance levels,
+    evenly spaced between the anchors unless levels (in h) are given.
+
+    problem_args go to Driver.build_problem (flight_conds, optimizer, ...).
+    Returns every result, anchors included, by rising endurance, each
+    with its design, thrust, smallest endurance, worst RPM constraint and
+    endurance margin, feasibility, success flag, wall time and the endurance
+    of the solution it was warm started from (None for a cold start).
+    """
+    defaults = dict(DEFAULTS if defaults is None else defaults)
+    thrust_anchor, endurance_anchor = anchors(defaults, **problem_args)
+    thrust_anchor["warm_start"] = endurance_anchor["warm_start"] = None
+    if levels is None:
+        levels = np.linspace(thrust_anchor["endurance"], endurance_anchor["endurance"], points)[1:-1]
+    finished = [thrust_anchor, endurance_anchor]
+    pending = sorted(float(level) for level in levels)
+    workers = workers or os.cpu_count()
+
+    with WorkerPool(workers, _setup, problem_args, defaults) as pool:
+        running = {}
+        while pending or running:
+            while pending and len(running) < workers:
+                #The open level closest to a solved endurance, started from that solution
+                solved = np.array([r["endurance"] for r in finished])
+                gaps = np.abs(np.subtract.outer(pending, solved))
+                i, j = np.unravel_index(np.argmin(gaps), gaps.shape)
+                level = pending.pop(i)
+                running[pool.submit_task(_level, level, finished[j]["design"])] = finished[j]["endurance"]
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                result["warm_start"] = running.pop(future)
+                finished.append(result)
+
+    for result in finished:
+        result["feasible"] = result["max_RPM_con"] <= feas_tol and result["min_margin"] >= -feas_tol
+    return sorted(finished, key = lambda r: r["endurance"])
+
+
+def pareto_front(results, rtol=1e-6):
+    """Feasible results no other result beats in both thrust and endurance,
+    with near-duplicates (within rtol in both) dropped, by rising endurance"""
+    feasible = sorted((r for r in results if r["feasible"]), key = lambda r: (-r["prop_thrust"], -r["endurance"]))
+    front = []
+    for r in feasible:
+        #Sorted by falling thrust, a point is dominated unless it outlasts every point kept so far
+        if front and r["endurance"] <= front[-1]["endurance"] * (1 + rtol):
+            continue
+        if front and abs(r["prop_thrust"] - front[-1]["prop_thrust"]) <= rtol * abs(front[-1]["prop_thrust"]):
+            front[-1] = r
+            continue
+        front.append(r)
+    return front[::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type = int, default = 20, help = "endurance levels, anchors included")
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes, defaults to the CPU count")
+    parser.add_argument("--flight-conds", type = int, default = 1)
+    parser.add_argument("--optimizer", default = "IPOPT", help = "IPOPT through pyOptSparse, or a ScipyOptimizeDriver optimizer such as SLSQP")
+    parser.add_argument("--current-solver", default = "newton", choices = ("newton", "block"))
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = run_pareto(args.points, args.workers, flight_conds = args.flight_conds,
+                         optimizer = args.optimizer, current_solver = args.current_solver)
+    front = pareto_front(results)
+    print(f"{len(results)} subproblems in {time.perf_counter() - t0:.1f} s, "
+          f"{sum(r['warm_start'] is not None for r in results)} warm started, {len(front)} points on the front")
+    for r in front:
+        design = ", ".join(f"{name}={value.item():.4g} {units}" for name, (value, units) in r["design"].items())
+        print(f"endurance {r['endurance']:.4f} h, thrust {r['prop_thrust']:.4f} N: {design}")
+
+
+if __name__ == "__main__":
+    main()
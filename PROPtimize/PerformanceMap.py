@@ -0,0 +1,178 @@
+"""Off-design performance maps of one design over throttle, velocity and rho.
+
+The grid is evaluated with the NumPy propulsion chain (the physics of
+PropulsionGroup, see Propulsion.PropulsionChain) in fixed-size chunks of
+flat grid points, each written straight into .npy files memory-mapped from
+the output directory, so memory stays bounded by the chunk size:
+
+    generate_map("maps/design_a", throttle=np.linspace(0.2, 1, 81),
+                 velocity=np.linspace(0, 30, 121), rho=np.linspace(0.9, 1.3, 9),
+                 design={"D_prop": (16, "inch")})
+    perf = load_map("maps/design_a")
+    perf["prop_thrust"][i_throttle, i_velocity, i_rho]
+
+progress.json records the grid, the design and the chunks already written.
+Calling generate_map again with the same arguments and surrogates picks up
+after the last finished chunk, a different grid, design or set of surrogate
+artifacts (e.g. retrained and installed) starts over. Run from the
+PROPtimize directory:
+
+    python PerformanceMap.py maps/default --throttle 0.2 1 81 --velocity 0 30 121 --rho 0.9 1.3 9
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from Defaults import nominal_inputs
+from Propulsion.PropulsionChain import PropulsionChain, cold_start_current
+from Propulsion.SurrogateRegistry import get_surrogates, surrogates_hash
+
+#Mapped outputs, name: units
+OUTPUTS = {
+    "prop_thrust": "N",
+    "prop_power": "W",
+    "battery_power": "W",
+    "rpm": "rpm",
+    "res_current": "A",
+    "esc_efficiency": None,
+    "efficiency": None,
+}
+
+AXES = ("throttle", "velocity", "rho")
+
+PROGRESS = "progress.json"
+
+
+def _fingerprint(axes, nominal, chunk_size, surrogates):
+    digest = hashlib.sha256()
+    for name in AXES:
+        digest.update(np.ascontiguousarray(axes[name], dtype=float).tobytes())
+    digest.update(json.dumps([sorted(nominal.items()), chunk_size, surrogates]).encode())
+    return digest.hexdigest()
+
+
+def _evaluate(chain, x, num_motors, atol, maxiter):
+    guess = cold_start_current(x["battery_voltage_supply"], x["throttle"], x["motor_idle_current"],
+                               x["a"], x["b"], x["c"], (x["resistance_gain"], x["resistance_exponent"]))
+    current, _, converged = chain.solve_current(x, guess, atol = atol, maxiter = maxiter)
+    out = chain.evaluate(current, x)
+    out["res_current"] = current
+    out["prop_thrust"] = chain.thrust(out, x, num_motors)
+    #Overall efficiency, thrust power over battery power
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["efficiency"] = out["prop_thrust"] * x["velocity"] / out["battery_power"]
+    out["converged"] = converged
+    return out
+
+
+def generate_map(directory, throttle, velocity, rho, design=None, chunk_size=65536, num_motors=1.0,
+                 surrogate_dir=None, surrogate_backend="numpy", atol=1e-8, maxiter=50, verbose=False, **coefficients):
+    """Writes OUTPUTS over the throttle x velocity x rho grid to directory.
+
+    design holds name: value or name: (value, units) pairs on top of
+    Defaults.DEFAULTS, coefficients the ESC and motor fit options (a, b, c,
+    kv_coeffs, resistance_coeffs) as in Defaults.nominal_inputs. Velocity
+    is in m/s and rho in kg/m**3. Resumes an interrupted run of the same
+    map. Returns load_map(directory).
+    """
+    axes = {"throttle": np.asarray(throttle, dtype=float),
+            "velocity": np.asarray(velocity, dtype=float),
+            "rho": np.asarray(rho, dtype=float)}
+    shape = tuple(axes[name].size for name in AXES)
+    points = int(np.prod(shape))
+    chunks = -(-points // chunk_size)
+    nominal = nominal_inputs(design, **coefficients)
+    #Retrained surrogates change the hash, so their chunks are never mixed with older ones
+    surrogates = surrogates_hash(surrogate_dir, surrogate_backend)
+    fingerprint = _fingerprint(axes, nominal, chunk_size, surrogates)
+
+    os.makedirs(directory, exist_ok=True)
+    progress_path = os.path.join(directory, PROGRESS)
+    done = 0
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            progress = json.load(f)
+        if progress["fingerprint"] == fingerprint:
+            done = progress["chunks_done"]
+
+    names = tuple(OUTPUTS) + ("converged",)
+    mode = "r+" if done else "w+"
+    maps = {name: np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode = mode,
+                                            dtype = bool if name == "converged" else float, shape = shape)
+            for name in names}
+    if not done:
+        for name in AXES:
+            np.save(os.path.join(directory, name + ".npy"), axes[name])
+
+    chain = PropulsionChain(*get_surrogates(surrogate_dir, surrogate_backend))
+    t0 = time.perf_counter()
+    for chunk in range(done, chunks):
+        start, stop = chunk * chunk_size, min((chunk + 1) * chunk_size, points)
+        index = np.unravel_index(np.arange(start, stop), shape)
+        x = {name: np.full(stop - start, value) for name, value in nominal.items()}
+        for axis, name in zip(index, AXES):
+            x[name] = axes[name][axis]
+
+        out = _evaluate(chain, x, num_motors, atol, maxiter)
+        for name in names:
+            maps[name].reshape(-1)[start:stop] = out[name]
+            maps[name].flush()
+
+        #Only recorded once the chunk is on disk, an interrupted chunk is redone
+        with open(progress_path + ".tmp", "w") as f:
+            json.dump({"fingerprint": fingerprint, "shape": shape, "chunk_size": chunk_size,
+                       "chunks": chunks, "chunks_done": chunk + 1, "design": nominal,
+                       "surrogate_backend": surrogate_backend, "surrogates": surrogates, "units": OUTPUTS}, f, indent = 1)
+        os.replace(progress_path + ".tmp", progress_path)
+        if verbose:
+            rate = (stop - done * chunk_size) / (time.perf_counter() - t0)
+            print(f"chunk {chunk + 1}/{chunks}, {rate:.0f} points/s")
+
+    del maps
+    return load_map(directory)
+
+
+def load_map(directory):
+    """Memory-mapped outputs, the converged mask and the axes of a map,
+    name: array with outputs indexed [throttle, velocity, rho]"""
+    with open(os.path.join(directory, PROGRESS)) as f:
+        progress = json.load(f)
+    if progress["chunks_done"] < progress["chunks"]:
+        raise RuntimeError(f"map in {directory} is incomplete, {progress['chunks_done']} of "
+                           f"{progress['chunks']} chunks, run generate_map again to resume it")
+    return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode = "r")
+            for name in tuple(OUTPUTS) + ("converged",) + AXES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--throttle", type = float, nargs = 3, default = (0.2, 1.0, 81), metavar = ("START", "STOP", "NUM"))
+    parser.add_argument("--velocity", type = float, nargs = 3, default = (0.0, 30.0, 121), metavar = ("START", "STOP", "NUM"), help = "m/s")
+    parser.add_argument("--rho", type = float, nargs = 3, default = (0.9, 1.3, 9), metavar = ("START", "STOP", "NUM"), help = "kg/m**3")
+    parser.add_argument("--D-prop", type = float, default = None, help = "propeller diameter in inches")
+    parser.add_argument("--pitch", type = float, default = None, help = "propeller pitch in degrees")
+    parser.add_argument("--motor-mass", type = float, default = None, help = "kg")
+    parser.add_argument("--motor-idle-current", type = float, default = None, help = "A")
+    parser.add_argument("--chunk-size", type = int, default = 65536)
+    parser.add_argument("--backend", default = "numpy", help = "surrogate backend")
+    args = parser.parse_args()
+
+    units = {"D_prop": "inch", "pitch": "deg", "motor_mass": "kg", "motor_idle_current": "A"}
+    design = {name: (getattr(args, name), unit) for name, unit in units.items() if getattr(args, name) is not None}
+    grid = {name: np.linspace(start, stop, int(num)) for name, (start, stop, num) in
+            (("throttle", args.throttle), ("velocity", args.velocity), ("rho", args.rho))}
+
+    t0 = time.perf_counter()
+    perf = generate_map(args.directory, design = design, chunk_size = args.chunk_size,
+                        surrogate_backend = args.backend, verbose = True, **grid)
+    print(f"{perf['prop_thrust'].size} points in {time.perf_counter() - t0:.1f} s, "
+          f"{np.mean(perf['converged']):.4%} converged, written to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
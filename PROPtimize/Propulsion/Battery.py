@@ -1,6 +1,8 @@
 import numpy as np
 import openmdao.api as om
 
+from Propulsion.Physics import MIN_CURRENT, battery_endurance, battery_outputs
+
 #&& CHECK NECESSARY MODS FOR FLIGHT CONDS
 #CONDITION SHOULD BE BASED ON CURRENT, BATTERY WILL PROVIDE VARYING CURRENT FOR EACH CONDITION BASED ON ENDURANCE REQUIREMENTS
 class Battery(om.ExplicitComponent):
@@ -8,30 +10,109 @@ class Battery(om.ExplicitComponent):
     def initialize(self):
         self.options.declare("flight_conds", default = 3, desc= "Number of Flight Conditions to Analyze")
         self.options.declare("flight_missions", default = 2, desc = "Number of Flight Missions ot Analyze")
+        self.options.declare("capacity_coeffs", default = (7.3, -0.246), desc = "(gain, offset) of the capacity fit: nominal_capacity = gain * battery_mass + offset")
+        self.options.declare("min_current", default = MIN_CURRENT, desc = "Current in A the endurance is computed at when the battery delivers less")
+        self.options.declare("mission", default = False, types = bool, desc = "Sags the open-circuit voltage with charge_used, the charge drawn by the end of each mission segment")
+        self.options.declare("voltage_droop", default = 0.15, desc = "mission mode: fraction of the supply voltage an empty battery has lost at no load, "
+                                                                   "the sag stops there once the charge used exceeds the capacity")
 
     def setup(self):
 
         fc = self.options["flight_conds"]
         fm = self.options["flight_missions"]
+        gain, _ = self.options["capacity_coeffs"]
 
         self.add_input('battery_voltage_supply', shape = fm, units = "V") #Running under the assumption that one can replace batteries
         self.add_input('battery_mass', shape = fm, units = "kg")
         self.add_input('battery_resistance', shape = fm, units = 'ohm') 
         self.add_input('battery_current', shape = (fc,fm), units = 'A')
+        if self.options["mission"]:
+            self.add_input('charge_used', shape = (fc,fm), units = 'A*h')
 
         self.add_output('battery_voltage_out', shape = (fc,fm), units = 'V')
         self.add_output('battery_power', shape = (fc,fm), units = 'W')
         self.add_output('nominal_capacity', shape = fm, units = 'A*h')
         self.add_output('battery_energy', shape = fm, units = "W*h",  desc ="individual battery energy")
+        self.add_output('endurance', shape = (fc,fm), units = 'h', desc = "time to drain the nominal capacity at each condition's current, at least min_current")
         
 
-        self.declare_partials('*', '*', method = 'cs')
+        #Per-mission outputs are diagonal, per-condition outputs see mission y in every row x*fm + y
+        diag = np.arange(fm)
+        cells = np.arange(fc * fm)
+        mission = cells % fm
+        self.declare_partials('nominal_capacity', 'battery_mass', rows = diag, cols = diag, val = gain)
+        self.declare_partials('battery_energy', ['battery_mass', 'battery_voltage_supply'], rows = diag, cols = diag)
+        if self.options["mission"]:
+            #The open-circuit voltage Vs * (1 - droop * min(q / C, 1)) varies with the charge used and the capacity
+            self.declare_partials(['battery_voltage_out', 'battery_power'], 'battery_voltage_supply', rows = cells, cols = mission)
+            self.declare_partials(['battery_voltage_out', 'battery_power'], 'charge_used', rows = cells, cols = cells)
+            self.declare_partials(['battery_voltage_out', 'battery_power'], 'battery_mass', rows = cells, cols = mission)
+        else:
+            self.declare_partials('battery_voltage_out', 'battery_voltage_supply', rows = cells, cols = mission, val = 1.0)
+            self.declare_partials('battery_power', 'battery_voltage_supply', rows = cells, cols = mission)
+        self.declare_partials(['battery_voltage_out', 'battery_power'], 'battery_current', rows = cells, cols = cells)
+        self.declare_partials(['battery_voltage_out', 'battery_power'], 'battery_resistance', rows = cells, cols = mission)
+        self.declare_partials('endurance', 'battery_mass', rows = cells, cols = mission)
+        self.declare_partials('endurance', 'battery_current', rows = cells, cols = cells)
         
 
     def compute(self, inputs, outputs):
-        outputs['nominal_capacity'] = inputs['battery_mass'] * 7.3 - 0.246
+        gain, offset = self.options["capacity_coeffs"]
+        outputs['nominal_capacity'] = inputs['battery_mass'] * gain + offset
         outputs['battery_energy']= inputs['battery_voltage_supply'] * outputs['nominal_capacity']
+        outputs['endurance'], _ = battery_endurance(outputs['nominal_capacity'], inputs['battery_current'], self.options["min_current"])
+
+        values, _ = battery_outputs(self._open_circuit_voltage(inputs), inputs['battery_resistance'], inputs['battery_current'])
+        outputs['battery_voltage_out'] = values['battery_voltage_out']
+        outputs['battery_power'] = values['battery_power']
+
+    def compute_partials(self, inputs, partials):
+        V = inputs['battery_voltage_supply']
+        R = inputs['battery_resistance']
+        I = inputs['battery_current']
+        gain, offset = self.options["capacity_coeffs"]
+
+        partials['battery_energy', 'battery_voltage_supply'] = inputs['battery_mass'] * gain + offset
+        partials['battery_energy', 'battery_mass'] = V * gain
+
+        capacity = inputs['battery_mass'] * gain + offset
+        _, cell_partials = battery_outputs(self._open_circuit_voltage(inputs), R, I)
+        d_open_circuit = {'battery_voltage_supply': 1.0}
+        if self.options["mission"]:
+            droop = self.options["voltage_droop"]
+            q = inputs['charge_used']
+            #Past an empty battery the voltage no longer moves with the charge or the capacity
+            draining = q < capacity
+            d_open_circuit = {
+                'battery_voltage_supply': 1 - droop * self._depth_of_discharge(inputs),
+                'charge_used': np.where(draining, -V * droop / capacity, 0.0),
+                'battery_mass': np.where(draining, V * droop * q * gain / capacity**2, 0.0),
+            }
+        for (output, name), value in cell_partials.items():
+            if name != 'battery_voltage_supply':
+                partials[output, name] = np.broadcast_to(value, I.shape).ravel()
+                continue
+            #battery_outputs takes the open-circuit voltage as battery_voltage_supply, chained to its inputs here.
+            #Without the mission, battery_voltage_out by battery_voltage_supply is the constant 1 declared in setup
+            for name, d_voltage in d_open_circuit.items():
+                if self.options["mission"] or output == 'battery_power':
+                    partials[output, name] = np.broadcast_to(value * d_voltage, I.shape).ravel()
+
+        _, endurance_partials = battery_endurance(capacity, I, self.options["min_current"])
+        partials['endurance', 'battery_mass'] = (gain * endurance_partials['endurance', 'nominal_capacity']).ravel()
+        partials['endurance', 'battery_current'] = endurance_partials['endurance', 'battery_current'].ravel()
+
+    def _depth_of_discharge(self, inputs):
+        """Charge used by the end of each segment over the nominal capacity,
+        saturated at 1 so a mission drawing more than the battery holds still
+        has a voltage to solve the current at"""
+        gain, offset = self.options["capacity_coeffs"]
+        capacity = inputs['battery_mass'] * gain + offset
+        return np.minimum(inputs['charge_used'] / capacity, 1.0)
 
-        outputs['battery_voltage_out'] = (inputs['battery_voltage_supply'] - inputs['battery_current'] * inputs['battery_resistance'])
-        outputs['battery_power'] =  (inputs['battery_current'] * inputs['battery_voltage_supply'] - inputs['battery_current']**2 * inputs['battery_resistance'])
-        
\ No newline at end of file
+    def _open_circuit_voltage(self, inputs):
+        """The supply voltage, or in mission mode the supply voltage less the
+        droop of the charge used by the end of each segment"""
+        if not self.options["mission"]:
+            return inputs['battery_voltage_supply']
+        return inputs['battery_voltage_supply'] * (1 - self.options["voltage_droop"] * self._depth_of_discharge(inputs))
@@ -0,0 +1,152 @@
+import numpy as np
+import openmdao.api as om
+
+from Propulsion.PropulsionChain import INPUTS, PropulsionChain, broadcast_columns, broadcast_inputs, cold_start_current
+from Propulsion.SurrogateCache import SurrogateCache
+from Propulsion.SurrogateRegistry import SURROGATE_BACKENDS, get_surrogates
+
+
+class CurrentBalance(om.ImplicitComponent):
+    """Block-diagonal replacement for PowerResiduals.
+
+    Solves the power balance of every (fc, fm) cell for res_current with a
+    vectorized, bracketed Newton iteration over the whole propulsion chain,
+    so the group around it runs once instead of under a global Newton
+    solver. Each cell's residual only depends on its own current, so the
+    linear solve for total derivatives is a division by the diagonal.
+
+    With warm_start, the first solve starts from cold_start_current and
+    later ones from the last converged currents, extrapolated along their
+    sensitivities to the inputs, dI/dx = -(dR/dx) / (dR/dI), from the last
+    linearization.
+
+    The chain evaluates the components' own functions, and with the
+    PropCoefficients cache as surrogate_cache its surrogate calls on all
+    cells are shared with PropCoefficients: the values and derivatives one
+    computes at the solution are reused by the other.
+    """
+
+    def initialize(self):
+        self.options.declare("flight_conds", default = 3, desc= "Number of Flight Conditions to Analyze")
+        self.options.declare("flight_missions", default = 2, desc = "Number of Flight Missions ot Analyze")
+        self.options.declare("props", default = 1, desc="Number of Props to optimize, should be no more than fm")
+        self.options.declare("motors", default = 1, desc = "Number of motors to size, 1 shared by all missions or one per mission")
+        self.options.declare('a', default = 1.6054, desc = 'ESC efficiency a coefficient, PropulsionGroup passes the ElectronicSpeedController one')
+        self.options.declare('b', default = 1.6519, desc = 'ESC efficiency b coefficient, PropulsionGroup passes the ElectronicSpeedController one')
+        self.options.declare('c', default = 0.6455, desc = 'ESC efficiency c coefficient, PropulsionGroup passes the ElectronicSpeedController one')
+        self.options.declare("kv_coeffs", default = (1.3132 * 120, 0.01), desc = "Motor kv fit, PropulsionGroup passes the Motor one")
+        self.options.declare("resistance_coeffs", default = (0.0467, -1.892), desc = "Motor resistance fit, PropulsionGroup passes the Motor one")
+        self.options.declare("surrogate_dir", default = None, allow_none = True, desc = "Directory holding the surrogates, defaults to PickledSurrogateModels")
+        self.options.declare("surrogate_backend", default = "smt", values = SURROGATE_BACKENDS, desc = "Surrogate backend, as in PropCoefficients")
+        self.options.declare("surrogate_cache", default = None, types = SurrogateCache, allow_none = True, recordable = False,
+                             desc = "Cache of surrogate evaluations, PropulsionGroup passes the one of PropCoefficients")
+        self.options.declare("atol", default = 1e-8, desc = "Power residual in W below which a cell is converged")
+        self.options.declare("maxiter", default = 50, desc = "Iteration limit of the per-cell solve")
+        self.options.declare("warm_start", default = True, types = bool, desc = "Start from predicted currents instead of the current res_current values")
+
+    def setup(self):
+        fc = self.options["flight_conds"]
+        fm = self.options["flight_missions"]
+        p = self.options["props"]
+        nm = self.options["motors"]
+
+        self.add_input('battery_voltage_supply', shape = fm, units = "V")
+        self.add_input('battery_resistance', shape = fm, units = 'ohm')
+        self.add_input("throttle", shape = (fc,fm))
+        self.add_input('motor_idle_current', shape = nm, units = 'A')
+        self.add_input('motor_mass', shape = nm, units = 'kg')
+        self.add_input("D_prop", units = "m", shape = p)
+        self.add_input("pitch", units = "deg", shape = p)
+        self.add_input('velocity', shape = (fc,fm), units = "m/s")
+        self.add_input("rho", units = "kg/m**3")
+
+        self.add_output('res_current', shape = (fc,fm), units = 'A', val = 30)
+
+        #Each cell's residual reads its own current and one entry of every input
+        shapes = {
+            'battery_voltage_supply': fm, 'battery_resistance': fm, 'throttle': (fc,fm),
+            'motor_idle_current': nm, 'motor_mass': nm, 'D_prop': p, 'pitch': p,
+            'velocity': (fc,fm), 'rho': 1,
+        }
+        cells = np.arange(fc * fm)
+        self.declare_partials('res_current', 'res_current', rows = cells, cols = cells)
+        for name in INPUTS:
+            self.declare_partials('res_current', name, rows = cells, cols = broadcast_columns(shapes[name], fc, fm))
+
+        thrust_sm, power_sm = get_surrogates(self.options["surrogate_dir"], self.options["surrogate_backend"])
+        self.chain = PropulsionChain(thrust_sm, power_sm, self.options['a'], self.options['b'], self.options['c'],
+                                     self.options["kv_coeffs"], self.options["resistance_coeffs"],
+                                     cache = self.options["surrogate_cache"])
+        self.iterations = 0
+        self.mean_iterations = 0.0
+        self._diag = None
+        self._warm = None
+
+    def _cells(self, inputs):
+        return broadcast_inputs(inputs, self.options["flight_conds"], self.options["flight_missions"])
+
+    def apply_nonlinear(self, inputs, outputs, residuals):
+        out = self.chain.evaluate(outputs['res_current'].ravel(), self._cells(inputs))
+        residuals['res_current'] = out['power_net'].reshape(residuals['res_current'].shape)
+
+    def _guess(self, cells, current):
+        if not self.options["warm_start"]:
+            return current
+        warm = self._warm
+        if warm is None:
+            return cold_start_current(
+                cells['battery_voltage_supply'], cells['throttle'], cells['motor_idle_current'],
+                self.options['a'], self.options['b'], self.options['c'], self.options["resistance_coeffs"],
+            )
+        if warm['sens'] is None:
+            return warm['current']
+
+        guess = warm['current'].copy()
+        for name, sens in warm['sens'].items():
+            guess += sens * (cells[name] - warm['x'][name])
+        #Keep the carried-over current where the extrapolation is unusable
+        return np.where(np.isfinite(guess) & (guess > 0), guess, warm['current'])
+
+    def solve_nonlinear(self, inputs, outputs):
+        cells = self._cells(inputs)
+        current, iterations, converged = self.chain.solve_current(
+            cells,
+            self._guess(cells, outputs['res_current'].ravel()),
+            atol = self.options["atol"],
+            maxiter = self.options["maxiter"],
+        )
+        outputs['res_current'] = current.reshape(outputs['res_current'].shape)
+        self.iterations = int(iterations.max(initial = 0))
+        self.mean_iterations = float(iterations.mean())
+        if converged.all():
+            self._warm = {'x': {name: value.copy() for name, value in cells.items()}, 'current': current, 'sens': None}
+        if not converged.all():
+            om.issue_warning(f"current balance did not converge in {(~converged).sum()} of {converged.size} cells", prefix = self.msginfo)
+
+    def checkpoint_state(self):
+        """The warm start of the next solve, a copy safe to write out while solving continues"""
+        warm = self._warm
+        if warm is None:
+            return {"warm": None}
+        sens = None if warm['sens'] is None else dict(warm['sens'])
+        return {"warm": {'x': warm['x'], 'current': warm['current'], 'sens': sens}}
+
+    def restore_state(self, state):
+        self._warm = state["warm"]
+
+    def linearize(self, inputs, outputs, partials):
+        out = self.chain.evaluate(outputs['res_current'].ravel(), self._cells(inputs), wrt = ('res_current',) + INPUTS)
+        for name, value in out['d_power_net'].items():
+            partials['res_current', name] = value
+        self._diag = out['d_power_net']['res_current']
+
+        warm = self._warm
+        if warm is not None and np.array_equal(warm['current'], outputs['res_current'].ravel()):
+            warm['sens'] = {name: -out['d_power_net'][name] / self._diag for name in INPUTS}
+
+    def solve_linear(self, d_outputs, d_residuals, mode):
+        shape = d_outputs['res_current'].shape
+        if mode == 'fwd':
+            d_outputs['res_current'] = d_residuals['res_current'] / self._diag.reshape(shape)
+        else:
+            d_residuals['res_current'] = d_outputs['res_current'] / self._diag.reshape(shape)
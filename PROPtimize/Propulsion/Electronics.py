@@ -1,6 +1,10 @@
 
+import numpy as np
 import openmdao.api as om
 
+from Propulsion.Physics import esc_outputs
+
+
 class ElectronicSpeedController(om.ExplicitComponent):
 
     def initialize(self):
@@ -22,15 +26,21 @@ class ElectronicSpeedController(om.ExplicitComponent):
         self.add_output('esc_current_out', shape = (fc,fm),units = 'A')
         self.add_output('esc_power', shape = (fc,fm), units = 'W')
 
-        self.declare_partials('*', '*', method = 'cs')
+        #Every output is elementwise over the (fc, fm) grid
+        cells = np.arange(fc * fm)
+        self.declare_partials('esc_efficiency', 'throttle', rows = cells, cols = cells)
+        self.declare_partials('esc_voltage_out', ['esc_voltage_in', 'throttle'], rows = cells, cols = cells)
+        self.declare_partials('esc_current_out', ['esc_current_in', 'throttle'], rows = cells, cols = cells)
+        self.declare_partials('esc_power', ['esc_current_in', 'esc_voltage_in', 'throttle'], rows = cells, cols = cells)
 
     def compute(self, inputs, outputs):
-        
-        a = self.options['a']
-        b = self.options['b']
-        c = self.options['c']
-        outputs['esc_efficiency'] = a * (1 - 1 / (1 + b*inputs['throttle']**c))
-
-        outputs['esc_voltage_out'] = inputs['esc_voltage_in'] * inputs['throttle'] * outputs['esc_efficiency']
-        outputs['esc_current_out'] = inputs['esc_current_in'] / inputs['throttle']
-        outputs['esc_power'] = (outputs['esc_efficiency'] - 1) * inputs['esc_current_in'] * inputs['esc_voltage_in']
\ No newline at end of file
+        values, _ = esc_outputs(inputs['esc_voltage_in'], inputs['esc_current_in'], inputs['throttle'],
+                                self.options['a'], self.options['b'], self.options['c'])
+        for name, value in values.items():
+            outputs[name] = value
+
+    def compute_partials(self, inputs, partials):
+        _, cell_partials = esc_outputs(inputs['esc_voltage_in'], inputs['esc_current_in'], inputs['throttle'],
+                                       self.options['a'], self.options['b'], self.options['c'])
+        for key, value in cell_partials.items():
+            partials[key] = value.ravel()
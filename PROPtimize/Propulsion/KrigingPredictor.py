@@ -0,0 +1,149 @@
+"""Pure-NumPy evaluator for the fitted KPLSK surrogates.
+
+After training, KPLSK predicts with an ordinary kriging model in the full
+4-D input space, so its fitted state reduces to a handful of arrays:
+
+    y(x) = y_mean + y_std * (f(xn) . beta + r(xn) . gamma)
+    r_j(xn) = exp(-sum_k theta_k (xn_k - X_jk)^2),  xn = (x - X_offset) / X_scale
+
+export_kplsk writes those arrays as a registry bundle, and KrigingPredictor
+evaluates values and gradients from them without smt. Run this module from
+the PROPtimize directory to export and verify the pickled models:
+
+    python -m Propulsion.KrigingPredictor PickledSurrogateModels
+"""
+import argparse
+import os
+import sys
+import threading
+
+import numpy as np
+
+from Propulsion.SurrogateRegistry import load_arrays, load_pickle, save_arrays
+
+POLY_TYPES = ("constant", "linear")
+
+
+def export_kplsk(sm, path):
+    """Writes the fitted state of a trained smt KPLSK (or KRG) model to a bundle"""
+    if sm.options["corr"] != "squar_exp":
+        raise ValueError(f"Only squar_exp correlation can be exported, got {sm.options['corr']}")
+    if sm.options["poly"] not in POLY_TYPES:
+        raise ValueError(f"Only {POLY_TYPES} regression can be exported, got {sm.options['poly']}")
+
+    save_arrays(path, {
+        "X_offset": sm.X_offset,
+        "X_scale": sm.X_scale,
+        "y_mean": np.atleast_1d(sm.y_mean),
+        "y_std": np.atleast_1d(sm.y_std),
+        "theta": sm.optimal_theta,
+        "beta": sm.optimal_par["beta"],
+        "gamma": sm.optimal_par["gamma"],
+        "X_train": sm.X_norma,
+        "poly": np.array(POLY_TYPES.index(sm.options["poly"])),
+    })
+
+
+class KrigingPredictor(object):
+    """Evaluates an exported kriging model, with the predict_values and
+    predict_derivatives signatures of smt so it can stand in for it.
+
+    The correlation matrix of the last evaluated points is kept per thread,
+    so predict_derivatives after predict_values on the same stack (compute
+    then compute_partials) does not recompute it.
+    """
+
+    def __init__(self, arrays):
+        self.X_offset = np.asarray(arrays["X_offset"]).ravel()
+        self.X_scale = np.asarray(arrays["X_scale"]).ravel()
+        self.y_mean = float(np.asarray(arrays["y_mean"]).ravel()[0])
+        self.y_std = float(np.asarray(arrays["y_std"]).ravel()[0])
+        self.theta = np.asarray(arrays["theta"]).ravel()
+        self.beta = np.asarray(arrays["beta"]).ravel()
+        self.gamma = np.asarray(arrays["gamma"]).ravel()
+        self.X_train = arrays["X_train"]
+        self.poly = POLY_TYPES[int(arrays["poly"])]
+        self.nx = self.X_train.shape[1]
+        self._memo = threading.local()
+
+    @classmethod
+    def from_bundle(cls, path):
+        return cls(load_arrays(path))
+
+    def _correlation(self, x):
+        """Normalized points and their (n, nt) correlation with the training set"""
+        memo = self._memo
+        if getattr(memo, "x", None) is not None and memo.x.shape == x.shape and np.array_equal(memo.x, x):
+            return memo.xn, memo.r
+
+        xn = (x - self.X_offset) / self.X_scale
+        d = np.zeros((x.shape[0], self.X_train.shape[0]))
+        for k in range(self.nx):
+            d += self.theta[k] * (xn[:, k, None] - self.X_train[None, :, k])**2
+        r = np.exp(-d)
+
+        memo.x = np.array(x, copy=True)
+        memo.xn = xn
+        memo.r = r
+        return xn, r
+
+    def predict_values(self, x):
+        xn, r = self._correlation(np.atleast_2d(x))
+        y = r @ self.gamma + self.beta[0]
+        if self.poly == "linear":
+            y += xn @ self.beta[1:]
+        return (self.y_mean + self.y_std * y).reshape(-1, 1)
+
+    def predict_derivatives(self, x, kx):
+        xn, r = self._correlation(np.atleast_2d(x))
+        #d r_j / d xn_k = -2 theta_k (xn_k - X_jk) r_j, contracted with gamma in the order
+        #smt uses, gamma is large enough that any other order loses digits against it
+        dr = -2 * self.theta[kx] * (xn[:, kx, None] - self.X_train[:, kx]) * r
+        dy = dr @ self.gamma
+        if self.poly == "linear":
+            dy += self.beta[1 + kx]
+        return (dy * self.y_std / self.X_scale[kx]).reshape(-1, 1)
+
+    def predict_gradients(self, x):
+        """All nx derivative directions at once, shape (n, nx)"""
+        return np.hstack([self.predict_derivatives(x, kx) for kx in range(self.nx)])
+
+
+def verify(sm, predictor, x):
+    """Largest relative deviation of predictor from the smt model at x, for
+    values and for each derivative direction"""
+    def rel(a, b):
+        return float(np.max(np.abs(a - b)) / max(np.max(np.abs(b)), 1e-300))
+
+    errors = {"values": rel(predictor.predict_values(x), sm.predict_values(x))}
+    for kx in range(x.shape[1]):
+        errors[f"d{kx}"] = rel(predictor.predict_derivatives(x, kx), sm.predict_derivatives(x, kx))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export pickled KPLSK surrogates to NumPy bundles and verify them")
+    parser.add_argument("directory", help="directory holding thrust_sm.pkl and power_sm.pkl")
+    parser.add_argument("--samples", type=int, default=2000, help="random points used for verification")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="largest accepted relative deviation")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    failed = False
+    for name in ("thrust_sm", "power_sm"):
+        sm = load_pickle(os.path.join(args.directory, name + ".pkl"))
+        export_kplsk(sm, os.path.join(args.directory, name))
+        predictor = KrigingPredictor.from_bundle(os.path.join(args.directory, name))
+
+        xt = sm.training_points[None][0][0]
+        lower, upper = xt.min(axis=0), xt.max(axis=0)
+        x = np.vstack([xt, lower + (upper - lower) * rng.random((args.samples, xt.shape[1]))])
+        errors = verify(sm, predictor, x)
+        print(name, " ".join(f"{key}={value:.2e}" for key, value in errors.items()))
+        failed |= max(errors.values()) > args.rtol
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+import openmdao.api as om
+
+from Propulsion.Physics import MIN_CURRENT
+
+#The flight conditions of a mission are taken as its time-ordered segments: row x of
+#mission y (cell x*fm + y) is flown for segment_duration[x, y] at the current solved for it.
+
+
+class BatteryCharge(om.ImplicitComponent):
+    """Charge drawn from the battery by the end of each segment.
+
+    The residual q[x] - q[x-1] - I[x] * dt[x] couples each segment to the one
+    before it only, so the Jacobian is lower bidiagonal in every mission and
+    solve_nonlinear is a cumulative sum. The linear solves are left to the
+    model's DirectSolver, which mission mode always runs under.
+    """
+
+    def initialize(self):
+        self.options.declare("flight_conds", default = 3, desc= "Number of Flight Conditions to Analyze")
+        self.options.declare("flight_missions", default = 2, desc = "Number of Flight Missions ot Analyze")
+
+    def setup(self):
+        fc = self.options["flight_conds"]
+        fm = self.options["flight_missions"]
+        self.add_input('battery_current', shape = (fc,fm), units = 'A')
+        self.add_input('segment_duration', shape = (fc,fm), units = 'h')
+
+        self.add_output('charge_used', shape = (fc,fm), units = 'A*h', desc = "charge drawn by the end of each segment")
+
+        #Diagonal 1 and -1 on the previous segment of the same mission, fm cells back
+        cells = np.arange(fc * fm)
+        later = cells[fm:]
+        self.declare_partials('charge_used', 'charge_used', rows = np.concatenate([cells, later]),
+                              cols = np.concatenate([cells, later - fm]),
+                              val = np.concatenate([np.ones(fc * fm), -np.ones(later.size)]))
+        self.declare_partials('charge_used', ['battery_current', 'segment_duration'], rows = cells, cols = cells)
+
+    def apply_nonlinear(self, inputs, outputs, residuals):
+        q = outputs['charge_used']
+        previous = np.zeros_like(q)
+        previous[1:] = q[:-1]
+        residuals['charge_used'] = q - previous - inputs['battery_current'] * inputs['segment_duration']
+
+    def solve_nonlinear(self, inputs, outputs):
+        outputs['charge_used'] = np.cumsum(inputs['battery_current'] * inputs['segment_duration'], axis = 0)
+
+    def linearize(self, inputs, outputs, partials):
+        partials['charge_used', 'battery_current'] = -inputs['segment_duration'].ravel()
+        partials['charge_used', 'segment_duration'] = -inputs['battery_current'].ravel()
+
+
+class MissionPerformance(om.ExplicitComponent):
+    """State of charge along each mission, the charge left at its end and
+    the mission endurance: how long the battery lasts flying the mission's
+    profile, nominal capacity over the mean current of the mission, the
+    current floored at min_current as in Battery. The loaded voltage along
+    the mission is Battery's battery_voltage_out, which in mission mode sags
+    with charge_used and so feeds back into the current solve.
+
+    A mission may draw more than the nominal capacity. The state of charge
+    then stays at 0 and remaining_capacity goes negative, so a driver
+    constrains remaining_capacity >= 0 to keep the missions flyable."""
+
+    def initialize(self):
+        self.options.declare("flight_conds", default = 3, desc= "Number of Flight Conditions to Analyze")
+        self.options.declare("flight_missions", default = 2, desc = "Number of Flight Missions ot Analyze")
+        self.options.declare("min_current", default = MIN_CURRENT, desc = "Mean current in A the mission endurance is computed at when the mission draws less")
+
+    def setup(self):
+        fc = self.options["flight_conds"]
+        fm = self.options["flight_missions"]
+        self.add_input('charge_used', shape = (fc,fm), units = 'A*h')
+        self.add_input('nominal_capacity', shape = fm, units = 'A*h')
+        self.add_input('segment_duration', shape = (fc,fm), units = 'h')
+
+        self.add_output('state_of_charge', shape = (fc,fm), desc = "charge left at the end of each segment, 1 when full, 0 once empty")
+        self.add_output('remaining_capacity', shape = fm, units = 'A*h', desc = "charge left at the end of the mission, negative when it needs more than the nominal capacity")
+        self.add_output('mission_endurance', shape = fm, units = 'h', desc = "time the battery lasts repeating the mission profile")
+
+        #Per-cell outputs see their own cell and their mission's battery, the endurance
+        #every segment duration of its mission and the charge at its last segment
+        cells = np.arange(fc * fm)
+        mission = cells % fm
+        last = (fc - 1) * fm + np.arange(fm)
+        self.declare_partials('state_of_charge', 'charge_used', rows = cells, cols = cells)
+        self.declare_partials('state_of_charge', 'nominal_capacity', rows = cells, cols = mission)
+        self.declare_partials('remaining_capacity', 'nominal_capacity', rows = np.arange(fm), cols = np.arange(fm), val = 1.0)
+        self.declare_partials('remaining_capacity', 'charge_used', rows = np.arange(fm), cols = last, val = -1.0)
+        self.declare_partials('mission_endurance', 'nominal_capacity', rows = np.arange(fm), cols = np.arange(fm))
+        self.declare_partials('mission_endurance', 'charge_used', rows = np.arange(fm), cols = last)
+        self.declare_partials('mission_endurance', 'segment_duration', rows = mission, cols = cells)
+
+    def compute(self, inputs, outputs):
+        q = inputs['charge_used']
+        C = inputs['nominal_capacity']
+        T = np.sum(inputs['segment_duration'], axis = 0)
+
+        outputs['state_of_charge'] = np.maximum(1 - q / C, 0)
+        outputs['remaining_capacity'] = C - q[-1]
+        outputs['mission_endurance'] = C * T / np.maximum(q[-1], self.options["min_current"] * T)
+
+    def compute_partials(self, inputs, partials):
+        fc = self.options["flight_conds"]
+        q = inputs['charge_used']
+        C = inputs['nominal_capacity']
+        T = np.sum(inputs['segment_duration'], axis = 0)
+
+        #Zero where the battery is empty
+        draining = q < C
+        partials['state_of_charge', 'charge_used'] = np.where(draining, -1 / C, 0.0).ravel()
+        partials['state_of_charge', 'nominal_capacity'] = np.where(draining, q / C**2, 0.0).ravel()
+
+        #Where the mean current is floored the endurance is C / min_current, whatever q and T
+        drawing = q[-1] > self.options["min_current"] * T
+        partials['mission_endurance', 'nominal_capacity'] = np.where(drawing, T / q[-1], 1 / self.options["min_current"])
+        partials['mission_endurance', 'charge_used'] = np.where(drawing, -C * T / q[-1]**2, 0.0)
+        partials['mission_endurance', 'segment_duration'] = np.tile(np.where(drawing, C / q[-1], 0.0), fc)
@@ -1,33 +1,57 @@
 import numpy as np
 import openmdao.api as om
 
+from Propulsion.Physics import motor_outputs
+
+
 class Motor(om.ExplicitComponent):
     def initialize(self):
         self.options.declare("flight_conds", default = 3, desc= "Number of Flight Conditions to Analyze")
         self.options.declare("flight_missions", default = 2, desc = "Number of Flight Missions ot Analyze")
+        self.options.declare("motors", default = 1, desc = "Number of motors to size, 1 shared by all missions or one per mission")
+        self.options.declare("kv_coeffs", default = (1.3132 * 120, 0.01), desc = "(gain, offset) of the kv fit: kv = gain / (motor_mass + offset), Scorpion motors by default")
+        self.options.declare("resistance_coeffs", default = (0.0467, -1.892), desc = "(gain, exponent) of the resistance fit: resistance = gain * motor_idle_current ** exponent")
 
     def setup(self):
         fc = self.options["flight_conds"]
         fm = self.options["flight_missions"]
-        self.add_input('motor_idle_current', units = 'A')
-        self.add_input('motor_mass', units = 'kg' )
+        nm = self.options["motors"]
+        self.add_input('motor_idle_current', shape = nm, units = 'A')
+        self.add_input('motor_mass', shape = nm, units = 'kg' )
         self.add_input('motor_voltage_in', shape = (fc,fm), units = 'V')
         self.add_input('motor_current', shape = (fc,fm), units = 'A')
 
         self.add_output('rpm', shape = (fc,fm), units = 'rev/min')
         self.add_output('motor_power', shape = (fc,fm), units = 'W')
-        self.add_output('motor_kv', units = 'rpm / V')
-        self.add_output('motor_resistance', units = 'ohm')
-
-
-        self.declare_partials('*', '*', method = 'cs')
+        self.add_output('motor_kv', shape = nm, units = 'rpm / V')
+        self.add_output('motor_resistance', shape = nm, units = 'ohm')
+
+
+        #Motor parameters feed every cell of their mission (or every cell for a single motor)
+        cells = np.arange(fc * fm)
+        motor = cells % nm
+        self.declare_partials('motor_kv', 'motor_mass', rows = np.arange(nm), cols = np.arange(nm))
+        self.declare_partials('motor_resistance', 'motor_idle_current', rows = np.arange(nm), cols = np.arange(nm))
+        self.declare_partials(['rpm', 'motor_power'], ['motor_voltage_in', 'motor_current'], rows = cells, cols = cells)
+        self.declare_partials(['rpm', 'motor_power'], 'motor_idle_current', rows = cells, cols = motor)
+        self.declare_partials('rpm', 'motor_mass', rows = cells, cols = motor)
         
 
     def compute(self, inputs, outputs):
+        values, _ = motor_outputs(inputs['motor_idle_current'], inputs['motor_mass'], inputs['motor_voltage_in'],
+                                  inputs['motor_current'], self.options["kv_coeffs"], self.options["resistance_coeffs"])
+        for name, value in values.items():
+            outputs[name] = value
 
-        outputs['motor_kv'] = (1.3132 * 120) / (inputs['motor_mass'] + 0.01) # FOR SCORPION MOTORS
-        outputs['motor_resistance'] = (0.0467 * inputs['motor_idle_current'] ** -1.892)
-
-        voltage_prop = inputs['motor_voltage_in'] - (inputs['motor_current'] * outputs['motor_resistance'])
-        outputs['rpm'] = outputs['motor_kv'] * voltage_prop 
-        outputs['motor_power'] = -inputs['motor_current']**2 * outputs['motor_resistance'] - inputs['motor_idle_current'] * voltage_prop
\ No newline at end of file
+    def compute_partials(self, inputs, partials):
+        fc = self.options["flight_conds"]
+        fm = self.options["flight_missions"]
+        _, cell_partials = motor_outputs(inputs['motor_idle_current'], inputs['motor_mass'], inputs['motor_voltage_in'],
+                                         inputs['motor_current'], self.options["kv_coeffs"], self.options["resistance_coeffs"])
+
+        #kv and resistance are per motor, the rest broadcast over the (fc, fm) grid like the motor parameters in compute
+        for key, value in cell_partials.items():
+            if key[0] in ('motor_kv', 'motor_resistance'):
+                partials[key] = value
+            else:
+                partials[key] = np.broadcast_to(value, (fc, fm)).ravel()
@@ -0,0 +1,144 @@
+"""Elementwise physics of the propulsion chain components.
+
+Each function returns the outputs of one component (or one output of
+Battery or Propeller) and their partials by (output, input), elementwise in NumPy
+arrays. The OpenMDAO components and the cell-by-cell PropulsionChain both
+compute through them, and they need nothing but NumPy, so the chain, the
+Monte Carlo kernel and the performance maps run without OpenMDAO.
+"""
+import numpy as np
+
+#power_net = sum of sign * power, so the residual and its constant partials come from one place
+POWER_SIGNS = {
+    'battery_power': 1.0,
+    'esc_power': 1.0,
+    'motor_power': 1.0,
+    'prop_power': -1.0,
+}
+
+
+def battery_outputs(voltage_supply, resistance, current):
+    """Loaded voltage and power of a battery with internal resistance
+    delivering current, and their partials by (output, input). Arrays
+    broadcast elementwise, as in Battery and PropulsionChain."""
+    outputs = {
+        'battery_voltage_out': voltage_supply - current * resistance,
+        'battery_power': current * voltage_supply - current**2 * resistance,
+    }
+    partials = {
+        ('battery_voltage_out', 'battery_voltage_supply'): 1.0,
+        ('battery_voltage_out', 'battery_current'): -resistance,
+        ('battery_voltage_out', 'battery_resistance'): -current,
+        ('battery_power', 'battery_voltage_supply'): current,
+        ('battery_power', 'battery_current'): voltage_supply - 2 * current * resistance,
+        ('battery_power', 'battery_resistance'): -current**2,
+    }
+    return outputs, partials
+
+
+#Current in A below which the endurance stops growing, so a cell drawing no current
+#has a long but finite endurance instead of a division by zero
+MIN_CURRENT = 1e-3
+
+
+def battery_endurance(capacity, current, min_current=MIN_CURRENT):
+    """Time to drain capacity at current, the current floored at min_current,
+    and its partials by (output, input). The current partial is zero where
+    the floor holds. Used by Battery and Catalog."""
+    floored = np.maximum(current, min_current)
+    endurance = capacity / floored
+    partials = {
+        ('endurance', 'nominal_capacity'): 1 / floored,
+        ('endurance', 'battery_current'): np.where(current > min_current, -capacity / floored**2, 0.0),
+    }
+    return endurance, partials
+
+
+def esc_outputs(voltage_in, current_in, throttle, a, b, c):
+    """Efficiency, output voltage and current, and power loss of the ESC,
+    with their partials by (output, input). Elementwise in the arrays and
+    the a, b, c coefficients, for ElectronicSpeedController and
+    PropulsionChain alike."""
+    t = throttle
+    denom = 1 + b * t**c
+    eff = a * (1 - 1 / denom)
+    deff_dt = a * b * c * t**(c - 1) / denom**2
+
+    outputs = {
+        'esc_efficiency': eff,
+        'esc_voltage_out': voltage_in * t * eff,
+        'esc_current_out': current_in / t,
+        'esc_power': (eff - 1) * current_in * voltage_in,
+    }
+    partials = {
+        ('esc_efficiency', 'throttle'): deff_dt,
+        ('esc_voltage_out', 'esc_voltage_in'): t * eff,
+        ('esc_voltage_out', 'throttle'): voltage_in * (eff + t * deff_dt),
+        ('esc_current_out', 'esc_current_in'): 1 / t,
+        ('esc_current_out', 'throttle'): -current_in / t**2,
+        ('esc_power', 'throttle'): deff_dt * current_in * voltage_in,
+        ('esc_power', 'esc_current_in'): (eff - 1) * voltage_in,
+        ('esc_power', 'esc_voltage_in'): (eff - 1) * current_in,
+    }
+    return outputs, partials
+
+
+def motor_outputs(idle_current, mass, voltage_in, current, kv_coeffs, resistance_coeffs):
+    """kv and resistance from the motor fits, rpm and power of the motor at
+    voltage_in and current, and their partials by (output, input). rpm and
+    motor_power partials are total through kv and resistance. Used by Motor
+    and PropulsionChain, elementwise in every argument."""
+    kg, ko = kv_coeffs
+    rg, re = resistance_coeffs
+    I0 = idle_current
+    I = current
+
+    kv = kg / (mass + ko)
+    dkv_dm = -kg / (mass + ko)**2
+    R = rg * I0 ** re
+    dR_dI0 = rg * re * I0 ** (re - 1)
+    voltage_prop = voltage_in - I * R
+
+    outputs = {
+        'motor_kv': kv,
+        'motor_resistance': R,
+        'rpm': kv * voltage_prop,
+        'motor_power': -I**2 * R - I0 * voltage_prop,
+    }
+    partials = {
+        ('motor_kv', 'motor_mass'): dkv_dm,
+        ('motor_resistance', 'motor_idle_current'): dR_dI0,
+        ('rpm', 'motor_mass'): dkv_dm * voltage_prop,
+        ('rpm', 'motor_voltage_in'): kv,
+        ('rpm', 'motor_current'): -kv * R,
+        ('rpm', 'motor_idle_current'): -kv * I * dR_dI0,
+        ('motor_power', 'motor_voltage_in'): -I0,
+        ('motor_power', 'motor_current'): -2 * I * R + I0 * R,
+        ('motor_power', 'motor_idle_current'): -I**2 * dR_dI0 - voltage_prop + I0 * I * dR_dI0,
+    }
+    return outputs, partials
+
+
+def prop_thrust(rho, D_prop, rpm, ct, num_motors):
+    """Thrust of num_motors props at rpm in rev/s, and its partials by (output, input)"""
+    thrust = rho * rpm**2 * D_prop**4 * ct * num_motors
+    partials = {
+        ("prop_thrust", "rho"): rpm**2 * D_prop**4 * ct * num_motors,
+        ("prop_thrust", "rpm"): 2 * rho * rpm * D_prop**4 * ct * num_motors,
+        ("prop_thrust", "D_prop"): 4 * rho * rpm**2 * D_prop**3 * ct * num_motors,
+        ("prop_thrust", "ct"): rho * rpm**2 * D_prop**4 * num_motors,
+        ("prop_thrust", "num_motors"): rho * rpm**2 * D_prop**4 * ct,
+    }
+    return thrust, partials
+
+
+def prop_power(rho, D_prop, rpm, cp):
+    """Shaft power one prop absorbs at rpm in rev/s, and its partials by (output, input)"""
+    power = rho * rpm**3 * D_prop**5 * cp
+    partials = {
+        ("prop_power", "rho"): rpm**3 * D_prop**5 * cp,
+        ("prop_power", "rpm"): 3 * rho * rpm**2 * D_prop**5 * cp,
+        ("prop_power", "D_prop"): 5 * rho * rpm**3 * D_prop**4 * cp,
+        ("prop_power", "cp"): rho * rpm**3 * D_prop**5,
+    }
+    return power, partials
@@ -1,6 +1,8 @@
 import numpy as np
 import openmdao.api as om
 
+from Propulsion.Physics import POWER_SIGNS
+
 #Might be a 3x2, may be screwed here. 
 class PowerResiduals(om.ImplicitComponent):
     
@@ -19,7 +21,10 @@ class PowerResiduals(om.ImplicitComponent):
         self.add_output('res_current', shape =(fc,fm), units = 'A', val = 30)
         self.add_residual('power_net', shape = (fc, fm), units = 'W')
 
-        self.declare_partials('*', '*', method = 'cs')
+        cells = np.arange(fc * fm)
+        #The power balance is linear, so its partials are constant
+        for name, sign in POWER_SIGNS.items():
+            self.declare_partials('power_net', name, rows = cells, cols = cells, val = sign)
 
     def apply_nonlinear(self, inputs, outputs, residuals):
-        residuals['power_net'] = inputs['battery_power'] + inputs['esc_power'] + inputs['motor_power'] - inputs['prop_power']
\ No newline at end of file
+        residuals['power_net'] = sum(sign * inputs[name] for name, sign in POWER_SIGNS.items())
\ No newline at end of file
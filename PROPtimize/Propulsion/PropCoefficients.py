@@ -3,9 +3,9 @@
 
 import openmdao.api as om
 import numpy as np
-import pickle
 
-from smt.surrogate_models import KPLSK #type:ignore
+from Propulsion.SurrogateCache import SurrogateCache, array_key
+from Propulsion.SurrogateRegistry import SURROGATE_BACKENDS, get_surrogates, surrogates_hash
 
 class PropCoefficients(om.ExplicitComponent):
     """Encapsulated surrogate model to compute thrust and power
@@ -19,46 +19,14 @@ class PropCoefficients(om.ExplicitComponent):
         self.options.declare("flight_conds", default = 3, desc= "Number of Flight Conditions to Analyze")
         self.options.declare("flight_missions", default = 2, desc = "Number of Flight Missions ot Analyze")
         self.options.declare("props", default = 1, desc="Number of Props to optimize, should be no more than fm")
+        self.options.declare("surrogate_dir", default = None, allow_none = True, desc = "Directory holding thrust_sm.pkl and power_sm.pkl, defaults to PickledSurrogateModels")
+        self.options.declare("surrogate_backend", default = "smt", values = SURROGATE_BACKENDS, desc = "smt evaluates the pickled KPLSK models, numpy their exported state without smt, table the distilled spline tables")
+        self.options.declare("cache_size", default = 64, types = int, desc = "Surrogate evaluations kept in the LRU cache, 0 turns the cache off")
+        self.options.declare("surrogate_cache", default = None, types = SurrogateCache, allow_none = True, recordable = False,
+                             desc = "Cache shared with other evaluations of the same surrogates, a private one of cache_size entries if None")
 
-        """Initializing surrogate model, reading and sampling data"""
-        '''
-        self.thrust_sm = KPLSK(n_comp=4, eval_noise=True, print_global=False)
-        self.power_sm = KPLSK(n_comp=4, eval_noise=True, print_global=False)
-
-        x, ct, cp = PropDataReader()
-        x, ct, cp, xVal, ctVal, cpVal = SampleDataLHScosine(x, ct, cp)
-
-        xlim = np.array(
-            [
-                 [np.min(x[:, 0]), np.max(x[:, 0]) + 1],
-                 [np.min(x[:, 1]), np.max(x[:, 1]) + 1],
-                 [np.min(x[:, 2]), np.max(x[:, 2]) + 1],
-                 [np.min(x[:, 3]), np.max(x[:, 3]) + 1],
-            ]
-        )
-
-        self.thrust_sm.set_training_values(x, ct)
-        self.thrust_sm.train()
-        self.power_sm.set_training_values(x, cp)
-        self.power_sm.train()
-
-        with open("PickledSurrogateModels/power_sm.pkl", "wb") as fp:
-            pickle.dump(self.power_sm, fp)
-        with open("PickledSurrogateModels/thrust_sm.pkl", "wb") as fp:
-            pickle.dump(self.thrust_sm, fp)
-        '''
-
-        with open(
-            "PickledSurrogateModels/power_sm.pkl", #Now using 1.3.0
-            "rb",
-        ) as fp:
-            self.power_sm = pickle.load(fp) 
-        with open(
-            "PickledSurrogateModels/thrust_sm.pkl", #Now using 1.3.0
-            "rb",
-        ) as fp:
-            self.thrust_sm = pickle.load(fp)
-            #'''
+        #The surrogates are trained offline from prop test data by
+        #Propulsion.SurrogateTraining and loaded from surrogate_dir in setup
 
     def setup(self):
         fc = self.options["flight_conds"]
@@ -72,163 +40,83 @@ class PropCoefficients(om.ExplicitComponent):
         self.add_output('ct', shape = (fc,fm),desc = "thrust coefficients")
         self.add_output('cp', shape = (fc,fm),desc="power coefficients")
 
-        self.declare_partials('*', '*')
+        #ct and cp are elementwise in rpm and velocity, row x*fm + y sees prop y (or the single prop)
+        cells = np.arange(fc * fm)
+        self.declare_partials(['ct', 'cp'], ['rpm', 'velocity'], rows = cells, cols = cells)
+        self.declare_partials(['ct', 'cp'], ['D_prop', 'pitch'], rows = cells, cols = cells % p)
+
+        self._cond_key = None
+        self._cond = None
+        self._cond_digest = None
+        self._cache = self.options["surrogate_cache"]
+        if self._cache is None:
+            self._cache = SurrogateCache(self.options["cache_size"])
+
+        #Loaded once per process and shared by every instance through the registry
+        self.thrust_sm, self.power_sm = get_surrogates(self.options["surrogate_dir"], self.options["surrogate_backend"])
+        self._surrogates_hash = surrogates_hash(self.options["surrogate_dir"], self.options["surrogate_backend"])
+
+    def _stack_conditions(self, inputs):
+        """Stacks (D_prop, pitch, rpm, velocity) into one (fc*fm, 4) design
+        matrix, row x*fm + y holding flight condition x of mission y.
+        The matrix is kept between compute and compute_partials so a
+        linearization at the point just computed does not rebuild it."""
+        key = tuple(inputs[name].tobytes() for name in ("D_prop", "pitch", "rpm", "velocity"))
+        if key == self._cond_key:
+            return self._cond
 
-    def compute_partials(self, inputs, partials):
-        fc = self.options["flight_conds"]
-        fm = self.options["flight_missions"]
-        p=self.options["props"]
-        D = inputs["D_prop"]
-        pitch = inputs["pitch"]
-        n = inputs['rpm']
-        V = inputs['velocity']
-        #Create empty array for each condition depending on how many are declared
-        #Fill the conditiosn with the amount of flight missions that have been declared
-        x=0
-        cond = []
-        #For the diameter and pitch, when adding multiprop, will be D[y]
-        if p > 1:
-            while x < fc:
-                y= 0
-                while y < fm:
-                    temps = np.ndarray((0,4))
-                    temps = [np.vstack((temps, np.array([D[y], pitch[y], n[x][y], V[x][y]])))]
-                    cond.append(temps)
-                    y+=1
-                x+=1
-        if p == 1: 
-            while x < fc:
-                    y= 0
-                    while y < fm:
-                        temps = np.ndarray((0,4))
-                        temps = [np.vstack((temps, np.array([D[0], pitch[0], n[x][y], V[x][y]])))]
-                        cond.append(temps)
-                        y+=1
-                    x+=1
-
-        #Predict the partials for each condition with respect to each (First declare range of conditions)
-        ranger = int(np.size(cond)/4)
-
-        #Diameter
-        tdzeros = np.zeros((fc * fm , p))
-        td = []
-        for z in range(ranger):
-            appender=self.thrust_sm.predict_derivatives(cond[z][0], 0)
-            td.append(appender)
-        for m in range(p):
-            for r in range(m,fc * fm, p):
-                tdzeros[r][m]= td[r]
-        partials["ct", "D_prop"] = tdzeros
-
-        pdzeros = np.zeros((fc * fm , p))
-        pd = []
-        for z in range(ranger):
-            appender=self.power_sm.predict_derivatives(cond[z][0], 0)
-            pd.append(appender)
-        for m in range(p):
-            for r in range(m,fc * fm, p):
-                pdzeros[r][m]= pd[r]
-        partials["cp", "D_prop"] = pdzeros
-
-        #Pitch 
-        tpzeros = np.zeros((fc * fm , p))
-        tp = []
-        for z in range(ranger):
-            appender=self.thrust_sm.predict_derivatives(cond[z][0], 1)
-            tp.append(appender)
-        for m in range(p):
-            for r in range(m,fc * fm, p):
-                tpzeros[r][m]= tp[r]
-        partials["ct", "pitch"] = tpzeros
-
-        ppzeros = np.zeros((fc * fm ,  p))
-        pp = []
-        for z in range(ranger):
-            appender=self.power_sm.predict_derivatives(cond[z][0], 1)
-            pp.append(appender)
-        for m in range(p):
-            for r in range(m,fc * fm, p):
-                ppzeros[r][m]= pp[r]
-        partials["cp", "pitch"] = ppzeros
-
-        #RPM
-        tnzeros = np.zeros((fc * fm , fc * fm))
-        tn = []
-        for z in range(ranger):
-            appender=self.thrust_sm.predict_derivatives(cond[z][0], 2)
-            tn.append(appender)
-        np.fill_diagonal(
-            tnzeros,
-            tn
-        )
-        partials["ct", "rpm"] = tnzeros
-
-        pnzeros = np.zeros((fc * fm , fc * fm ))
-        pn = []
-        for z in range(ranger):
-            appender= self.power_sm.predict_derivatives(cond[z][0], 2)
-            pn.append(appender)
-        np.fill_diagonal(
-            pnzeros,
-            pn
-        )
-        partials["cp", "rpm"] = pnzeros
-
-        #Velocity
-        tvzeros = np.zeros((fc * fm , fc * fm))
-        tv = []
-        for z in range(ranger):
-            appender=self.thrust_sm.predict_derivatives(cond[z][0], 3)
-            tv.append(appender)
-        np.fill_diagonal(
-            tvzeros,
-            tv
-        )
-        partials["ct", "velocity"] = tvzeros
-        
-        pvzeros = np.zeros((fc * fm , fc * fm ))
-        pv = []
-        for z in range(ranger):
-            appender= self.power_sm.predict_derivatives(cond[z][0], 3)
-            pv.append(appender)
-        np.fill_diagonal(
-            pvzeros,
-            pv
-        )
-        partials["cp", "velocity"] = pvzeros
-    
-    def compute(self, inputs, outputs):
         fc = self.options["flight_conds"]
         fm = self.options["flight_missions"]
         p = self.options["props"]
-        D = inputs["D_prop"]
-        pitch = inputs["pitch"]
-        n = inputs['rpm']
-        V = inputs['velocity']
-        #Create empty array for each condition depending on how many are declared
-        #Fill the conditiosn with the amount of flight missions that have been declared
-        x=0
-        cond = []
-        #For the diameter and pitch, when adding multiprop, will be D[y], &&
-        if p > 1: 
-            while x < fc:
-                y= 0
-                while y < fm:
-                    appender = np.array([D[y], pitch[y], n[x][y], V[x][y]])
-                    cond.append(appender)
-                    y+=1
-                x+=1
-        if p == 1: 
-            while x < fc:
-                y= 0
-                while y < fm:
-                    appender = np.array([D[0], pitch[0], n[x][y], V[x][y]])
-                    cond.append(appender)
-                    y+=1
-                x+=1
-        #Unlike in partials, here one stacks all conditions, predicting all at once. 
-        topredict = np.vstack(cond)
-        
-        #test this first, if it works could be crazy
-        outputs["ct"] = self.thrust_sm.predict_values(topredict)
-        outputs["cp"] = self.power_sm.predict_values(topredict)
\ No newline at end of file
+        #For the diameter and pitch, with multiprop mission y uses D[y]
+        prop_idx = np.arange(fm) if p > 1 else np.zeros(fm, dtype=int)
+
+        cond = np.empty((fc * fm, 4))
+        cond[:, 0] = np.tile(inputs["D_prop"][prop_idx], fc)
+        cond[:, 1] = np.tile(inputs["pitch"][prop_idx], fc)
+        cond[:, 2] = inputs["rpm"].ravel()
+        cond[:, 3] = inputs["velocity"].ravel()
+
+        self._cond_key = key
+        self._cond = cond
+        self._cond_digest = array_key(cond)
+        return cond
+
+    def cache_stats(self):
+        """Hit, miss and eviction counters of the surrogate cache"""
+        return self._cache.stats()
+
+    def checkpoint_state(self):
+        """Cached surrogate evaluations, restored on resume so they are not recomputed,
+        and the hash of the surrogates that computed them"""
+        return {"cache": self._cache.snapshot(), "surrogates": self._surrogates_hash}
+
+    def restore_state(self, state):
+        #Evaluations of other (retrained, or another backend's) surrogates would be served as ours
+        if state.get("surrogates") != self._surrogates_hash:
+            om.issue_warning("the checkpoint's surrogate cache was computed with other surrogates, "
+                             "it is dropped", prefix = self.msginfo)
+            self._cache.clear()
+            return
+        self._cache.restore(state["cache"])
+
+    def compute_partials(self, inputs, partials):
+        cond = self._stack_conditions(inputs)
+
+        #One surrogate call per model and derivative direction on the whole stack,
+        #the declared rows/cols pattern takes the values in row order.
+        #Newton and line searches revisit stacks, so each direction is cached on its own
+        for out, sm in (("ct", self.thrust_sm), ("cp", self.power_sm)):
+            for kx, name in enumerate(("D_prop", "pitch", "rpm", "velocity")):
+                partials[out, name] = self._cache.get(
+                    (out, kx, self._cond_digest),
+                    lambda: sm.predict_derivatives(cond, kx).ravel(),
+                )
+
+    def compute(self, inputs, outputs):
+        cond = self._stack_conditions(inputs)
+        for out, sm in (("ct", self.thrust_sm), ("cp", self.power_sm)):
+            outputs[out] = self._cache.get(
+                (out, None, self._cond_digest),
+                lambda: sm.predict_values(cond).ravel(),
+            ).reshape(outputs[out].shape)
@@ -1,6 +1,8 @@
 import openmdao.api as om
 import numpy as np 
 
+from Propulsion.Physics import prop_power, prop_thrust
+
 
 class Propeller(om.ExplicitComponent):
 
@@ -22,13 +24,24 @@ class Propeller(om.ExplicitComponent):
         self.add_output("prop_thrust", shape =(fc,fm), units ="N")
         self.add_output("prop_power", shape = (fc,fm), units = "W")
 
-        self.declare_partials("*", "*", method="cs")
+        #Row x*fm + y uses prop y (or the single prop), rho and num_motors are shared scalars
+        cells = np.arange(fc * fm)
+        prop = cells % p
+        column = np.zeros(fc * fm, dtype=int)
+        self.declare_partials("prop_thrust", ["rpm", "ct"], rows=cells, cols=cells)
+        self.declare_partials("prop_power", ["rpm", "cp"], rows=cells, cols=cells)
+        self.declare_partials(["prop_thrust", "prop_power"], "D_prop", rows=cells, cols=prop)
+        self.declare_partials(["prop_thrust", "prop_power"], "rho", rows=cells, cols=column)
+        self.declare_partials("prop_thrust", "num_motors", rows=cells, cols=column)
 
 
     def compute(self, inputs, outputs):
-        rho = inputs["rho"]
-        D = inputs["D_prop"]
-        n = inputs ["rpm"]
-
-        outputs["prop_thrust"] = (rho * n**2 * D**4 * inputs["ct"] * inputs["num_motors"])
-        outputs["prop_power"] = (rho * n**3 * D**5 * inputs["cp"])
\ No newline at end of file
+        outputs["prop_thrust"], _ = prop_thrust(inputs["rho"], inputs["D_prop"], inputs["rpm"], inputs["ct"], inputs["num_motors"])
+        outputs["prop_power"], _ = prop_power(inputs["rho"], inputs["D_prop"], inputs["rpm"], inputs["cp"])
+
+    def compute_partials(self, inputs, partials):
+        _, thrust = prop_thrust(inputs["rho"], inputs["D_prop"], inputs["rpm"], inputs["ct"], inputs["num_motors"])
+        _, power = prop_power(inputs["rho"], inputs["D_prop"], inputs["rpm"], inputs["cp"])
+        for cell_partials in (thrust, power):
+            for key, value in cell_partials.items():
+                partials[key] = value.ravel()
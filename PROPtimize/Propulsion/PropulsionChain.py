@@ -0,0 +1,224 @@
+"""Vectorized Battery -> ESC -> Motor -> PropCoefficients -> Propeller chain.
+
+Each (flight condition, mission) cell of the current balance only depends on
+its own battery current, so the power residual of PowerResiduals and its
+derivatives can be evaluated for every cell at once with NumPy, and the
+current solved cell by cell without a global Newton system. The physics are
+the components' own, from Propulsion.Physics, chained in forward mode
+through the partials they return.
+
+Cell inputs are flat arrays of equal length (see broadcast_inputs) in the
+units the components compute in: V, ohm, A, kg, m, deg, m/s and kg/m**3.
+They may also hold any of PARAMETERS per cell, overriding the chain's ESC
+and motor fit coefficients, e.g. for Monte Carlo samples.
+"""
+import numpy as np
+
+from Propulsion.Physics import POWER_SIGNS, battery_outputs, esc_outputs, motor_outputs, prop_power, prop_thrust
+from Propulsion.SurrogateCache import array_key
+
+INPUTS = (
+    "battery_voltage_supply",
+    "battery_resistance",
+    "throttle",
+    "motor_idle_current",
+    "motor_mass",
+    "D_prop",
+    "pitch",
+    "velocity",
+    "rho",
+)
+
+#Model coefficients a cell can override: ESC efficiency a, b, c, motor kv = kv_gain / (mass + kv_offset)
+#and motor resistance = resistance_gain * idle_current ** resistance_exponent
+PARAMETERS = ("a", "b", "c", "kv_gain", "kv_offset", "resistance_gain", "resistance_exponent")
+
+
+def broadcast_inputs(inputs, fc, fm):
+    """Flattens model-shaped inputs (per cell, per mission, per prop or
+    scalar) to one value per cell, row x*fm + y holding condition x of
+    mission y. Follows the broadcasting the components themselves use."""
+    return {name: np.broadcast_to(inputs[name], (fc, fm)).ravel() for name in INPUTS}
+
+
+def broadcast_columns(shape, fc, fm):
+    """Index into an input of the given shape that each cell reads,
+    the cols of its sparse partials"""
+    return np.broadcast_to(np.arange(int(np.prod(shape))).reshape(shape), (fc, fm)).ravel()
+
+
+def cold_start_current(battery_voltage_supply, throttle, motor_idle_current, a=1.6054, b=1.6519, c=0.6455,
+                       resistance_coeffs=(0.0467, -1.892)):
+    """Closed-form battery current estimate for starting the current solve.
+
+    Uses the maximum-efficiency current of a DC motor, sqrt(I0 * V / Rm),
+    at the ESC output voltage without battery sag, scaled by throttle from
+    motor to battery current. It lands near the physical root, well below
+    the stall current a solve can otherwise wander to.
+    """
+    t = throttle
+    V = battery_voltage_supply * t * a * (1 - 1 / (1 + b * t**c))
+    Rm = resistance_coeffs[0] * motor_idle_current ** resistance_coeffs[1]
+    return t * np.sqrt(motor_idle_current * np.maximum(V, 0) / Rm)
+
+
+def _combine(*terms):
+    """Sums coef * derivative dicts, the forward-mode chain rule of this module"""
+    out = {}
+    for coef, deriv in terms:
+        for name, value in deriv.items():
+            out[name] = out[name] + coef * value if name in out else coef * value
+    return out
+
+
+def _forward(partials, output, inputs):
+    """Derivatives of output from those of the inputs, the (output, input)
+    partials of a component function applied to each"""
+    return _combine(*((value, inputs[name]) for (out, name), value in partials.items() if out == output))
+
+
+def _conditions(x, rpm):
+    """(n, 4) surrogate rows of (D_prop [m], pitch [deg], rpm [rev/s], velocity [m/s]), as PropCoefficients stacks them"""
+    cond = np.empty((rpm.size, 4))
+    cond[:, 0] = x["D_prop"]
+    cond[:, 1] = x["pitch"]
+    cond[:, 2] = rpm
+    cond[:, 3] = x["velocity"]
+    return cond
+
+
+class PropulsionChain(object):
+    """Evaluates the propulsion chain and its current balance for flat arrays
+    of cells. thrust_sm and power_sm take (n, 4) rows of (D_prop [m],
+    pitch [deg], rpm [rev/s], velocity [m/s]), as in PropCoefficients.
+
+    With a SurrogateCache, surrogate calls on all cells go through it under
+    the keys PropCoefficients uses, so a chain handed the cache of the
+    PropCoefficients next to it reuses the values and derivatives the model
+    computed at the same point, and the other way around.
+    """
+
+    def __init__(self, thrust_sm, power_sm, a=1.6054, b=1.6519, c=0.6455,
+                 kv_coeffs=(1.3132 * 120, 0.01), resistance_coeffs=(0.0467, -1.892), cache=None):
+        self.thrust_sm = thrust_sm
+        self.power_sm = power_sm
+        self.cache = cache
+        self.parameters = {
+            "a": a, "b": b, "c": c,
+            "kv_gain": kv_coeffs[0], "kv_offset": kv_coeffs[1],
+            "resistance_gain": resistance_coeffs[0], "resistance_exponent": resistance_coeffs[1],
+        }
+
+    def _predict(self, out, cond, kx=None, cache=True):
+        """Values (kx None) or derivatives along kx of the ct or cp surrogate, through the cache if any"""
+        sm = self.thrust_sm if out == "ct" else self.power_sm
+        compute = lambda: (sm.predict_values(cond) if kx is None else sm.predict_derivatives(cond, kx)).ravel()
+        if self.cache is None or not cache:
+            return compute()
+        return self.cache.get((out, kx, array_key(cond)), compute)
+
+    def evaluate(self, current, x, wrt=(), cache=True):
+        """Chain outputs for battery current and cell inputs x.
+
+        With wrt, the returned dict also holds 'd_power_net', the elementwise
+        derivatives of the power residual with respect to each name in wrt
+        ('res_current' or any of INPUTS). cache=False keeps the surrogate
+        calls out of the cache, for evaluations that will not come again.
+        """
+        I = current
+        D = x["D_prop"]
+        rho = x["rho"]
+        a, b, c, kg, ko, rg, re = (x.get(name, self.parameters[name]) for name in PARAMETERS)
+        seed = {name: np.ones_like(I) for name in wrt}
+        d = lambda name: {name: seed[name]} if name in seed else {}
+
+        #The components' own functions, each followed by the chain rule through its partials
+        battery, dbattery = battery_outputs(x["battery_voltage_supply"], x["battery_resistance"], I)
+        battery_in = {"battery_voltage_supply": d("battery_voltage_supply"), "battery_resistance": d("battery_resistance"),
+                      "battery_current": d("res_current")}
+        dVb = _forward(dbattery, "battery_voltage_out", battery_in)
+        dPb = _forward(dbattery, "battery_power", battery_in)
+
+        esc, desc = esc_outputs(battery["battery_voltage_out"], I, x["throttle"], a, b, c)
+        esc_in = {"esc_voltage_in": dVb, "esc_current_in": d("res_current"), "throttle": d("throttle")}
+        dVe = _forward(desc, "esc_voltage_out", esc_in)
+        dIe = _forward(desc, "esc_current_out", esc_in)
+        dPe = _forward(desc, "esc_power", esc_in)
+
+        motor, dmotor = motor_outputs(x["motor_idle_current"], x["motor_mass"], esc["esc_voltage_out"],
+                                      esc["esc_current_out"], (kg, ko), (rg, re))
+        motor_in = {"motor_idle_current": d("motor_idle_current"), "motor_mass": d("motor_mass"),
+                    "motor_voltage_in": dVe, "motor_current": dIe}
+        drpm = _forward(dmotor, "rpm", motor_in)
+        dPm = _forward(dmotor, "motor_power", motor_in)
+
+        #Prop coefficients and power, the surrogates take rev/s. OpenMDAO converts rpm to rev/s
+        #by multiplying with 1 / 60, so the rows match PropCoefficients' bit for bit and share its cache
+        n = motor["rpm"] * (1 / 60)
+        dn = _combine((1 / 60, drpm))
+        cond = _conditions(x, n)
+        cp = self._predict("cp", cond, cache = cache)
+        dcp = {}
+        for kx, dz in enumerate((d("D_prop"), d("pitch"), dn, d("velocity"))):
+            if dz:
+                dcp = _combine((1.0, dcp), (self._predict("cp", cond, kx, cache), dz))
+        Pp, dprop = prop_power(rho, D, n, cp)
+        dPp = _forward(dprop, "prop_power", {"rho": d("rho"), "rpm": dn, "D_prop": d("D_prop"), "cp": dcp})
+
+        out = dict(battery, **esc, **motor, cp = cp, prop_power = Pp)
+        out["power_net"] = sum(sign * out[name] for name, sign in POWER_SIGNS.items())
+        if wrt:
+            powers = {"battery_power": dPb, "esc_power": dPe, "motor_power": dPm, "prop_power": dPp}
+            dR = _combine(*((sign, powers[name]) for name, sign in POWER_SIGNS.items()))
+            out["d_power_net"] = {name: dR.get(name, np.zeros_like(I)) for name in wrt}
+        return out
+
+    def thrust(self, out, x, num_motors=1.0):
+        """Prop thrust [N] of evaluated outputs, needs a thrust surrogate call"""
+        n = out["rpm"] * (1 / 60)
+        ct = self._predict("ct", _conditions(x, n))
+        return prop_thrust(x["rho"], x["D_prop"], n, ct, num_motors)[0]
+
+    def solve_current(self, x, guess, atol=1e-8, maxiter=50):
+        """Solves power_net = 0 for the battery current of every cell.
+
+        Each cell takes its own Newton steps, falling back to bisection when a
+        step leaves the bracket of currents known to straddle its root. Cells
+        whose residual is below atol are frozen and dropped from later
+        evaluations. Returns the currents, the iterations each cell took and
+        a converged mask.
+        """
+        I = np.array(guess, dtype=float)
+        lo = np.zeros_like(I)
+        hi = np.full_like(I, np.inf)
+        iterations = np.zeros(I.shape, dtype=int)
+        active = np.arange(I.size)
+
+        for it in range(maxiter + 1):
+            sub = {name: value[active] for name, value in x.items()}
+            #Only the full set of cells, evaluated again at the solution, is worth caching
+            out = self.evaluate(I[active], sub, wrt=("res_current",), cache=active.size == I.size)
+            R = out["power_net"]
+            J = out["d_power_net"]["res_current"]
+
+            done = np.abs(R) <= atol
+            active, R, J = active[~done], R[~done], J[~done]
+            if active.size == 0 or it == maxiter:
+                break
+            Ia = I[active]
+
+            #The residual rises with current through the physical root
+            lo[active] = np.where(R < 0, np.maximum(lo[active], Ia), lo[active])
+            hi[active] = np.where(R > 0, np.minimum(hi[active], Ia), hi[active])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = Ia - R / J
+            bracketed = np.isfinite(hi[active])
+            inside = np.isfinite(step) & (step > lo[active]) & (~bracketed | (step < hi[active]))
+            fallback = np.where(bracketed, 0.5 * (lo[active] + hi[active]), 2 * np.maximum(Ia, 1.0))
+
+            I[active] = np.where(inside, step, fallback)
+            iterations[active] += 1
+
+        converged = np.ones(I.shape, dtype=bool)
+        converged[active] = False
+        return I, iterations, converged
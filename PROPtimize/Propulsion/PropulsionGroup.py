@@ -7,6 +7,24 @@ from Propulsion.Electronics import ElectronicSpeedController
 from Propulsion.Motor import Motor
 from Propulsion.PowerResiduals import PowerResiduals
 from Propulsion.PropCoefficients import PropCoefficients
+from Propulsion.CurrentBalance import CurrentBalance
+from Propulsion.PropulsionChain import INPUTS, PropulsionChain, broadcast_inputs, cold_start_current
+from Propulsion.Mission import BatteryCharge, MissionPerformance
+from Propulsion.SurrogateCache import SurrogateCache
+
+#Where guess_nonlinear reads each PropulsionChain input, relative to the group.
+#battery_voltage_supply, battery_resistance and D_prop are promoted from more than one subsystem.
+CELL_INPUTS = {
+    'battery_voltage_supply': 'battery.battery_voltage_supply',
+    'battery_resistance': 'battery.battery_resistance',
+    'throttle': 'throttle',
+    'motor_idle_current': 'motor_idle_current',
+    'motor_mass': 'motor_mass',
+    'D_prop': 'PropCoefficients.D_prop',
+    'pitch': 'pitch',
+    'velocity': 'velocity',
+    'rho': 'rho',
+}
 
 
 class PropulsionGroup(om.Group):
@@ -20,27 +38,71 @@ class PropulsionGroup(om.Group):
         Thrust
     """
 
+    def initialize(self):
+        self.options.declare("current_solver", default = "newton", values = ["newton", "block"],
+                             desc = "newton leaves res_current to the parent's Newton solver through PowerResiduals, "
+                                    "block solves it cell by cell in CurrentBalance")
+        self.options.declare("mission", default = False, types = bool,
+                             desc = "Integrates the battery charge over the flight conditions as time-ordered mission segments, "
+                                    "the battery voltage sagging with the charge used")
+        self.options.declare("warm_start", default = True, types = bool,
+                             desc = "newton mode: start each solve from the last currents, extrapolated to the new inputs")
+        #Declared here so ElectronicSpeedController, Motor and CurrentBalance are built from the same values
+        self.options.declare('a', default = 1.6054, desc = 'ESC efficiency a coefficient, see ElectronicSpeedController')
+        self.options.declare('b', default = 1.6519, desc = 'ESC efficiency b coefficient, see ElectronicSpeedController')
+        self.options.declare('c', default = 0.6455, desc = 'ESC efficiency c coefficient, see ElectronicSpeedController')
+        self.options.declare("kv_coeffs", default = (1.3132 * 120, 0.01), desc = "(gain, offset) of the Motor kv fit")
+        self.options.declare("resistance_coeffs", default = (0.0467, -1.892), desc = "(gain, exponent) of the Motor resistance fit")
+        self.options.declare("cache_size", default = 64, types = int,
+                             desc = "Surrogate evaluations kept in the cache PropCoefficients shares with the current solve, 0 turns it off")
+
     def setup(self):
-        
+        if self.options["mission"] and self.options["current_solver"] == "block":
+            raise ValueError("mission needs current_solver='newton', the battery voltage couples the segments of a mission")
+        esc_coeffs = {name: self.options[name] for name in ('a', 'b', 'c')}
+        motor_coeffs = {name: self.options[name] for name in ('kv_coeffs', 'resistance_coeffs')}
+        #One cache for every evaluation of the surrogates in this group
+        self._surrogate_cache = SurrogateCache(self.options["cache_size"])
+
+        if self.options["current_solver"] == "block":
+            #Solved first, everything downstream is explicit in res_current
+            self.add_subsystem(
+                'current',
+                CurrentBalance(**esc_coeffs, **motor_coeffs, surrogate_cache = self._surrogate_cache),
+                promotes_inputs = [
+                    'battery_voltage_supply',
+                    'battery_resistance',
+                    'throttle',
+                    'motor_idle_current',
+                    'motor_mass',
+                    'D_prop',
+                    'pitch',
+                    'velocity',
+                    'rho',
+                ],
+                promotes_outputs = ['res_current']
+            )
+
         self.add_subsystem(
             'battery', 
-            Battery(),
+            Battery(mission = self.options["mission"]),
             promotes_inputs= [
                 'battery_voltage_supply', 
                 'battery_mass',
                 'battery_resistance',
                 'battery_current'
-            ], 
+            ] + (['charge_used'] if self.options["mission"] else []), 
             promotes_outputs= [
                 'battery_energy',
                 'battery_voltage_out',
                 'battery_power',
-                'nominal_capacity'
+                'nominal_capacity',
+                'endurance',
             ]
         )
         self.add_subsystem(
             'esc', 
-            ElectronicSpeedController(),
+            ElectronicSpeedController(**esc_coeffs),
             promotes_inputs= [
                 'esc_voltage_in',
                 'esc_current_in',
@@ -55,7 +117,7 @@ class PropulsionGroup(om.Group):
         )
         self.add_subsystem(
             'motor', 
-            Motor(),
+            Motor(**motor_coeffs),
             promotes_inputs= [
                 'motor_idle_current',
                 'motor_mass',
@@ -72,7 +134,7 @@ class PropulsionGroup(om.Group):
         
         self.add_subsystem(
             "PropCoefficients",
-            PropCoefficients(),
+            PropCoefficients(surrogate_cache = self._surrogate_cache),
             promotes_inputs=[
                 "D_prop",
                 "pitch",
@@ -108,19 +170,102 @@ class PropulsionGroup(om.Group):
             promotes_inputs=["rpm", "D_prop"],
             promotes_outputs=["RPM_con"],
         )
-        self.add_subsystem(
-            'power_net', 
-            PowerResiduals(), 
-            promotes_inputs = [
-                'battery_power', 
-                'esc_power',
-                'motor_power',
-                'prop_power',
-            ],
-            promotes_outputs= ['res_current']
-        )
+        if self.options["current_solver"] == "newton":
+            self.add_subsystem(
+                'power_net', 
+                PowerResiduals(), 
+                promotes_inputs = [
+                    'battery_power', 
+                    'esc_power',
+                    'motor_power',
+                    'prop_power',
+                ],
+                promotes_outputs= ['res_current']
+            )
         
         self.connect('battery_voltage_out', 'esc_voltage_in')
         self.connect('esc_voltage_out', 'motor_voltage_in')
         self.connect('esc_current_out', 'motor_current')
-        self.connect('res_current', ['battery_current', 'esc_current_in'])
\ No newline at end of file
+        if self.options["mission"]:
+            self.add_subsystem(
+                'charge',
+                BatteryCharge(),
+                promotes_inputs = ['battery_current', 'segment_duration'],
+                promotes_outputs = ['charge_used'],
+            )
+            self.add_subsystem(
+                'mission',
+                MissionPerformance(),
+                promotes_inputs = [
+                    'charge_used',
+                    'nominal_capacity',
+                    'segment_duration',
+                ],
+                promotes_outputs = ['state_of_charge', 'remaining_capacity', 'mission_endurance'],
+            )
+
+        self.connect('res_current', ['battery_current', 'esc_current_in'])
+
+        self._current_guessed = False
+        self._warm = None
+        self._chain = None
+
+    def checkpoint_state(self):
+        warm = self._warm
+        if warm is not None:
+            warm = {'x': warm['x']}
+        return {"current_guessed": self._current_guessed, "warm": warm}
+
+    def restore_state(self, state):
+        #A restored res_current is a better start than the closed-form estimate
+        self._current_guessed = state["current_guessed"]
+        self._warm = state.get("warm")
+
+    def _cells(self, inputs, shape):
+        return broadcast_inputs({name: inputs[path] for name, path in CELL_INPUTS.items()}, *shape)
+
+    def _sensitivities(self, x, current):
+        """dI/dx = -(dR/dx) / (dR/dI) of every cell at inputs x and the currents they converged to"""
+        if self._chain is None:
+            options = self.options
+            self._chain = PropulsionChain(self.PropCoefficients.thrust_sm, self.PropCoefficients.power_sm,
+                                          options['a'], options['b'], options['c'],
+                                          options['kv_coeffs'], options['resistance_coeffs'], self._surrogate_cache)
+        d_power_net = self._chain.evaluate(current, x, wrt = ('res_current',) + INPUTS)['d_power_net']
+        return {name: -d_power_net[name] / d_power_net['res_current'] for name in INPUTS}
+
+    def guess_nonlinear(self, inputs, outputs, residuals):
+        #Only reached under the parent's Newton solver. The first solve starts from the
+        #closed-form estimate instead of 30 A, later ones from the currents the last solve
+        #left behind, moved along their sensitivities to the inputs that changed since,
+        #as CurrentBalance does in block mode. A last solve that ended on unusable values
+        #starts over from the closed-form estimate.
+        if not self.options["warm_start"]:
+            return
+        shape = outputs['res_current'].shape
+        cells = self._cells(inputs, shape)
+        current = outputs['res_current'].ravel()
+        warm = self._warm
+        self._warm = {'x': {name: value.copy() for name, value in cells.items()}}
+
+        if not (self._current_guessed and np.all(np.isfinite(current)) and np.all(current > 0)):
+            options = self.options
+            outputs['res_current'] = cold_start_current(
+                inputs['battery.battery_voltage_supply'], inputs['throttle'], inputs['motor_idle_current'],
+                options['a'], options['b'], options['c'], options['resistance_coeffs'],
+            )
+            self._current_guessed = True
+            return
+        #Unit round-off from the driver's scaling is no change, and not worth the sensitivities
+        changed = [] if warm is None else [name for name in INPUTS
+                                           if not np.allclose(cells[name], warm['x'][name], rtol = 1e-12, atol = 0)]
+        if not changed:
+            return
+
+        #The Newton linearization at the last converged point, evaluated through the NumPy chain
+        sens = self._sensitivities(warm['x'], current)
+        guess = current.copy()
+        for name in changed:
+            guess += sens[name] * (cells[name] - warm['x'][name])
+        #Keep the carried-over current where the extrapolation is unusable
+        outputs['res_current'] = np.where(np.isfinite(guess) & (guess > 0), guess, current).reshape(shape)
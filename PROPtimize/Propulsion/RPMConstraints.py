@@ -18,7 +18,16 @@ class RPMConstraints(om.ExplicitComponent):
 
         self.add_output("RPM_con", shape=(fc,fm), desc="RPM limit")
 
-        self.declare_partials("*", "*", method="cs")
+        cells = np.arange(fc * fm)
+        self.declare_partials("RPM_con", "rpm", rows=cells, cols=cells, val=1.0)
+        self.declare_partials("RPM_con", "D_prop", rows=cells, cols=cells % p)
 
     def compute(self, inputs, outputs):
         outputs["RPM_con"] = inputs["rpm"] - 150000 / inputs["D_prop"]
+
+    def compute_partials(self, inputs, partials):
+        fc = self.options["flight_conds"]
+        fm = self.options["flight_missions"]
+        p = self.options["props"]
+        D = inputs["D_prop"]
+        partials["RPM_con", "D_prop"] = 150000 / D[np.arange(fc * fm) % p]**2
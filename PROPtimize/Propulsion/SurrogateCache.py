@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+
+def array_key(array):
+    """Compact digest of an array's shape and contents, used as a cache key"""
+    digest = hashlib.blake2b(array.tobytes(), digest_size=16)
+    digest.update(str(array.shape).encode())
+    return digest.digest()
+
+
+class SurrogateCache(object):
+    """Bounded LRU cache of surrogate evaluations.
+
+    Entries are looked up by key and computed on a miss, the least recently
+    used entry is evicted once maxsize entries are held. A maxsize of 0
+    turns the cache off and every lookup is a miss. Cached arrays are made
+    read-only, callers copy them into their outputs and partials.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        if self.maxsize <= 0:
+            return value
+
+        value.setflags(write=False)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def snapshot(self):
+        """(key, value) pairs from least to most recently used, for checkpoints"""
+        with self._lock:
+            return list(self._entries.items())
+
+    def restore(self, entries):
+        """Refills the cache from a snapshot, keeping the newest maxsize entries"""
+        with self._lock:
+            self._entries.clear()
+            for key, value in entries[-self.maxsize:] if self.maxsize > 0 else ():
+                self._entries[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
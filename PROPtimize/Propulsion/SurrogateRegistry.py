@@ -0,0 +1,147 @@
+"""Process-wide registry for the surrogate model artifacts.
+
+Each artifact is loaded once per process, on first use, and keyed by the
+sha256 of its contents, so every Problem built afterwards (and the same file
+reached through a different path) reuses the loaded object. File hashes are
+remembered per (path, mtime, size), so repeated lookups cost a stat call.
+
+Array bundles are directories of .npy files opened with np.load(mmap_mode='r'),
+so worker processes reading the same bundle share the page cache instead of
+each holding a private copy of the arrays.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+
+import numpy as np
+
+SURROGATE_DIR = os.environ.get(
+    "PROPTIMIZE_SURROGATE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PickledSurrogateModels"),
+)
+
+_lock = threading.RLock()
+_file_hashes = {}
+_artifacts = {}
+
+
+def file_hash(path):
+    """sha256 of a file, recomputed only when its mtime or size changes"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _file_hashes.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(block)
+    digest = digest.hexdigest()
+
+    with _lock:
+        _file_hashes[path] = (stamp, digest)
+    return digest
+
+
+def bundle_hash(path):
+    """Combined hash of every array file in a bundle directory"""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".npy"):
+            digest.update(name.encode())
+            digest.update(file_hash(os.path.join(path, name)).encode())
+    return digest.hexdigest()
+
+
+def _get(key, loader):
+    with _lock:
+        if key not in _artifacts:
+            _artifacts[key] = loader()
+        return _artifacts[key]
+
+
+def load_pickle(path):
+    """Unpickles path once per process for each distinct file content"""
+    def loader():
+        with open(path, "rb") as fp:
+            return pickle.load(fp)
+    return _get(("pickle", file_hash(path)), loader)
+
+
+def save_arrays(path, arrays):
+    """Writes a dict of arrays as a bundle directory of .npy files"""
+    os.makedirs(path, exist_ok=True)
+    for name, value in arrays.items():
+        np.save(os.path.join(path, name + ".npy"), np.asarray(value), allow_pickle=False)
+
+
+def load_arrays(path):
+    """Memory-maps a bundle directory written by save_arrays, once per process"""
+    def loader():
+        return {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode="r", allow_pickle=False)
+            for name in sorted(os.listdir(path))
+            if name.endswith(".npy")
+        }
+    return _get(("arrays", bundle_hash(path)), loader)
+
+
+SURROGATE_BACKENDS = ("smt", "numpy", "table")
+
+#What each backend reads from a surrogate directory, (thrust, power): pickles
+#for smt, array bundles for the others
+BACKEND_ARTIFACTS = {
+    "smt": ("thrust_sm.pkl", "power_sm.pkl"),
+    "numpy": ("thrust_sm", "power_sm"),
+    "table": ("thrust_table", "power_table"),
+}
+
+
+def get_surrogates(directory=None, backend="smt"):
+    """Returns the (thrust_sm, power_sm) pair stored in directory,
+    defaulting to PickledSurrogateModels next to the PROPtimize sources.
+
+    backend "smt" unpickles the KPLSK models, "numpy" reads the thrust_sm/
+    and power_sm/ bundles written by Propulsion.KrigingPredictor and "table"
+    the thrust_table/ and power_table/ splines from Propulsion.SurrogateTable."""
+    thrust_path, power_path = _artifact_paths(directory, backend)
+    if backend == "smt":
+        thrust_sm = load_pickle(thrust_path)
+        power_sm = load_pickle(power_path)
+    elif backend == "numpy":
+        from Propulsion.KrigingPredictor import KrigingPredictor
+        thrust_sm = KrigingPredictor.from_bundle(thrust_path)
+        power_sm = KrigingPredictor.from_bundle(power_path)
+    else:
+        from Propulsion.SurrogateTable import SurrogateTable
+        thrust_sm = SurrogateTable.from_bundle(thrust_path)
+        power_sm = SurrogateTable.from_bundle(power_path)
+    return thrust_sm, power_sm
+
+
+def _artifact_paths(directory, backend):
+    if backend not in BACKEND_ARTIFACTS:
+        raise ValueError(f"Unknown surrogate backend {backend!r}, expected one of {SURROGATE_BACKENDS}")
+    directory = SURROGATE_DIR if directory is None else directory
+    return [os.path.join(directory, name) for name in BACKEND_ARTIFACTS[backend]]
+
+
+def surrogates_hash(directory=None, backend="smt"):
+    """Hash of the artifacts get_surrogates(directory, backend) loads, so
+    results computed with them can tell when they were retrained"""
+    digest = hashlib.sha256(backend.encode())
+    for path in _artifact_paths(directory, backend):
+        digest.update((file_hash(path) if backend == "smt" else bundle_hash(path)).encode())
+    return digest.hexdigest()
+
+
+def clear():
+    """Drops every loaded artifact, the next lookup reloads from disk"""
+    with _lock:
+        _artifacts.clear()
+        _file_hashes.clear()
@@ -0,0 +1,193 @@
+"""Tensor-product spline tables distilled from the kriging surrogates.
+
+Kriging prediction cost grows with the training set, while the 4-D domain
+(D_prop, pitch, rpm, velocity) is small and bounded. build_table samples a
+surrogate on a regular grid and stores the samples as the coefficients of a
+tensor-product Catmull-Rom spline, which is C1 and interpolates the grid.
+Evaluation gathers the 4^4 neighbouring coefficients of each point, so it
+costs the same at any training set size, and derivatives are analytic.
+
+Run this module from the PROPtimize directory to build the tables next to
+the surrogates and print their accuracy and evaluation speed:
+
+    python -m Propulsion.SurrogateTable PickledSurrogateModels --points 25
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from Propulsion.SurrogateRegistry import get_surrogates, load_arrays, save_arrays
+
+CHUNK = 8192
+
+
+def _weights(t):
+    """Catmull-Rom weights of the four neighbouring knots and their t derivatives"""
+    t2 = t * t
+    t3 = t2 * t
+    w = np.stack([-t3 + 2 * t2 - t, 3 * t3 - 5 * t2 + 2, -3 * t3 + 4 * t2 + t, t3 - t2], axis=-1) / 2
+    dw = np.stack([-3 * t2 + 4 * t - 1, 9 * t2 - 10 * t, -9 * t2 + 8 * t + 1, 3 * t2 - 2 * t], axis=-1) / 2
+    return w, dw
+
+
+def training_bounds(sm):
+    """Bounding box of the training inputs of an smt model or KrigingPredictor"""
+    if hasattr(sm, "training_points"):
+        xt = sm.training_points[None][0][0]
+    else:
+        xt = sm.X_offset + sm.X_scale * np.asarray(sm.X_train)
+    return xt.min(axis=0), xt.max(axis=0)
+
+
+def build_table(sm, lower, upper, points):
+    """Samples sm on a regular grid of points per axis between lower and upper"""
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    shape = (points,) * len(lower)
+    axes = [np.linspace(lo, hi, points) for lo, hi in zip(lower, upper)]
+
+    values = np.empty(np.prod(shape))
+    for start in range(0, values.size, CHUNK):
+        idx = np.unravel_index(np.arange(start, min(start + CHUNK, values.size)), shape)
+        x = np.column_stack([axis[i] for axis, i in zip(axes, idx)])
+        values[start:start + len(x)] = sm.predict_values(x).ravel()
+
+    #Odd reflection extends every axis by one linearly extrapolated knot,
+    #so edge cells have the four neighbours the spline needs
+    values = np.pad(values.reshape(shape), 1, mode="reflect", reflect_type="odd")
+    return {"lower": lower, "upper": upper, "values": values}
+
+
+class SurrogateTable(object):
+    """Evaluates a table from build_table with the predict_values and
+    predict_derivatives signatures of smt. Outside its bounds the table
+    continues linearly from the nearest point on its boundary, with the
+    gradient of that continuation, much like kriging far from its data.
+
+    All gradient directions come from the same gather, so they are computed
+    together on the first predict_derivatives call for a stack and kept per
+    thread for the remaining directions.
+    """
+
+    def __init__(self, arrays):
+        self.lower = np.asarray(arrays["lower"])
+        self.upper = np.asarray(arrays["upper"])
+        self.values = np.asarray(arrays["values"])
+        self.nx = len(self.lower)
+        self.points = np.array(self.values.shape) - 2
+        self.step = (self.upper - self.lower) / (self.points - 1)
+        #Read-only view whose element at a cell index is its 4^nx neighbourhood
+        self._windows = np.lib.stride_tricks.sliding_window_view(self.values, (4,) * self.nx)
+        self._memo = threading.local()
+
+    @classmethod
+    def from_bundle(cls, path):
+        return cls(load_arrays(path))
+
+    def _locate(self, x):
+        clipped = np.clip(x, self.lower, self.upper)
+        u = (clipped - self.lower) / self.step
+        cell = np.minimum(u.astype(int), self.points - 2)
+        return cell, u - cell, x - clipped
+
+    def _evaluate(self, x, gradients):
+        values = np.empty(len(x))
+        grads = np.empty((len(x), self.nx)) if gradients else None
+        for start in range(0, len(x), CHUNK):
+            cell, t, over = self._locate(x[start:start + CHUNK])
+            w, dw = _weights(t)
+            dw = dw / self.step[:, None]
+            coeffs = self._windows[tuple(cell.T)]
+
+            #Contract one axis at a time, the last axis first, differentiating along axes
+            def derivative(axes, rows=slice(None)):
+                c = coeffs[rows]
+                for k in reversed(range(self.nx)):
+                    c = np.einsum("n...i,ni->n...", c, (dw if k in axes else w)[rows, k])
+                return c
+
+            chunk = slice(start, start + len(t))
+            values[chunk] = derivative(())
+            if gradients:
+                for kx in range(self.nx):
+                    grads[chunk, kx] = derivative((kx,))
+
+            #Outside the bounds: f(x) = f(p) + sum over clipped axes i of df/dx_i(p) * (x_i - p_i),
+            #p the clipped point. Along an unclipped axis j its slope also picks up the
+            #cross derivatives d2f/dx_i dx_j(p) * (x_i - p_i).
+            for i in np.flatnonzero(np.any(over != 0, axis=0)):
+                rows = np.flatnonzero(over[:, i])
+                values[start + rows] += derivative((i,), rows) * over[rows, i]
+                if gradients:
+                    for kx in range(self.nx):
+                        inside = rows[over[rows, kx] == 0]
+                        if kx != i and inside.size:
+                            grads[start + inside, kx] += derivative((i, kx), inside) * over[inside, i]
+        return values, grads
+
+    def predict_values(self, x):
+        return self._evaluate(np.atleast_2d(x), False)[0].reshape(-1, 1)
+
+    def predict_gradients(self, x):
+        """All nx derivative directions at once, shape (n, nx)"""
+        x = np.atleast_2d(x)
+        memo = self._memo
+        if getattr(memo, "x", None) is None or memo.x.shape != x.shape or not np.array_equal(memo.x, x):
+            memo.grads = self._evaluate(x, True)[1]
+            memo.x = np.array(x, copy=True)
+        return memo.grads
+
+    def predict_derivatives(self, x, kx):
+        return self.predict_gradients(x)[:, kx].reshape(-1, 1)
+
+
+def report(sm, table, samples, rng):
+    """Relative errors of table against sm at random points inside the table"""
+    x = table.lower + (table.upper - table.lower) * rng.random((samples, table.nx))
+    ref = sm.predict_values(x).ravel()
+    scale = np.max(np.abs(ref))
+    err = table.predict_values(x).ravel() - ref
+    errors = {"values_max": np.max(np.abs(err)) / scale, "values_rms": np.sqrt(np.mean(err**2)) / scale}
+    grads = table.predict_gradients(x)
+    for kx in range(table.nx):
+        ref = sm.predict_derivatives(x, kx).ravel()
+        errors[f"d{kx}_rms"] = np.sqrt(np.mean((grads[:, kx] - ref)**2)) / max(np.max(np.abs(ref)), 1e-300)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the thrust and power surrogates into spline tables")
+    parser.add_argument("directory", help="directory holding the surrogates, tables are written next to them")
+    parser.add_argument("--source", default="smt", choices=("smt", "numpy"), help="surrogate backend to sample")
+    parser.add_argument("--points", type=int, default=25, help="grid points per axis")
+    parser.add_argument("--samples", type=int, default=5000, help="random points for the accuracy report")
+    parser.add_argument("--timing", type=int, default=10**6, help="points for the evaluation timing")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name, sm in zip(("thrust", "power"), get_surrogates(args.directory, args.source)):
+        path = os.path.join(args.directory, name + "_table")
+        lower, upper = training_bounds(sm)
+        save_arrays(path, build_table(sm, lower, upper, args.points))
+        table = SurrogateTable.from_bundle(path)
+        print(name, " ".join(f"{key}={value:.2e}" for key, value in report(sm, table, args.samples, rng).items()))
+
+        x = lower + (upper - lower) * rng.random((args.timing, len(lower)))
+        start = time.perf_counter()
+        table.predict_values(x)
+        table_time = time.perf_counter() - start
+        #The source is timed on a slice and scaled, kriging on 1e6 points is slow
+        n = min(args.timing, 20000)
+        start = time.perf_counter()
+        for i in range(0, n, CHUNK):
+            sm.predict_values(x[i:min(i + CHUNK, n)])
+        source_time = (time.perf_counter() - start) * args.timing / n
+        print(f"{name} {args.timing} points: table {table_time:.3f} s, {args.source} {source_time:.3f} s, "
+              f"speedup {source_time / table_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
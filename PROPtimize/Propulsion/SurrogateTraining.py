@@ -0,0 +1,262 @@
+"""Offline training of the thrust and power surrogates from prop test data.
+
+The test data is read from CSV files with one row per measured point and the
+columns D_prop [m], pitch [deg], rpm [rev/s], velocity [m/s], ct and cp.
+Each file is typically one wind-tunnel run, and a training set is the union
+of the runs passed in. The thrust and power models are trained in separate
+processes. The artifacts are written to cache_dir/<key>:
+
+- thrust_sm.pkl and power_sm.pkl,
+- the numpy bundles of Propulsion.KrigingPredictor,
+- the spline tables of Propulsion.SurrogateTable,
+- manifest.json with the validation report.
+
+The key is a hash of the data, the hyperparameters, the split, the table
+size, the models warm started from and the smt version, so training again
+on unchanged inputs only reads the manifest back.
+
+Adding runs to an earlier training set with --warm-start retrains a KRG model
+from the earlier models' correlation lengths and noise with a single
+optimizer start, instead of the full two-pass KPLSK search. The earlier
+models are scored on the held-out points they were not trained on, so the
+report shows what the new runs changed. Run this module from the PROPtimize
+directory:
+
+    python -m Propulsion.SurrogateTraining runs/*.csv --cache-dir TrainedSurrogates
+    python -m Propulsion.SurrogateTraining runs/*.csv new_run.csv --warm-start TrainedSurrogates/<key>
+    python -m Propulsion.SurrogateTraining runs/*.csv --install PickledSurrogateModels
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from Propulsion.KrigingPredictor import export_kplsk
+from Propulsion.SurrogateRegistry import file_hash, get_surrogates, load_pickle, save_arrays
+from Propulsion.SurrogateTable import build_table, training_bounds
+
+INPUTS = ("D_prop", "pitch", "rpm", "velocity")
+TARGETS = {"thrust": "ct", "power": "cp"}
+
+#KPLSK settings of the shipped models
+HYPERPARAMETERS = {"n_comp": 4, "eval_noise": True, "poly": "constant", "corr": "squar_exp"}
+
+ARTIFACTS = ("thrust_sm.pkl", "power_sm.pkl", "thrust_sm", "power_sm", "thrust_table", "power_table", "manifest.json")
+
+
+def read_prop_data(paths):
+    """Stacks the rows of the CSV files in paths, dropping exact duplicates.
+    Returns x with the INPUTS columns and {"ct": ..., "cp": ...}."""
+    blocks = []
+    for path in paths:
+        data = np.genfromtxt(path, delimiter=",", names=True, dtype=float, ndmin=1)
+        missing = [name for name in INPUTS + tuple(TARGETS.values()) if name not in data.dtype.names]
+        if missing:
+            raise ValueError(f"{path} is missing the columns {missing}")
+        blocks.append(np.column_stack([data[name] for name in INPUTS + tuple(TARGETS.values())]))
+
+    rows = np.vstack(blocks)
+    rows = rows[np.all(np.isfinite(rows), axis=1)]
+    #np.unique sorts the rows, so the training set does not depend on the file order
+    rows = np.unique(rows, axis=0)
+    return rows[:, :len(INPUTS)], {target: rows[:, len(INPUTS) + i] for i, target in enumerate(TARGETS.values())}
+
+
+def split_validation(n, fraction, seed):
+    """Training and held-out row indices, fraction of n held out"""
+    held = np.random.default_rng(seed).permutation(n)[:int(round(fraction * n))]
+    mask = np.ones(n, dtype=bool)
+    mask[held] = False
+    return np.flatnonzero(mask), np.sort(held)
+
+
+def warm_start_key(directory):
+    """Hash of the models in an earlier training directory, None without one"""
+    if directory is None:
+        return None
+    digest = hashlib.sha256()
+    for name in TARGETS:
+        digest.update(file_hash(os.path.join(directory, name + "_sm.pkl")).encode())
+    return digest.hexdigest()[:16]
+
+
+def training_key(x, y, hyperparameters, validation, seed, table_points=25, warm_start=None):
+    """Hash of everything that determines the trained artifacts, warm_start
+    being the warm_start_key of the models trained from"""
+    import smt
+
+    digest = hashlib.sha256()
+    for array in [x] + [y[target] for target in sorted(y)]:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    digest.update(json.dumps({"hyperparameters": hyperparameters, "validation": validation, "seed": seed,
+                              "table_points": table_points, "warm_start": warm_start,
+                              "smt": smt.__version__}, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def warm_start_parameters(sm):
+    """theta0 and noise0 continuing from a trained kriging model"""
+    params = {"theta0": [float(t) for t in np.ravel(sm.optimal_theta)]}
+    if getattr(sm, "optimal_noise", None) is not None:
+        params["noise0"] = [float(np.ravel(sm.optimal_noise)[0])]
+    return params
+
+
+def _fit(x, y, hyperparameters, warm_start):
+    #Runs in a worker process, returns the trained model and its training time
+    from smt.surrogate_models import KPLSK, KRG
+
+    t0 = time.perf_counter()
+    if warm_start is None:
+        sm = KPLSK(print_global=False, **hyperparameters)
+    else:
+        options = {key: value for key, value in hyperparameters.items() if key != "n_comp"}
+        sm = KRG(print_global=False, n_start=1, **options, **warm_start)
+    sm.set_training_values(x, y)
+    sm.train()
+    return sm, time.perf_counter() - t0
+
+
+def _row_view(x):
+    #One void scalar per row, so rows can be matched with np.isin
+    x = np.ascontiguousarray(x, dtype=float)
+    return x.view(np.dtype((np.void, x.dtype.itemsize * x.shape[1]))).ravel()
+
+
+def scores(sm, x, y):
+    """Relative RMS and max errors of sm at x, scaled by the largest |y|"""
+    if len(x) == 0:
+        return {}
+    err = sm.predict_values(x).ravel() - y
+    scale = max(np.max(np.abs(y)), 1e-300)
+    return {"rms": float(np.sqrt(np.mean(err**2)) / scale), "max": float(np.max(np.abs(err)) / scale)}
+
+
+def train_surrogates(paths, cache_dir="TrainedSurrogates", hyperparameters=None, validation=0.1, seed=0,
+                     warm_start=None, table_points=25, workers=2, force=False):
+    """Trains the thrust and power surrogates on the CSV files in paths and
+    returns (directory, manifest). A directory already holding the artifacts
+    of the same key is reused unless force is set. warm_start is the
+    directory of an earlier training to continue from."""
+    hyperparameters = dict(HYPERPARAMETERS, **(hyperparameters or {}))
+    x, y = read_prop_data(paths)
+    source = warm_start_key(warm_start)
+    key = training_key(x, y, hyperparameters, validation, seed, table_points, source)
+    directory = os.path.join(cache_dir, key)
+    manifest_path = os.path.join(directory, "manifest.json")
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        #Only reused if it was trained with the same table size and from the same models
+        if manifest.get("table_points") == table_points and manifest.get("warm_start_key", False) == source:
+            return directory, dict(manifest, cached=True)
+
+    train, held = split_validation(len(x), validation, seed)
+    previous = {}
+    if warm_start is not None:
+        previous = {name: load_pickle(os.path.join(warm_start, name + "_sm.pkl")) for name in TARGETS}
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(min(workers, len(TARGETS))) as pool:
+        futures = {name: pool.submit(_fit, x[train], y[target][train], hyperparameters,
+                                     warm_start_parameters(previous[name]) if previous else None)
+                   for name, target in TARGETS.items()}
+        fitted = {name: future.result() for name, future in futures.items()}
+    wall = time.perf_counter() - t0
+
+    #Artifacts are assembled next to the cache and moved in at once, so an
+    #interrupted run never leaves a directory that looks complete
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=key + ".", dir=cache_dir)
+    manifest = {
+        "key": key,
+        "files": [os.path.abspath(path) for path in paths],
+        "points": len(x),
+        "validation_points": len(held),
+        "hyperparameters": hyperparameters,
+        "warm_start": None if warm_start is None else os.path.abspath(warm_start),
+        "warm_start_key": source,
+        "table_points": table_points,
+        "wall_time": wall,
+        "models": {},
+    }
+    for name, target in TARGETS.items():
+        sm, train_time = fitted[name]
+        with open(os.path.join(staging, name + "_sm.pkl"), "wb") as fp:
+            pickle.dump(sm, fp)
+        export_kplsk(sm, os.path.join(staging, name + "_sm"))
+        lower, upper = training_bounds(sm)
+        save_arrays(os.path.join(staging, name + "_table"), build_table(sm, lower, upper, table_points))
+        manifest["models"][name] = {"type": type(sm).__name__, "train_time": train_time,
+                                    "theta": [float(t) for t in np.ravel(sm.optimal_theta)]}
+
+    xv = x[held]
+    for backend, (thrust_sm, power_sm) in ((backend, get_surrogates(staging, backend)) for backend in ("smt", "numpy", "table")):
+        for name, sm in zip(TARGETS, (thrust_sm, power_sm)):
+            manifest["models"][name][backend] = scores(sm, xv, y[TARGETS[name]][held])
+    for name, sm in previous.items():
+        #Only held-out points the earlier model was not trained on count
+        unseen = ~np.isin(_row_view(xv), _row_view(sm.training_points[None][0][0]))
+        manifest["models"][name]["previous"] = scores(sm, xv[unseen], y[TARGETS[name]][held][unseen])
+
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+    return directory, dict(manifest, cached=False)
+
+
+def install(directory, target):
+    """Copies the artifacts of a training into a surrogate directory such as
+    PickledSurrogateModels, where get_surrogates picks them up"""
+    os.makedirs(target, exist_ok=True)
+    for name in ARTIFACTS:
+        source = os.path.join(directory, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(target, name), dirs_exist_ok=True)
+        else:
+            shutil.copy2(source, target)
+
+
+def print_report(directory, manifest):
+    state = "reused" if manifest["cached"] else f"trained in {manifest['wall_time']:.1f} s"
+    print(f"{directory}: {manifest['points']} points, {manifest['validation_points']} held out, {state}")
+    for name, model in manifest["models"].items():
+        errors = " ".join(f"{backend} rms={model[backend]['rms']:.2e} max={model[backend]['max']:.2e}"
+                          for backend in ("smt", "numpy", "table", "previous") if model.get(backend))
+        print(f"  {name} {model['type']} ({model['train_time']:.1f} s): {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the thrust and power surrogates from prop test data")
+    parser.add_argument("data", nargs="+", help="CSV files with D_prop, pitch, rpm, velocity, ct and cp columns")
+    parser.add_argument("--cache-dir", default="TrainedSurrogates", help="trainings are kept in cache-dir/<key>")
+    parser.add_argument("--warm-start", default=None, help="directory of an earlier training to continue from")
+    parser.add_argument("--n-comp", type=int, default=HYPERPARAMETERS["n_comp"], help="KPLS components of the first pass")
+    parser.add_argument("--validation", type=float, default=0.1, help="fraction of the points held out for the report")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the held-out split")
+    parser.add_argument("--points", type=int, default=25, help="spline table grid points per axis")
+    parser.add_argument("--force", action="store_true", help="retrain even if the key is cached")
+    parser.add_argument("--install", default=None, help="copy the artifacts into this surrogate directory")
+    args = parser.parse_args()
+
+    directory, manifest = train_surrogates(args.data, args.cache_dir, {"n_comp": args.n_comp}, args.validation,
+                                           args.seed, args.warm_start, args.points, force=args.force)
+    print_report(directory, manifest)
+    if args.install:
+        install(directory, args.install)
+        print(f"installed into {args.install}")
+
+
+if __name__ == "__main__":
+    main()
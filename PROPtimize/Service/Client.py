@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+import urllib.request
+
+import numpy as np
+
+from Driver import DESIGN_VARS
+
+
+def evaluate(url, designs, conditions=None, timeout=60):
+    """Client side of POST /evaluate, designs and conditions as name: values
+    or name: (values, units). Returns (outputs as arrays, latency)."""
+    encode = lambda values: {name: [np.ravel(value[0]).tolist(), value[1]] if isinstance(value, tuple)
+                             else np.ravel(value).tolist() for name, value in (values or {}).items()}
+    data = json.dumps({"designs": encode(designs), "conditions": encode(conditions)}).encode()
+    request = urllib.request.Request(url.rstrip("/") + "/evaluate", data = data, headers = {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout = timeout) as response:
+        body = json.loads(response.read())
+    return {name: np.array(value) for name, value in body["outputs"].items()}, body["latency"]
+
+
+def metrics(url, timeout=10):
+    with urllib.request.urlopen(url.rstrip("/") + "/metrics", timeout = timeout) as response:
+        return json.loads(response.read())
+
+
+def run_client(url, requests=200, concurrency=16, designs=1, flight_conds=1, seed=0):
+    """Sends `requests` random design batches from `concurrency` threads,
+    returns the client-side round trip times and the server metrics"""
+    rng = np.random.default_rng(seed)
+    cases = [{name: (rng.uniform(lower, upper, designs), units) for name, (lower, upper, units) in DESIGN_VARS.items()}
+             for _ in range(requests)]
+    conditions = {"throttle": np.linspace(0.5, 0.9, flight_conds)}
+
+    def timed(case):
+        t0 = time.perf_counter()
+        outputs, _ = evaluate(url, case, conditions)
+        assert outputs["prop_thrust"].shape == (designs, flight_conds)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        round_trips = np.array(list(pool.map(timed, cases)))
+    return round_trips, time.perf_counter() - t0, metrics(url)
@@ -0,0 +1,215 @@
+from concurrent.futures import Future
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from Driver import DEFAULTS, DESIGN_VARS
+from Propulsion.SurrogateRegistry import get_surrogates
+from Service.Metrics import LatencyMetrics
+from Sweep import CONDITIONS, Sweep
+from WorkerPool import WorkerPool
+
+
+def _setup(batch_sizes, preload, defaults, sweep_options, ready):
+    worker = {"batch_sizes": batch_sizes, "defaults": defaults, "sweep_options": sweep_options, "sweeps": {}}
+    try:
+        #Loaded through the registry, so every Sweep the worker sets up later reuses them
+        get_surrogates(sweep_options.get("surrogate_dir"), sweep_options.get("surrogate_backend", "smt"))
+        for flight_conds in preload:
+            for size in batch_sizes:
+                _sweep(worker, flight_conds, size)
+    except Exception as error:
+        #The pool only reports a broken worker, the service raises the cause
+        ready.put(error)
+        raise
+    ready.put(_status(worker))
+    return worker
+
+
+def _sweep(worker, flight_conds, size):
+    sweeps = worker["sweeps"]
+    if (flight_conds, size) not in sweeps:
+        sweeps[flight_conds, size] = Sweep(flight_conds, size, defaults = worker["defaults"], **worker["sweep_options"])
+    return sweeps[flight_conds, size]
+
+
+def _status(worker):
+    return {"pid": os.getpid(), "sweeps": sorted(worker["sweeps"])}
+
+
+def _evaluate(worker, designs, conditions, flight_conds, n):
+    #The smallest set up batch that holds every design, the largest one in chunks otherwise
+    size = next((size for size in worker["batch_sizes"] if size >= n), worker["batch_sizes"][-1])
+    t0 = time.perf_counter()
+    results = _sweep(worker, flight_conds, size).run(designs, conditions)
+    return results, time.perf_counter() - t0, os.getpid()
+
+
+class _Request(object):
+    """A decoded request waiting for its batch"""
+
+    def __init__(self, designs, conditions):
+        unknown = sorted(set(designs) - set(DESIGN_VARS)) + sorted(set(conditions) - set(CONDITIONS))
+        if unknown:
+            raise ValueError(f"unknown inputs {unknown}, designs take {list(DESIGN_VARS)} and conditions {list(CONDITIONS)}")
+        lengths = {len(value) for value, _ in designs.values()}
+        if len(lengths) != 1:
+            raise ValueError("designs need one value per design for at least one design input")
+        self.designs = designs
+        self.conditions = conditions
+        self.size = lengths.pop()
+        self.flight_conds = max([len(value) for value, _ in conditions.values()] + [1])
+        #Requests are merged when they share the flight conditions and the design layout
+        self.key = (
+            self.flight_conds,
+            tuple((name, units, tuple(value)) for name, (value, units) in sorted(conditions.items())),
+            tuple((name, units) for name, (_, units) in sorted(designs.items())),
+        )
+        self.received = time.perf_counter()
+        self.future = Future()
+
+
+class BatchService(object):
+    """Batches concurrent evaluate calls onto a pool of warm Sweep workers.
+
+    Each of the `workers` processes loads the surrogates and sets up a Sweep
+    per batch size in batch_sizes for every flight_conds in preload when it
+    starts, and for any other flight_conds the first time it is asked. A
+    batch is dispatched as soon as a worker is free; it takes the oldest
+    waiting request and every other waiting request it can be merged with,
+    up to the largest batch size, waiting at most max_wait seconds after the
+    oldest request arrived for more to come. sweep_options go to Sweep
+    (current_solver, surrogate_backend, ...).
+
+    The constructor returns once every worker has set up its problems and
+    raises the error of a worker that could not, or TimeoutError after
+    startup_timeout seconds. status holds the (flight_conds, batch size)
+    Sweeps each worker set up at start, by pid. If the pool breaks later,
+    requests fail with BrokenProcessPool instead of waiting for it.
+    """
+
+    def __init__(self, workers=2, batch_sizes=(1, 16, 256), max_wait=0.002, preload=(1,), defaults=None,
+                 startup_timeout=600, request_timeout=300, **sweep_options):
+        self.workers = workers
+        self.batch_sizes = tuple(sorted(batch_sizes))
+        self.max_wait = max_wait
+        self.request_timeout = request_timeout
+        self.metrics = LatencyMetrics()
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(workers)
+        defaults = dict(DEFAULTS if defaults is None else defaults)
+        ready = multiprocessing.Queue()
+        self._pool = WorkerPool(workers, _setup, self.batch_sizes, tuple(preload), defaults, sweep_options, ready)
+        #Workers start with the pool's first tasks and report what they set up through ready,
+        #since the tasks themselves may all land on the first worker started
+        started = [self._pool.submit_task(_status) for _ in range(workers)]
+        self.status = {}
+        deadline = time.perf_counter() + startup_timeout
+        while len(self.status) < workers:
+            try:
+                status = ready.get(timeout = 0.5)
+            except queue.Empty:
+                broken = next((future.exception() for future in started if future.done() and future.exception()), None)
+                if broken is None and time.perf_counter() < deadline:
+                    continue
+                status = broken or TimeoutError(f"{workers - len(self.status)} workers not set up after {startup_timeout} s")
+            if isinstance(status, Exception):
+                self._pool.shutdown(cancel_futures = True)
+                raise status
+            self.status[status["pid"]] = status["sweeps"]
+        self.pids = set(self.status)
+        self._dispatcher = threading.Thread(target = self._dispatch, daemon = True)
+        self._dispatcher.start()
+
+    def submit(self, designs, conditions=None):
+        """Queues an evaluation of decoded designs and conditions, returns a
+        Future of (outputs, latency)"""
+        request = _Request(designs, conditions or {})
+        self._queue.put(request)
+        return request.future
+
+    def evaluate(self, designs, conditions=None):
+        """Blocking submit, designs and conditions as name: (values, units)"""
+        return self.submit(designs, conditions).result(self.request_timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._dispatcher.join()
+        self._pool.shutdown()
+
+    def _dispatch(self):
+        backlog = []
+        closing = False
+        while True:
+            self._slots.acquire()
+            if not backlog and not closing:
+                request = self._queue.get()
+                closing = request is None
+                backlog += [] if closing else [request]
+            if not backlog:
+                return
+
+            key = backlog[0].key
+            deadline = backlog[0].received + self.max_wait
+            while not closing and sum(r.size for r in backlog if r.key == key) < self.batch_sizes[-1]:
+                try:
+                    timeout = deadline - time.perf_counter()
+                    request = self._queue.get(timeout = timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                closing = request is None
+                backlog += [] if closing else [request]
+
+            batch, size = [], 0
+            for request in list(backlog):
+                if request.key == key and (not batch or size + request.size <= self.batch_sizes[-1]):
+                    batch.append(request)
+                    size += request.size
+                    backlog.remove(request)
+            try:
+                self._run(batch, size)
+            except Exception as error:
+                #A broken pool refuses new work, the batch fails instead of the dispatcher
+                self._slots.release()
+                self._fail(batch, error)
+
+    def _run(self, batch, size):
+        designs = {name: (np.concatenate([r.designs[name][0] for r in batch]), units)
+                   for name, (_, units) in batch[0].designs.items()}
+        dispatched = time.perf_counter()
+        future = self._pool.submit_task(_evaluate, designs, batch[0].conditions, batch[0].flight_conds, size)
+        future.add_done_callback(lambda future: self._finish(batch, size, dispatched, future))
+
+    def _fail(self, batch, error):
+        for request in batch:
+            self.metrics.add_error()
+            request.future.set_exception(error)
+
+    def _finish(self, batch, size, dispatched, future):
+        self._slots.release()
+        try:
+            results, elapsed, pid = future.result()
+        except Exception as error:
+            self._fail(batch, error)
+            return
+
+        done = time.perf_counter()
+        latencies, start = [], 0
+        for request in batch:
+            latency = {
+                "queue": dispatched - request.received,
+                "evaluate": elapsed,
+                "total": done - request.received,
+                "batch_designs": size,
+                "batch_requests": len(batch),
+                "worker": pid,
+            }
+            outputs = {name: value[start:start + request.size] for name, value in results.items()}
+            start += request.size
+            latencies.append(latency)
+            request.future.set_result((outputs, latency))
+        self.metrics.add_batch(latencies)
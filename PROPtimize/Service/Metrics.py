@@ -0,0 +1,48 @@
+from collections import deque
+import threading
+
+import numpy as np
+
+
+class LatencyMetrics(object):
+    """Per-request latencies of the last `window` requests and batch counts"""
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._requests = deque(maxlen = window)
+        self.batches = 0
+        self.batch_designs = 0
+        self.batch_requests = 0
+        self.errors = 0
+
+    def add_batch(self, latencies):
+        with self._lock:
+            self.batches += 1
+            self.batch_designs += latencies[0]["batch_designs"]
+            self.batch_requests += len(latencies)
+            self._requests.extend(latencies)
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self):
+        with self._lock:
+            requests = list(self._requests)
+            summary = {
+                "batches": self.batches,
+                "requests": self.batch_requests,
+                "errors": self.errors,
+                "designs_per_batch": self.batch_designs / max(self.batches, 1),
+                "requests_per_batch": self.batch_requests / max(self.batches, 1),
+            }
+        for name in ("queue", "evaluate", "total"):
+            values = np.array([r[name] for r in requests])
+            summary[name] = {} if not len(values) else {
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+            }
+        return summary
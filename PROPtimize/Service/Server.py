@@ -0,0 +1,87 @@
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+
+import numpy as np
+
+from Service.Dispatcher import BatchService
+
+
+def _decode(values):
+    #JSON has no tuples, [values, "units"] pairs become (array, units)
+    decoded = {}
+    for name, value in (values or {}).items():
+        if isinstance(value, list) and len(value) == 2 and (isinstance(value[1], str) or value[1] is None):
+            value, units = value
+        else:
+            units = None
+        decoded[name] = (np.atleast_1d(np.asarray(value, dtype = float)), units)
+    return decoded
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    #The default backlog of 5 resets connections as soon as a few dozen clients connect at once
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/metrics":
+            self._reply(200, service.metrics.summary())
+        elif self.path == "/health":
+            self._reply(200, {"workers": sorted(service.pids), "batch_sizes": service.batch_sizes,
+                              "preloaded": {str(pid): sweeps for pid, sweeps in service.status.items()}})
+        else:
+            self._reply(404, {"error": f"no route {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/evaluate":
+            self._reply(404, {"error": f"no route {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            future = self.server.service.submit(_decode(body.get("designs")), _decode(body.get("conditions")))
+        except (ValueError, TypeError, AttributeError) as error:
+            self._reply(400, {"error": str(error)})
+            return
+        try:
+            outputs, latency = future.result(self.server.service.request_timeout)
+        except (BrokenProcessPool, FutureTimeout) as error:
+            self._reply(503, {"error": f"{type(error).__name__}: {error}"})
+            return
+        except Exception as error:
+            self._reply(500, {"error": f"{type(error).__name__}: {error}"})
+            return
+        self._reply(200, {"outputs": {name: value.tolist() for name, value in outputs.items()}, "latency": latency})
+
+    def log_message(self, format, *args):
+        #Per-request logging would cost more than a small evaluation, GET /metrics instead
+        pass
+
+
+def serve(host="127.0.0.1", port=8765, **service_options):
+    """Runs the HTTP server until interrupted, service_options go to BatchService"""
+    service = BatchService(**service_options)
+    server = _Server((host, port), _Handler)
+    server.service = service
+    print(f"serving on http://{host}:{port} with workers {sorted(service.pids)}", flush = True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
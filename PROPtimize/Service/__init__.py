@@ -0,0 +1,33 @@
+"""Local batch evaluation service for PropModel.
+
+A long-running HTTP/JSON server that answers thrust and power queries for
+candidate designs. Tools query it instead of each one paying the openmdao
+and smt imports, the surrogate load and the problem setup.
+
+A pool of worker processes keeps Sweep problems (see Sweep.py) set up for
+a few batch sizes. Concurrent requests with the same flight conditions are
+merged into one vectorized run_model: while every worker is busy, requests
+queue up and the next batch takes all of them. Each response carries its
+latency split into queue wait and evaluation, and GET /metrics sums them up:
+
+    POST /evaluate  {"designs": {"D_prop": [[14, 16, 18], "inch"]},
+                     "conditions": {"throttle": [0.5, 0.9]}}
+    ->  {"outputs": {"prop_thrust": [[...], [...], [...]], ...},
+         "latency": {"queue": ..., "evaluate": ..., "total": ..., "batch_designs": ..., ...}}
+    GET /metrics, GET /health
+
+Designs hold one value per design for any of Driver.DESIGN_VARS, conditions
+one value per flight condition for throttle and velocity. Values are lists
+or [values, "units"] pairs. Outputs have a row per design, as for
+Sweep.run. Run from the PROPtimize directory:
+
+    python -m Service serve --port 8765 --workers 4
+    python -m Service client --requests 500 --concurrency 32
+
+Dispatcher holds BatchService and its workers, Metrics the latency
+statistics, Server the HTTP side and Client the functions that query it.
+"""
+from Service.Client import evaluate, metrics, run_client
+from Service.Dispatcher import BatchService
+from Service.Metrics import LatencyMetrics
+from Service.Server import serve
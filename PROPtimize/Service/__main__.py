@@ -0,0 +1,46 @@
+import argparse
+
+import numpy as np
+
+import Service
+from Service.Client import run_client
+from Service.Server import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description = Service.__doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest = "command", required = True)
+    server = commands.add_parser("serve", help = "run the service")
+    server.add_argument("--host", default = "127.0.0.1")
+    server.add_argument("--port", type = int, default = 8765)
+    server.add_argument("--workers", type = int, default = 2, help = "worker processes")
+    server.add_argument("--batch-sizes", type = int, nargs = "+", default = [1, 16, 256], help = "Sweep batch sizes set up per worker")
+    server.add_argument("--max-wait", type = float, default = 0.002, help = "seconds a batch waits for more requests")
+    server.add_argument("--preload", type = int, nargs = "*", default = [1], help = "flight_conds set up at start")
+    server.add_argument("--backend", default = "numpy", help = "surrogate backend")
+    client = commands.add_parser("client", help = "load the service with random designs")
+    client.add_argument("--url", default = "http://127.0.0.1:8765")
+    client.add_argument("--requests", type = int, default = 200)
+    client.add_argument("--concurrency", type = int, default = 16)
+    client.add_argument("--designs", type = int, default = 1, help = "designs per request")
+    client.add_argument("--flight-conds", type = int, default = 1)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, workers = args.workers, batch_sizes = args.batch_sizes, max_wait = args.max_wait,
+              preload = args.preload, surrogate_backend = args.backend)
+        return
+
+    round_trips, wall, summary = run_client(args.url, args.requests, args.concurrency, args.designs, args.flight_conds)
+    print(f"{args.requests} requests in {wall:.2f} s ({args.requests / wall:.0f} per second), round trip "
+          f"p50 {np.percentile(round_trips, 50) * 1e3:.1f} ms, p95 {np.percentile(round_trips, 95) * 1e3:.1f} ms, "
+          f"max {round_trips.max() * 1e3:.1f} ms")
+    print(f"server: {summary['batches']} batches, {summary['requests_per_batch']:.1f} requests and "
+          f"{summary['designs_per_batch']:.1f} designs per batch, {summary['errors']} errors")
+    for name in ("queue", "evaluate", "total"):
+        if summary[name]:
+            print(f"  {name:>8}: " + ", ".join(f"{stat} {value * 1e3:.2f} ms" for stat, value in summary[name].items()))
+
+
+if __name__ == "__main__":
+    main()
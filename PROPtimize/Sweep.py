@@ -0,0 +1,147 @@
+"""Vectorized design sweeps of PropModel.
+
+A batch of B designs is laid out on the mission axis: the model is set up
+with flight_missions = props = motors = B, so D_prop, pitch, motor_mass and
+motor_idle_current are per-design arrays and mission y of every cell holds
+design y. All designs share the same flight conditions, and one run_model
+evaluates the whole batch. current_solver="block" solves the cells
+independently instead of in one Newton system over the batch:
+
+    results = run_sweep({"D_prop": (np.linspace(12, 23, 5000), "inch")},
+                        {"throttle": np.linspace(0.5, 0.9, 4)})
+    results["prop_thrust"]  # (5000, 4), one row per design
+
+Run from the PROPtimize directory for a timing:
+
+    python Sweep.py --designs 20000 --batch-size 2048
+"""
+import argparse
+import time
+
+import numpy as np
+
+from Driver import DEFAULTS, DESIGN_VARS, build_problem, input_values, set_values
+
+#Outputs returned per design, name: units
+OUTPUTS = {
+    "prop_thrust": "N",
+    "prop_power": "W",
+    "battery_power": "W",
+    "res_current": "A",
+    "rpm": "rpm",
+    "RPM_con": None,
+    "esc_efficiency": None,
+    "motor_kv": "rpm/V",
+    "motor_resistance": "ohm",
+}
+
+#Inputs that vary per flight condition and are shared by the designs of a batch
+CONDITIONS = ("throttle", "velocity")
+
+
+class Sweep(object):
+    """One set up PropModel evaluating batches of batch_size designs.
+
+    Designs are dicts of name: values or name: (values, units) with one
+    value per design, or one for all of them, for any of Driver.DESIGN_VARS,
+    on top of defaults (Driver.DEFAULTS unless given). Conditions hold one
+    value per flight condition for throttle and velocity, and apply to the
+    run they are given to only.
+    """
+
+    def __init__(self, flight_conds=1, batch_size=1024, current_solver="newton",
+                 defaults=None, outputs=OUTPUTS, **model_options):
+        self.flight_conds = flight_conds
+        self.batch_size = batch_size
+        self.defaults = dict(DEFAULTS if defaults is None else defaults)
+        self.outputs = dict(outputs)
+        self.prob = build_problem(flight_conds, batch_size, batch_size, current_solver,
+                                  driver=False, motors=batch_size, **model_options)
+        self.prob.setup(check=False)
+        self._set(self.defaults)
+        self.prob.final_setup()
+        self.prob.set_solver_print(level=-1)
+        #Every independent input as set up, restored before each batch so none carries over
+        self._inputs = input_values(self.prob)
+
+    def _set(self, values):
+        #Per-condition values become (fc, 1) columns shared by every design
+        shaped = {}
+        for name, value in values.items():
+            value, units = value if isinstance(value, tuple) else (value, None)
+            if name in CONDITIONS:
+                value = np.broadcast_to(np.reshape(value, (-1, 1)), (self.flight_conds, self.batch_size))
+            shaped[name] = (value, units)
+        set_values(self.prob, shaped)
+
+    def run(self, designs, conditions=None):
+        """Evaluates every design, returns name: array with a row per design,
+        (N, flight_conds) for per-cell outputs and (N,) for per-design ones"""
+        designs = {name: value if isinstance(value, tuple) else (value, None) for name, value in designs.items()}
+        #Scalars apply to every design, as in run_sweep
+        n = max([len(np.atleast_1d(value)) for value, _ in designs.values()] + [1])
+        columns = {name: [] for name in self.outputs}
+
+        for start in range(0, n, self.batch_size):
+            stop = min(start + self.batch_size, n)
+            #The last batch is padded with its final design and trimmed below
+            index = np.minimum(np.arange(start, start + self.batch_size), stop - 1)
+            batch = {name: (np.broadcast_to(value, n)[index], units) for name, (value, units) in designs.items()}
+
+            set_values(self.prob, self._inputs)
+            self._set(conditions or {})
+            self._set(batch)
+            self.prob.run_model()
+
+            for name, units in self.outputs.items():
+                value = self.prob.get_val(name, units = units)
+                value = value.T if value.ndim == 2 else value
+                columns[name].append(value[:stop - start].copy())
+
+        return {name: np.concatenate(parts) for name, parts in columns.items()}
+
+
+def run_sweep(designs, conditions=None, flight_conds=None, batch_size=1024, **sweep_options):
+    """Evaluates the designs in batches of batch_size with one Sweep, see Sweep.run"""
+    if flight_conds is None:
+        flight_conds = max([len(np.atleast_1d(v[0] if isinstance(v, tuple) else v)) for v in (conditions or {}).values()] + [1])
+    n = max(len(np.atleast_1d(v[0] if isinstance(v, tuple) else v)) for v in designs.values())
+    sweep = Sweep(flight_conds, min(batch_size, n), **sweep_options)
+    return sweep.run(designs, conditions)
+
+
+def grid(**axes):
+    """Full factorial grid of name=(values, units) axes as flat design arrays"""
+    mesh = np.meshgrid(*(np.asarray(values) for values, _ in axes.values()), indexing = "ij")
+    return {name: (values.ravel(), units) for (name, (_, units)), values in zip(axes.items(), mesh)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--designs", type = int, default = 10000)
+    parser.add_argument("--batch-size", type = int, default = 1024)
+    parser.add_argument("--flight-conds", type = int, default = 1)
+    parser.add_argument("--backend", default = "smt", help = "surrogate backend")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    designs = {name: (rng.uniform(lower, upper, args.designs), units) for name, (lower, upper, units) in DESIGN_VARS.items()}
+    conditions = {"throttle": np.linspace(0.5, 0.9, args.flight_conds)}
+
+    t0 = time.perf_counter()
+    sweep = Sweep(args.flight_conds, min(args.batch_size, args.designs), surrogate_backend = args.backend)
+    t1 = time.perf_counter()
+    results = sweep.run(designs, conditions)
+    t2 = time.perf_counter()
+
+    print(f"setup {t1 - t0:.2f} s, {args.designs} designs in {t2 - t1:.2f} s "
+          f"({args.designs / (t2 - t1) * 60:.0f} designs per minute)")
+    best = np.argmax(np.where(np.all(results["RPM_con"] <= 0, axis = 1), results["prop_thrust"].sum(axis = 1), -np.inf))
+    print("best feasible design: " + ", ".join(f"{name}={designs[name][0][best]:.4g} {units}"
+                                               for name, (_, _, units) in DESIGN_VARS.items()))
+    print(f"thrust {results['prop_thrust'][best]} N")
+
+
+if __name__ == "__main__":
+    main()
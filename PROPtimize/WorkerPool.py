@@ -0,0 +1,77 @@
+"""Process pools whose workers set up their problems once.
+
+MultiStart, Fleet, Pareto and Service hand optimizations or evaluations to a
+process pool, and setting up a Problem (and loading its surrogates) costs far
+more than a single run. A WorkerPool runs setup(*args) once in every worker,
+keeps what it returns as that worker's state and calls task(state, ...) for
+every task the worker picks up:
+
+    def setup(problem_args, defaults):
+        return {"prob": prepare(build_problem(recorder=None, **problem_args), defaults)}
+
+    def optimize(state, start):
+        set_values(state["prob"], start)
+        return {"design": design(state["prob"]), **run_driver(state["prob"])}
+
+    with WorkerPool(workers, setup, problem_args, DEFAULTS) as pool:
+        results = list(pool.map_task(optimize, starts))
+
+setup, task and their arguments are pickled, so they must be module-level.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import os
+import time
+
+from Driver import DESIGN_VARS, set_values
+
+#What setup returned in this worker process
+_state = None
+
+
+def _init(setup, args):
+    global _state
+    _state = setup(*args)
+
+
+def _run(task, *args):
+    return task(_state, *args)
+
+
+class WorkerPool(ProcessPoolExecutor):
+    """ProcessPoolExecutor with setup(*setup_args) run once in each worker.
+    submit_task and map_task call task(state, ...) with that worker's state,
+    submit and map still run plain functions."""
+
+    def __init__(self, workers, setup, *setup_args):
+        super().__init__(workers, initializer = _init, initargs = (setup, setup_args))
+
+    def submit_task(self, task, *args):
+        return self.submit(_run, task, *args)
+
+    def map_task(self, task, *iterables):
+        return self.map(functools.partial(_run, task), *iterables)
+
+
+def prepare(prob, defaults):
+    """Sets up prob without the setup checks, sets the defaults and silences
+    the solvers, returns prob"""
+    prob.setup(check = False)
+    set_values(prob, defaults)
+    prob.final_setup()
+    prob.set_solver_print(level = -1)
+    return prob
+
+
+def design(prob, design_vars=DESIGN_VARS):
+    """Copies of the design variables at the current point, name: (value, units)"""
+    return {name: (prob.get_val(name, units = units).copy(), units) for name, (_, _, units) in design_vars.items()}
+
+
+def run_driver(prob):
+    """Runs the driver, returns its success flag, the wall time and the pid of
+    the process it ran in"""
+    t0 = time.perf_counter()
+    result = prob.run_driver()
+    elapsed = time.perf_counter() - t0
+    return {"success": bool(getattr(result, "success", not result)), "time": elapsed, "pid": os.getpid()}
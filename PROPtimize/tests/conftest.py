@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+#The modules import each other from the PROPtimize directory, as when the scripts run there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENMDAO_REPORTS", "0")
+
+from Benchmarks.ModelBenchmark import make_fixture
+
+
+@pytest.fixture(scope = "session")
+def surrogate_dir(tmp_path_factory):
+    """Small KPLSK surrogates of a synthetic propeller map, for every backend"""
+    return make_fixture(str(tmp_path_factory.mktemp("surrogates")))
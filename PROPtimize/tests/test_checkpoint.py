@@ -0,0 +1,51 @@
+"""Checkpoints written during run_driver and resumed into a new problem"""
+import numpy as np
+import pytest
+
+from Checkpoint import CheckpointRecorder, load_checkpoint, resume
+from Driver import DEFAULTS, build_problem, set_values
+
+
+def problem(surrogate_dir, checkpoint, backend):
+    prob = build_problem(optimizer = "SLSQP", recorder = None, checkpoint = checkpoint, checkpoint_every = 1,
+                         surrogate_dir = surrogate_dir, surrogate_backend = backend)
+    prob.setup(check = False)
+    set_values(prob, DEFAULTS)
+    prob.set_solver_print(level = -1)
+    return prob
+
+
+def cache_size(prob):
+    return prob.model.PropulsionGroup.PropCoefficients.cache_stats()["size"]
+
+
+@pytest.fixture(scope = "module")
+def checkpoint(surrogate_dir, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("checkpoint") / "RUN.ckpt")
+    prob = problem(surrogate_dir, path, "numpy")
+    prob.driver.options["maxiter"] = 2
+    prob.driver.options["disp"] = False
+    prob.run_driver()
+    prob.cleanup()
+    return path
+
+
+def test_resume_round_trip(surrogate_dir, checkpoint):
+    saved = load_checkpoint(checkpoint)
+    prob = problem(surrogate_dir, checkpoint, "numpy")
+    resume(prob, checkpoint)
+
+    for name, value in saved["desvars"].items():
+        np.testing.assert_array_equal(prob.get_val(name), value)
+    np.testing.assert_array_equal(prob.get_val("res_current"), saved["states"]["res_current"])
+    assert cache_size(prob) == len(saved["systems"]["PropulsionGroup.PropCoefficients"]["cache"]) > 0
+    recorder, = [r for r in prob.driver._rec_mgr._recorders if isinstance(r, CheckpointRecorder)]
+    assert recorder.start == saved["counter"]
+
+
+def test_resume_drops_cache_of_other_surrogates(surrogate_dir, checkpoint):
+    #Same cache keys, but the table backend computes other values for them
+    prob = problem(surrogate_dir, checkpoint, "table")
+    with pytest.warns(UserWarning, match = "other surrogates"):
+        resume(prob, checkpoint)
+    assert cache_size(prob) == 0
@@ -0,0 +1,22 @@
+"""Pooled problems give the same results whatever they evaluated before"""
+import numpy as np
+
+from Driver import DEFAULTS
+from Evaluator import Evaluator
+from Fleet import _optimize, _setup
+
+
+def test_conditions_do_not_leak(surrogate_dir):
+    evaluator = Evaluator(surrogate_dir = surrogate_dir, surrogate_backend = "numpy")
+    plain = evaluator.evaluate()["prop_thrust"]
+    thin = evaluator.evaluate(conditions = {"rho": 0.9})["prop_thrust"]
+    assert not np.allclose(thin, plain)
+    np.testing.assert_allclose(evaluator.evaluate()["prop_thrust"], plain, rtol = 1e-10)
+
+
+def test_fleet_variants_are_independent(surrogate_dir):
+    #One worker runs every variant on the same problem, as a pool worker would
+    worker = _setup({"optimizer": "SLSQP", "surrogate_dir": surrogate_dir}, DEFAULTS)
+    variants = [{"name": "a"}, {"name": "thin", "values": {"rho": 0.9}}, {"name": "a"}]
+    thrust = [_optimize(worker, dict(variant, flight_conds = 1))["outputs"]["prop_thrust"] for variant in variants]
+    np.testing.assert_allclose(thrust[2], thrust[0], rtol = 1e-8)
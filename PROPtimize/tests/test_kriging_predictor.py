@@ -0,0 +1,28 @@
+"""The NumPy KPLSK predictor against the smt model it was exported from"""
+import numpy as np
+import pytest
+
+from Propulsion.KrigingPredictor import KrigingPredictor, export_kplsk
+
+
+@pytest.mark.parametrize("poly", ("constant", "linear"))
+def test_predictor_matches_smt(tmp_path, poly):
+    from smt.surrogate_models import KPLSK
+
+    rng = np.random.default_rng(0)
+    xt = rng.uniform(-1, 1, (60, 4))
+    yt = np.sin(2 * xt[:, 0]) + xt[:, 1] * xt[:, 2] - 0.5 * xt[:, 3]**2
+    sm = KPLSK(n_comp = 2, poly = poly, eval_noise = True, print_global = False)
+    sm.set_training_values(xt, yt)
+    sm.train()
+
+    export_kplsk(sm, str(tmp_path / "sm"))
+    predictor = KrigingPredictor.from_bundle(str(tmp_path / "sm"))
+
+    #Training points, points between them and a margin outside the box
+    x = np.vstack([xt, rng.uniform(-1.2, 1.2, (200, 4))])
+    ref = sm.predict_values(x)
+    np.testing.assert_allclose(predictor.predict_values(x), ref, rtol = 1e-9, atol = 1e-9 * np.max(np.abs(ref)))
+    for kx in range(4):
+        ref = sm.predict_derivatives(x, kx)
+        np.testing.assert_allclose(predictor.predict_derivatives(x, kx), ref, rtol = 1e-9, atol = 1e-9 * np.max(np.abs(ref)))
@@ -0,0 +1,34 @@
+"""The NumPy propulsion chain of MonteCarlo against PropModel"""
+import numpy as np
+
+from Evaluator import Evaluator
+from MonteCarlo import UNITS, gaussian, nominal_inputs, run_monte_carlo
+from Propulsion.PropulsionChain import INPUTS
+
+#Relative spreads of the points, wide enough to move every input and coefficient
+SPREADS = dict(battery_resistance = 0.2, throttle = 0.1, motor_mass = 0.2, D_prop = 0.1, pitch = 0.2, velocity = 0.2,
+               a = 0.02, b = 0.05, c = 0.05, kv_gain = 0.05, resistance_gain = 0.05)
+
+
+def test_chain_matches_model(surrogate_dir):
+    #Each point runs once through the chain and once through a Newton-solved
+    #PropModel built with the same coefficients, so the model side goes
+    #through the components and PowerResiduals rather than the chain
+    sampler = gaussian(**SPREADS)
+    nominal = nominal_inputs()
+    rng = np.random.default_rng(0)
+
+    for _ in range(5):
+        point = {name: float(value[0]) for name, value in sampler(rng, 1, nominal).items()}
+        chain = run_monte_carlo(lambda rng, size, nominal: {name: np.full(size, value) for name, value in point.items()}, 1,
+                                surrogate_dir = surrogate_dir)
+
+        x = dict(nominal, **point)
+        evaluator = Evaluator(current_solver = "newton", surrogate_dir = surrogate_dir, surrogate_backend = "numpy",
+                              a = x["a"], b = x["b"], c = x["c"], kv_coeffs = (x["kv_gain"], x["kv_offset"]),
+                              resistance_coeffs = (x["resistance_gain"], x["resistance_exponent"]))
+        model = evaluator.evaluate({name: (x[name], UNITS[name]) for name in INPUTS})
+
+        assert chain["converged"][0]
+        for name in ("res_current", "prop_thrust"):
+            np.testing.assert_allclose(chain[name][0], model[name].item(), rtol = 1e-6, err_msg = name)
@@ -0,0 +1,111 @@
+"""Hand-derived partials of the propulsion components against complex step,
+and of every component of PropModel against finite differences"""
+import numpy as np
+import openmdao.api as om
+import pytest
+from openmdao.utils.assert_utils import assert_check_partials
+
+from Driver import DEFAULTS, build_problem, set_values
+from Propulsion.Battery import Battery
+
+#PropulsionGroup subsystems with closed-form compute_partials
+COMPONENTS = ("battery", "esc", "motor", "Propeller", "RPMConstraints", "power_net")
+
+
+def solved_model(surrogate_dir, current_solver, mission=False):
+    """PropModel with 3 conditions and 2 missions, each with its own prop, solved at Driver.DEFAULTS"""
+    prob = build_problem(3, 2, 2, current_solver, driver = False, mission = mission, surrogate_dir = surrogate_dir)
+    prob.setup(check = False, force_alloc_complex = True)
+    set_values(prob, DEFAULTS)
+    prob.set_val("throttle", np.linspace(0.5, 0.9, 6).reshape(3, 2))
+    prob.set_val("D_prop", [14, 18], units = "inch")
+    prob.set_val("rho", 1.225)
+    if mission:
+        prob.set_val("segment_duration", 300, units = "s")
+    prob.set_solver_print(level = -1)
+    prob.run_model()
+    return prob
+
+
+@pytest.fixture(scope = "module")
+def newton_model(surrogate_dir):
+    return solved_model(surrogate_dir, "newton")
+
+
+@pytest.mark.parametrize("name", COMPONENTS)
+def test_component_partials(newton_model, name):
+    data = newton_model.check_partials(includes = [f"PropulsionGroup.{name}"], method = "cs",
+                                       compact_print = True, out_stream = None)
+    assert list(data) == [f"PropulsionGroup.{name}"]
+    assert_check_partials(data, atol = 1e-10, rtol = 1e-10)
+
+
+@pytest.mark.parametrize("current_solver", ("newton", "block"))
+def test_model_partials(surrogate_dir, current_solver):
+    prob = solved_model(surrogate_dir, current_solver)
+    #The kriging surrogates carry roundoff near 1e-10 in their values, too much for the default
+    #absolute step of 1e-6, so each input is stepped by a fraction of its own value
+    data = prob.check_partials(method = "fd", form = "central", step = 1e-3, step_calc = "rel_element",
+                               compact_print = True, out_stream = None)
+    assert_check_partials(data, atol = 1e-5, rtol = 1e-5)
+
+
+def test_mission_partials(surrogate_dir):
+    """In mission mode the battery voltage sags with the charge used, coupling the segments"""
+    prob = solved_model(surrogate_dir, "newton", mission = True)
+    data = prob.check_partials(includes = ["PropulsionGroup.battery", "PropulsionGroup.charge", "PropulsionGroup.mission"],
+                               method = "cs", compact_print = True, out_stream = None)
+    assert len(data) == 3
+    assert_check_partials(data, atol = 1e-10, rtol = 1e-10)
+    #The chain runs on the supply voltage less its droop, which stops at an empty battery
+    droop = prob.model.PropulsionGroup.battery.options["voltage_droop"]
+    depth = np.minimum(prob.get_val("charge_used") / prob.get_val("nominal_capacity"), 1)
+    open_circuit = prob.get_val("battery_voltage_supply") * (1 - droop * depth)
+    np.testing.assert_allclose(prob.get_val("battery_voltage_out"),
+                               open_circuit - prob.get_val("battery_current") * prob.get_val("battery_resistance"))
+
+
+def test_mission_beyond_capacity(surrogate_dir):
+    """A mission drawing more than the battery holds still solves, on an empty battery's voltage"""
+    prob = build_problem(3, 2, 2, "newton", driver = False, mission = True, surrogate_dir = surrogate_dir)
+    prob.setup(check = False, force_alloc_complex = True)
+    set_values(prob, DEFAULTS)
+    prob.set_val("rho", 1.225)
+    prob.set_val("segment_duration", 0.5, units = "h")
+    prob.set_solver_print(level = -1)
+    prob.run_model()
+
+    capacity = prob.get_val("nominal_capacity")
+    charge = prob.get_val("charge_used")
+    assert np.all(charge[-1] > capacity)
+    assert np.all(prob.get_val("state_of_charge") >= 0) and np.all(prob.get_val("state_of_charge")[-1] == 0)
+    np.testing.assert_allclose(prob.get_val("remaining_capacity"), capacity - charge[-1])
+    assert np.all(prob.get_val("mission_endurance") > 0)
+    assert prob.model.nonlinear_solver._iter_count < prob.model.nonlinear_solver.options["maxiter"]
+    #The sag stops at the empty battery's voltage
+    droop = prob.model.PropulsionGroup.battery.options["voltage_droop"]
+    empty = charge >= capacity
+    open_circuit = prob.get_val("battery_voltage_out") + prob.get_val("battery_current") * prob.get_val("battery_resistance")
+    np.testing.assert_allclose(open_circuit[empty], np.broadcast_to(prob.get_val("battery_voltage_supply") * (1 - droop), charge.shape)[empty])
+
+    data = prob.check_partials(includes = ["PropulsionGroup.battery", "PropulsionGroup.mission"],
+                               method = "cs", compact_print = True, out_stream = None)
+    assert_check_partials(data, atol = 1e-10, rtol = 1e-10)
+
+
+def test_battery_endurance_floor():
+    """A cell drawing no current lasts capacity / min_current, with no current partial"""
+    prob = om.Problem(reports = False)
+    prob.model.add_subsystem("battery", Battery(flight_conds = 3, flight_missions = 1), promotes = ["*"])
+    prob.setup(force_alloc_complex = True)
+    prob.set_val("battery_voltage_supply", 22.2)
+    prob.set_val("battery_resistance", 0.012)
+    prob.set_val("battery_mass", 0.5)
+    prob.set_val("battery_current", [[0.0], [5e-4], [20.0]])
+    prob.run_model()
+
+    capacity = prob.get_val("nominal_capacity")
+    min_current = prob.model.battery.options["min_current"]
+    np.testing.assert_allclose(prob.get_val("endurance").ravel(), capacity / [min_current, min_current, 20.0])
+    data = prob.check_partials(method = "cs", compact_print = True, out_stream = None)
+    assert_check_partials(data, atol = 1e-10, rtol = 1e-10)
@@ -0,0 +1,59 @@
+"""Values and gradients of the spline tables, inside and outside their bounds"""
+import numpy as np
+import pytest
+
+from Propulsion.SurrogateTable import SurrogateTable, build_table
+
+LOWER = np.array([0.25, 3, 20, 0])
+UPPER = np.array([0.6, 15, 250, 35])
+
+
+class Smooth(object):
+    """Stands in for a surrogate, build_table only calls predict_values"""
+
+    def predict_values(self, x):
+        u = (x - LOWER) / (UPPER - LOWER)
+        return (np.sin(2 * u[:, 0]) * u[:, 1] + u[:, 2]**2 * u[:, 3] + np.exp(-u[:, 1] * u[:, 3])).reshape(-1, 1)
+
+
+@pytest.fixture(scope = "module")
+def table():
+    return SurrogateTable(build_table(Smooth(), LOWER, UPPER, 9))
+
+
+def finite_difference(table, x, rel_step=1e-6):
+    step = rel_step * (UPPER - LOWER)
+    fd = np.empty(x.shape)
+    for k in range(x.shape[1]):
+        dx = np.zeros(x.shape[1])
+        dx[k] = step[k]
+        fd[:, k] = (table.predict_values(x + dx) - table.predict_values(x - dx)).ravel() / (2 * step[k])
+    return fd
+
+
+@pytest.mark.parametrize("overshoot", [
+    (0, 0, 0, 0),
+    (0, 0, 0.3, 0),
+    (-0.2, 0, 0, 0.1),
+    (0.1, -0.4, 0.5, 0),
+    (0.2, 0.2, -0.2, 0.2),
+])
+def test_gradient_matches_values(table, overshoot):
+    #Points inside the box, moved out along the axes with a non-zero overshoot (fractions of the box)
+    rng = np.random.default_rng(0)
+    x = LOWER + (UPPER - LOWER) * rng.uniform(0.05, 0.95, (50, 4))
+    overshoot = np.array(overshoot)
+    x = np.where(overshoot > 0, UPPER, np.where(overshoot < 0, LOWER, x)) + overshoot * (UPPER - LOWER)
+
+    grads = table.predict_gradients(x)
+    np.testing.assert_allclose(grads, finite_difference(table, x), rtol = 1e-6, atol = 1e-7 * np.max(np.abs(grads)))
+
+
+def test_linear_continuation(table):
+    #Past the upper rpm bound the table follows the edge value and slope
+    edge = np.array([[0.4, 9, 250, 17]])
+    slope = table.predict_gradients(edge)[0, 2]
+    for overshoot in (1, 10, 100):
+        x = edge + [0, 0, overshoot, 0]
+        np.testing.assert_allclose(table.predict_values(x), table.predict_values(edge) + slope * overshoot, rtol = 1e-12)
+        np.testing.assert_allclose(table.predict_gradients(x)[0, 2], slope, rtol = 1e-12)
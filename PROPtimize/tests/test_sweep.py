@@ -0,0 +1,23 @@
+"""Batched Sweep runs against one design at a time"""
+import numpy as np
+
+from Sweep import Sweep
+
+
+def test_scalar_and_array_designs(surrogate_dir):
+    sweep = Sweep(batch_size = 2, surrogate_dir = surrogate_dir, surrogate_backend = "numpy")
+    #A scalar first used to set the batch length to 1
+    mixed = sweep.run({"pitch": (5, "deg"), "D_prop": ([14, 16, 18], "inch")})["prop_thrust"]
+    assert mixed.shape == (3, 1)
+    for i, diameter in enumerate([14, 16, 18]):
+        single = sweep.run({"pitch": (5, "deg"), "D_prop": ([diameter], "inch")})["prop_thrust"]
+        np.testing.assert_allclose(mixed[i], single[0], rtol = 1e-8)
+
+
+def test_conditions_do_not_leak(surrogate_dir):
+    sweep = Sweep(surrogate_dir = surrogate_dir, surrogate_backend = "numpy")
+    design = {"D_prop": ([16], "inch")}
+    plain = sweep.run(design)["prop_thrust"]
+    assert not np.allclose(sweep.run(design, {"rho": 0.9})["prop_thrust"], plain)
+    #Equal up to the Newton tolerance, the solve starts from another warm start
+    np.testing.assert_allclose(sweep.run(design)["prop_thrust"], plain, rtol = 1e-8)